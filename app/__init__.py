@@ -2,8 +2,8 @@ from flask import Flask
 from config import config
 import os
 
-def create_app(config_name='default'):
-    """Application factory function"""
+def create_app(config_name='default', warm_up=None):
+    """Application factory function; warm_up overrides ROUTE_CACHE_WARMUP"""
     # Get the current directory (where run.py is located)
     current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
@@ -12,6 +12,11 @@ def create_app(config_name='default'):
     
     # Load configuration
     app.config.from_object(config[config_name])
+
+    # Leveled logging and request timings in place of stdout prints
+    from app.instrumentation import configure_logging, init_request_metrics
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_SAMPLE_RATE'])
+    init_request_metrics(app)
     
     # Register blueprints
     from app.main import main as main_blueprint
@@ -20,4 +25,14 @@ def create_app(config_name='default'):
     from app.api import api as api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api')
     
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Navigation and map services are shared by both blueprints and created on first use
+    from app.extensions import CampusServices
+    services = CampusServices(app)
+    if app.config['ROUTE_CACHE_WARMUP'] if warm_up is None else warm_up:
+        with app.app_context():
+            services.warm_up()
+    
     return app 
\ No newline at end of file
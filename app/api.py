@@ -1,11 +1,13 @@
-from flask import Blueprint, jsonify
-from app.models import CampusNavigation
+import json
+from itertools import product
+from typing import List, Optional, Tuple
+from flask import Blueprint, Request, Response, current_app, jsonify, request, stream_with_context, url_for
+from app.compression import MapArtifact, artifact_response
+from app.extensions import campus_nav, get_services
+from app.instrumentation import metrics
 
 api = Blueprint('api', __name__)
 
-# Initialize campus navigation
-campus_nav = CampusNavigation()
-
 @api.route('/routes', methods=['GET'])
 def get_routes():
     """API endpoint to get all available routes"""
@@ -16,7 +18,246 @@ def get_buildings():
     """API endpoint to get building descriptions"""
     return jsonify(campus_nav.get_building_descriptions())
 
+def route_error(start_file: str, dest_file: str, encoding: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Why a /api/route request can't be answered, as (message, status), or None"""
+    if not start_file or not dest_file:
+        return 'Please select both start and destination locations.', 400
+    if start_file == dest_file:
+        return 'Start and destination cannot be the same.', 400
+    if encoding not in (None, 'polyline'):
+        return f'Unsupported encoding: {encoding}', 400
+
+    with metrics.timer('validation'):
+        is_valid, error_message = campus_nav.validate_route(start_file, dest_file)
+    if not is_valid:
+        return error_message, 404
+    return None
+
+def route_response(incoming: Request) -> Response:
+    """The /api/route response to a request, built the same way by the Flask and ASGI front ends"""
+    start_file = incoming.args.get('start', '').strip()
+    dest_file = incoming.args.get('dest', '').strip()
+    encoding = incoming.args.get('encoding')
+
+    error = route_error(start_file, dest_file, encoding)
+    if error is not None:
+        response = jsonify({'error': error[0]})
+        response.status_code = error[1]
+        return response
+
+    # Route payloads are deterministic, so clients can revalidate them with an ETag
+    response = jsonify(campus_nav.get_route_payload(start_file, dest_file, encoding))
+    metrics.observe('campus_payload_bytes', response.content_length, payload='api_route')
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(incoming)
+
+@api.route('/route', methods=['GET'])
+def get_route():
+    """API endpoint returning route geometry and metadata for client-side rendering"""
+    return route_response(request)
+
+def _batch_pairs(body) -> Tuple[Optional[List[Tuple[str, str]]], Optional[str]]:
+    """The pairs of a batch request body, or an error message"""
+    if not isinstance(body, dict):
+        return None, 'Expected a JSON object with "pairs", or "origins" and "destinations".'
+    if 'pairs' in body:
+        pairs = body['pairs']
+        if not isinstance(pairs, list) or not all(
+                isinstance(pair, (list, tuple)) and len(pair) == 2 and all(isinstance(name, str) for name in pair)
+                for pair in pairs):
+            return None, '"pairs" must be a list of [start, destination] names.'
+        return [(start, dest) for start, dest in pairs], None
+    origins, destinations = body.get('origins'), body.get('destinations')
+    for name, value in (('origins', origins), ('destinations', destinations)):
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            return None, f'"{name}" must be a list of building names.'
+    # Origin-major, so row i * len(destinations) + j is origins[i] to destinations[j]
+    return list(product(origins, destinations)), None
+
+@api.route('/routes/batch', methods=['POST'])
+def get_batch_routes():
+    """API endpoint returning distances, times and optionally geometry for many routes at once
+
+    Responds with {"routes": [...]}, or one JSON row per line when the client accepts
+    application/x-ndjson, which starts streaming before the last row is computed.
+    """
+    body = request.get_json(silent=True)
+    pairs, error = _batch_pairs(body)
+    if error is not None:
+        return jsonify({'error': error}), 400
+    if len(pairs) > current_app.config['BATCH_MAX_PAIRS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_PAIRS']} pairs per request."}), 413
+    geometry = bool(body.get('geometry', False))
+    encoding = body.get('encoding')
+    if encoding not in (None, 'polyline'):
+        return jsonify({'error': f'Unsupported encoding: {encoding}'}), 400
+
+    rows = campus_nav.get_batch_routes(pairs, geometry, encoding)
+    if request.accept_mimetypes.quality('application/x-ndjson') > request.accept_mimetypes.quality('application/json'):
+        lines = (json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    return jsonify({'routes': list(rows)})
+
+def _flag_arg(name: str, default: bool = False) -> bool:
+    """A boolean query argument such as ?round_trip=1"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+@api.route('/tour', methods=['GET'])
+def get_tour():
+    """API endpoint returning the shortest walk visiting several buildings, in the order to visit them
+
+    Stops are repeated ?stops= arguments and the first one is where the tour starts.
+    optimize=0 keeps the given order, keep_end=1 keeps the last stop last and
+    round_trip=1 walks back to the start.
+    """
+    stops = [name.strip() for name in request.args.getlist('stops') if name.strip()]
+    encoding = request.args.get('encoding')
+    round_trip = _flag_arg('round_trip')
+
+    if encoding not in (None, 'polyline'):
+        return jsonify({'error': f'Unsupported encoding: {encoding}'}), 400
+    if len(stops) > current_app.config['TOUR_MAX_STOPS']:
+        return jsonify({'error': f"At most {current_app.config['TOUR_MAX_STOPS']} stops per tour."}), 400
+    with metrics.timer('validation'):
+        is_valid, error_message = campus_nav.validate_tour(stops)
+    if not is_valid:
+        unknown = [name for name in stops if name not in campus_nav.get_buildings()]
+        return jsonify({'error': error_message}), 404 if unknown else 400
+
+    with metrics.timer('tour_solve'):
+        payload = campus_nav.get_tour_payload(stops, _flag_arg('optimize', True), _flag_arg('keep_end'),
+                                              round_trip, encoding, current_app.config['TOUR_EXACT_MAX_STOPS'])
+    if payload is None:
+        return jsonify({'error': 'Some of these stops are not connected by a walkway.'}), 404
+    response = jsonify(payload)
+    metrics.observe('campus_payload_bytes', response.content_length, payload='api_tour')
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+@api.route('/isochrone', methods=['GET'])
+def get_isochrone():
+    """API endpoint returning the buildings and walkways within ?minutes= of walking from a building"""
+    origin = request.args.get('from', '').strip()
+    encoding = request.args.get('encoding')
+    max_minutes = current_app.config['ISOCHRONE_MAX_MINUTES']
+    try:
+        # Budgets are cached in tenth-of-a-minute bands
+        minutes = round(float(request.args['minutes']), 1)
+    except (KeyError, ValueError):
+        minutes = None
+
+    if not origin:
+        return jsonify({'error': 'Please select a starting building.'}), 400
+    if minutes is None or not 0 < minutes <= max_minutes:
+        return jsonify({'error': f'Please provide minutes between 0 and {max_minutes}.'}), 400
+    if encoding not in (None, 'polyline'):
+        return jsonify({'error': f'Unsupported encoding: {encoding}'}), 400
+    if origin not in campus_nav.get_buildings():
+        return jsonify({'error': f'Unknown building: {origin}'}), 404
+
+    with metrics.timer('isochrone'):
+        payload = campus_nav.get_isochrone_payload(origin, minutes, encoding)
+    if payload is None:
+        return jsonify({'error': f'{origin} is not connected to any walkway.'}), 404
+    response = jsonify(payload)
+    metrics.observe('campus_payload_bytes', response.content_length, payload='api_isochrone')
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+def get_offline_data() -> MapArtifact:
+    """The offline data bundle, serialized and compressed once per load of the campus data"""
+    offline = get_services().offline
+    campus_nav.maybe_refresh()
+    generation = campus_nav.data.generation
+    if offline['data'] is None or offline['source'] != generation:
+        with metrics.timer('offline_bundle'):
+            artifact = MapArtifact(json.dumps(campus_nav.get_offline_bundle(), separators=(',', ':')))
+        metrics.observe('campus_payload_bytes', len(artifact.html), payload='offline_data')
+        offline['data'], offline['source'] = artifact, generation
+    return offline['data']
+
+@api.route('/offline/manifest', methods=['GET'])
+def offline_manifest():
+    """API endpoint naming the current offline data version and where to download it"""
+    version = get_offline_data().etag
+    response = jsonify({'version': version, 'data': url_for('api.offline_data', v=version)})
+    # Clients check this on every visit; the bundle itself is only fetched when the version moves
+    response.cache_control.no_cache = True
+    return response
+
+@api.route('/offline/data', methods=['GET'])
+def offline_data():
+    """API endpoint returning every route, outline and description for routing without the server"""
+    artifact = get_offline_data()
+    if request.args.get('v') != artifact.etag:
+        return artifact_response(artifact, 0, mimetype='application/json')
+    # A versioned URL always names the same bytes
+    response = artifact_response(artifact, current_app.config['OFFLINE_DATA_MAX_AGE'], mimetype='application/json')
+    response.cache_control.immutable = True
+    return response
+
+def _location_arg() -> Optional[Tuple[float, float]]:
+    """The lat/lon query arguments, or None if they are missing or out of range"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+@api.route('/locate', methods=['GET'])
+def locate():
+    """API endpoint returning the building and walkway nearest to a point"""
+    location = _location_arg()
+    if location is None:
+        return jsonify({'error': 'Please provide a valid lat and lon.'}), 400
+    return jsonify(campus_nav.locate(*location))
+
+@api.route('/route/from-point', methods=['GET'])
+def get_route_from_point():
+    """API endpoint returning a route from a lat/lon to a building"""
+    location = _location_arg()
+    dest_file = request.args.get('dest', '').strip()
+    encoding = request.args.get('encoding')
+
+    if location is None:
+        return jsonify({'error': 'Please provide a valid lat and lon.'}), 400
+    if not dest_file:
+        return jsonify({'error': 'Please select a destination.'}), 400
+    if encoding not in (None, 'polyline'):
+        return jsonify({'error': f'Unsupported encoding: {encoding}'}), 400
+    if dest_file not in campus_nav.get_buildings():
+        return jsonify({'error': f'Unknown destination: {dest_file}'}), 404
+
+    payload = campus_nav.get_point_route_payload(*location, dest_file, encoding,
+                                                 current_app.config['LOCATE_MAX_DISTANCE'])
+    if payload is None:
+        return jsonify({'error': 'Your location is too far from the campus walkways.'}), 404
+    return jsonify(payload)
+
 @api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for deployment"""
-    return jsonify({'status': 'healthy', 'service': 'UCA Campus Navigation'}) 
\ No newline at end of file
+    return jsonify({'status': 'healthy', 'service': 'UCA Campus Navigation'}) 
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request timings, cache counters and payload sizes in Prometheus text format, for this worker process only"""
+    services = get_services()
+    # Cache sizes are read at scrape time so idle caches aren't created just to report them
+    if services._map_service is not None:
+        metrics.set('campus_cache_entries', len(services._map_service.route_cache), cache='route_map')
+    if services._route_pages is not None:
+        metrics.set('campus_cache_entries', len(services._route_pages), cache='route_page')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,345 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from flask import Flask, Request, Response
+from app import create_app
+from app.api import get_buildings, get_routes, route_response
+from app.cache import RouteMapCache
+from app.compression import MapArtifact, artifact_response
+from app.instrumentation import metrics
+from app.render_queue import RenderQueueFull
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict
+Receive = Callable[[], Awaitable[Dict]]
+Send = Callable[[Dict], Awaitable[None]]
+
+# Flask app of a render pool process, created by _init_renderer
+_renderer: Optional[Flask] = None
+
+
+def _init_renderer(config_name: str) -> None:
+    global _renderer
+    _renderer = create_app(config_name)
+
+
+def _route_page_html(flask_app: Flask, start_file: str, dest_file: str,
+                     fragment: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """Render a route page, or with fragment just its map, as (html, None) or (None, error message)"""
+    from app.main import get_route_fragment, get_route_page
+    with flask_app.app_context():
+        page = (get_route_fragment if fragment else get_route_page)(start_file, dest_file)
+    return (None, page) if isinstance(page, str) else (page.html, None)
+
+
+def _render_route_page(start_file: str, dest_file: str, fragment: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """Render a route page in a pool process"""
+    return _route_page_html(_renderer, start_file, dest_file, fragment)
+
+
+def wsgi_environ(scope: Scope, body: bytes) -> Dict:
+    """WSGI environ for an ASGI HTTP scope and its request body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class CampusASGI:
+    """ASGI front end for the campus app
+
+    The JSON API skips Flask's routing and runs the same views in a thread, route
+    maps are rendered in a process pool, and every other path is handed to the
+    Flask app in a thread, so slow clients only ever hold a coroutine. Nothing
+    that may load campus data runs on the event loop.
+    """
+
+    def __init__(self, flask_app: Flask, config_name: str = 'default'):
+        self.flask_app = flask_app
+        self.config_name = config_name
+        self.services = flask_app.extensions['campus']
+        self.pages = RouteMapCache(flask_app.config['ROUTE_CACHE_SIZE'], name='asgi_route_page')
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Renders in progress by cache key, shared by every request for the same page or map
+        self._flights: Dict[Tuple, asyncio.Future] = {}
+        # Handlers return None to let Flask answer instead, e.g. to render an error page
+        self.handlers: Dict[Tuple[str, str], Tuple[str, Callable]] = {
+            ('GET', '/api/routes'): ('api.get_routes', self.get_routes),
+            ('GET', '/api/buildings'): ('api.get_buildings', self.get_buildings),
+            ('GET', '/api/route'): ('api.get_route', self.get_route),
+            ('GET', '/api/health'): ('api.health_check', self.health_check),
+            ('POST', '/'): ('main.index', self.route_page),
+            ('GET', '/map/route'): ('main.route_map', self.route_map),
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        started = time.perf_counter()
+        body = await self._read_body(receive)
+        endpoint, handler = self.handlers.get((scope['method'], scope['path']), (None, None))
+        response = None
+        if handler is not None:
+            request = self.flask_app.request_class(wsgi_environ(scope, body))
+            response = await handler(request)
+        if response is None:
+            # Flask's own request hooks record metrics for what it serves
+            await self._send_wsgi(wsgi_environ(scope, body), send)
+            return
+        await self._send_response(response, request.environ, send)
+        metrics.observe('campus_http_request_duration_seconds', time.perf_counter() - started,
+                        endpoint=endpoint, method=scope['method'])
+        metrics.inc('campus_http_requests_total', endpoint=endpoint, status=response.status_code)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.flask_app.config['DATA_RELOAD_BACKGROUND']:
+                    # Loads the campus data, so off the loop
+                    await self._in_app(self.services.start_reloader)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    async def _send_response(response: Response, environ: Dict, send: Send) -> None:
+        # As a WSGI server would send it, e.g. a 304 or HEAD response without its body
+        body, status, headers = response.get_wsgi_response(environ)
+        await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+        await send({'type': 'http.response.body', 'body': b''.join(body)})
+
+    async def _send_wsgi(self, environ: Dict, send: Send) -> None:
+        """Run the Flask app in a thread and send its response as the body is produced
+
+        The body is iterated in the same thread that called the app, as streamed
+        templates need the request context it set up there; chunks are handed to
+        the loop through a queue ending with None.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def put(item) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def run() -> None:
+            started: Dict = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'] = int(status.split(' ', 1)[0])
+                started['headers'] = headers
+
+            try:
+                body = self.flask_app(environ, start_response)
+                try:
+                    put((started['status'], started['headers']))
+                    for chunk in body:
+                        if chunk:
+                            put(chunk)
+                finally:
+                    if hasattr(body, 'close'):
+                        body.close()
+            finally:
+                put(None)
+
+        done = loop.run_in_executor(None, run)
+        head = await queue.get()
+        if head is None:
+            # The app failed before starting its response
+            await done
+            return
+        status, headers = head
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+        await done
+
+    async def _in_app(self, function: Callable, *args):
+        """Run blocking campus work, such as the first data load, in a thread with an app context"""
+        def run():
+            with self.flask_app.app_context():
+                return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, run)
+
+    async def get_routes(self, request: Request) -> Response:
+        return await self._in_app(get_routes)
+
+    async def get_buildings(self, request: Request) -> Response:
+        return await self._in_app(get_buildings)
+
+    async def health_check(self, request: Request) -> Response:
+        return self.flask_app.json.response({'status': 'healthy', 'service': 'UCA Campus Navigation'})
+
+    async def get_route(self, request: Request) -> Response:
+        return await self._in_app(route_response, request)
+
+    async def route_page(self, request: Request) -> Optional[Response]:
+        """A route page from the form post, rendered in the pool; Flask renders the error pages
+
+        Streamed page shells are left to Flask, which sends them without drawing the map.
+        """
+        if self.flask_app.config['STREAM_PAGE_SHELL']:
+            return None
+        try:
+            page = await self._offloaded_page(request.form.get('start', '').strip(),
+                                              request.form.get('dest', '').strip())
+        except RenderQueueFull:
+            # Flask answers through its own render queue, sending the page without its map when that is full too
+            return None
+        return None if page is None else artifact_response(page, incoming=request)
+
+    async def route_map(self, request: Request) -> Optional[Response]:
+        """A route's map on its own, rendered in the pool; Flask answers bad requests"""
+        start_file = request.args.get('start', '').strip()
+        dest_file = request.args.get('dest', '').strip()
+        try:
+            page = await self._offloaded_page(start_file, dest_file, fragment=True)
+        except RenderQueueFull as error:
+            return await self._busy(error, start_file, dest_file)
+        if page is None:
+            return None
+        return artifact_response(page, self.flask_app.config['MAP_FRAGMENT_MAX_AGE'], incoming=request)
+
+    async def _busy(self, error: RenderQueueFull, start_file: str, dest_file: str) -> Response:
+        """Same reply as main.render_queue_full"""
+        from app.main import busy_payload
+        metrics.inc('campus_render_degraded_total', queue='asgi', fallback='busy')
+        payload = await self._in_app(lambda: busy_payload(self.services.campus_nav, error, start_file, dest_file))
+        response = self.flask_app.json.response(payload)
+        response.status_code = 503
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    async def _offloaded_page(self, start_file: str, dest_file: str, fragment: bool = False) -> Optional[MapArtifact]:
+        """Cached route page or map, rendered off the loop; None if the route can't be drawn"""
+        signature = await self._in_app(self._route_signature, start_file, dest_file)
+        if signature is None:
+            return None
+
+        key = ('map', start_file, dest_file) if fragment else (start_file, dest_file)
+        page = self.pages.get(key, signature)
+        if page is not None:
+            return page
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            metrics.inc('campus_render_coalesced_total', queue='asgi')
+        else:
+            config = self.flask_app.config
+            if len(self._flights) >= max(config['ASGI_RENDER_PROCESSES'], 1) + config['RENDER_QUEUE_SIZE']:
+                metrics.inc('campus_render_shed_total', queue='asgi', reason='full')
+                stale = self.pages.last(key)
+                if stale is None:
+                    raise RenderQueueFull(config['RENDER_RETRY_AFTER'])
+                metrics.inc('campus_render_degraded_total', queue='asgi', fallback='stale')
+                return stale
+            flight = self._flights[key] = asyncio.ensure_future(self._render(key, signature, start_file,
+                                                                             dest_file, fragment))
+            flight.add_done_callback(lambda _: self._end_flight(key))
+            self._report_flights()
+        # Shielded, so one client going away doesn't cancel the render the others wait for
+        return await asyncio.shield(flight)
+
+    def _route_signature(self, start_file: str, dest_file: str) -> Optional[Tuple]:
+        """Signature of a route's source data, None if the route can't be drawn"""
+        campus_nav = self.services.campus_nav
+        if not start_file or not dest_file or start_file == dest_file \
+                or not campus_nav.validate_route(start_file, dest_file)[0]:
+            return None
+        return campus_nav.route_signature(start_file, dest_file)
+
+    async def _render(self, key: Tuple, signature: Tuple, start_file: str, dest_file: str,
+                      fragment: bool) -> Optional[MapArtifact]:
+        loop = asyncio.get_running_loop()
+        with metrics.timer('offloaded_render'):
+            if self._render_pool() is not None:
+                html, error = await loop.run_in_executor(self._pool, _render_route_page,
+                                                          start_file, dest_file, fragment)
+            else:
+                html, error = await loop.run_in_executor(None, _route_page_html, self.flask_app,
+                                                          start_file, dest_file, fragment)
+        if error is not None:
+            return None
+        page = MapArtifact(html)
+        # Compress off the loop, once per page
+        await loop.run_in_executor(None, lambda: page.encodings)
+        self.pages.put(key, signature, page)
+        return page
+
+    def _end_flight(self, key: Tuple) -> None:
+        self._flights.pop(key, None)
+        self._report_flights()
+
+    def _report_flights(self) -> None:
+        running = min(len(self._flights), max(self.flask_app.config['ASGI_RENDER_PROCESSES'], 1))
+        metrics.set('campus_render_queue_depth', running, queue='asgi', state='running')
+        metrics.set('campus_render_queue_depth', len(self._flights) - running, queue='asgi', state='waiting')
+
+    def _render_pool(self) -> Optional[ProcessPoolExecutor]:
+        processes = self.flask_app.config['ASGI_RENDER_PROCESSES']
+        if self._pool is None and processes > 0:
+            # Spawned, not forked: the server process runs threads
+            self._pool = ProcessPoolExecutor(processes, multiprocessing.get_context('spawn'),
+                                             initializer=_init_renderer, initargs=(self.config_name,))
+        return self._pool
+
+
+def create_asgi_app(config_name: str = 'default') -> CampusASGI:
+    """ASGI application factory; maps are warmed in the render processes, not the server"""
+    return CampusASGI(create_app(config_name, warm_up=False), config_name)
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Tuple
+from app.instrumentation import metrics
+
+
+class RouteMapCache:
+    """Bounded LRU cache of rendered route maps, pages or tiles, dropped when their source signature changes"""
+
+    def __init__(self, max_size: int = 32, name: str = 'route_map'):
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, signature: Tuple):
+        """Return the cached rendering for a route if its source data is unchanged"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                # A stale rendering stays until it is replaced or evicted, as a fallback under load
+                self.misses += 1
+                metrics.inc('campus_cache_requests_total', cache=self.name, result='miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.inc('campus_cache_requests_total', cache=self.name, result='hit')
+        return entry[1]
+
+    def put(self, key: Tuple, signature: Tuple, html) -> None:
+        """Store a rendering, evicting the least recently used entries"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (signature, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def last(self, key: Tuple):
+        """Return the latest rendering for a route even if its source data changed since"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def resize(self, max_size: int) -> None:
+        """Change the size cap, evicting entries if the cache shrank"""
+        with self._lock:
+            self.max_size = max_size
+            while len(self._entries) > max(max_size, 0):
+                self._entries.popitem(last=False)
+
+    def discard(self, keys: Iterable[Tuple]) -> int:
+        """Remove the renderings of some routes, returning how many were cached"""
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def clear(self) -> None:
+        """Remove all cached renderings"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,113 @@
+import json
+import sys
+import click
+from flask import Flask
+
+def register_commands(app: Flask):
+    """Register the data build commands with the Flask CLI"""
+
+    @app.cli.command('build-route-index')
+    @click.option('--output', default=None, help='Index file to write (defaults to ROUTE_INDEX_PATH)')
+    def build_route_index_command(output):
+        """Precompute every building-to-building walkway route into the binary route index"""
+        from app.geometry import GeometryStore
+        from app.route_index import build_route_index
+        output = output or app.config['ROUTE_INDEX_PATH']
+        stats = build_route_index(GeometryStore(), output, app.config['ROUTING_SNAP_TOLERANCE'])
+        click.echo(f"Wrote {output}: {stats['nodes']} nodes, {stats['buildings']} buildings, "
+                   f"{stats['bytes']} bytes")
+
+    @app.cli.command('verify-route-index')
+    @click.option('--path', default=None, help='Index file to check (defaults to ROUTE_INDEX_PATH)')
+    def verify_route_index_command(path):
+        """Check the route index's data against its checksum"""
+        from app.route_index import RouteIndex
+        path = path or app.config['ROUTE_INDEX_PATH']
+        try:
+            index = RouteIndex(path, verify=True)
+        except (OSError, ValueError) as e:
+            click.echo(f"{path}: {e}", err=True)
+            sys.exit(1)
+        click.echo(f"{path}: checksum {index.checksum[:12]} ok")
+
+    @app.cli.command('compile')
+    @click.option('--output', default=None, help='Bundle file to write (defaults to ROUTE_INDEX_PATH)')
+    @click.option('--entrance-tolerance', type=float, default=None,
+                  help='Meters a walkway end may stop outside its named building')
+    def compile_command(output, entrance_tolerance):
+        """Validate the campus GeoJSON and compile it into the route index bundle"""
+        from app.compiler import ENTRANCE_TOLERANCE, validate_campus
+        from app.geometry import GeometryStore
+        from app.route_index import build_route_index
+        store = GeometryStore()
+        errors = validate_campus(store, ENTRANCE_TOLERANCE if entrance_tolerance is None else entrance_tolerance,
+                                 app.config['ROUTING_SNAP_TOLERANCE'])
+        if errors:
+            for error in errors:
+                click.echo(error, err=True)
+            click.echo(f"{len(errors)} validation errors, bundle not written", err=True)
+            sys.exit(1)
+        output = output or app.config['ROUTE_INDEX_PATH']
+        stats = build_route_index(store, output, app.config['ROUTING_SNAP_TOLERANCE'])
+        click.echo(f"Wrote {output}: {stats['nodes']} nodes, {stats['buildings']} buildings, "
+                   f"{stats['routes']} routes, {stats['bytes']} bytes, checksum {stats['checksum'][:12]}")
+
+    @app.cli.command('payload-report')
+    @click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+    @click.option('--budget', type=int, default=None, help='Fail if any compressed page exceeds this many bytes')
+    def payload_report_command(as_json, budget):
+        """Report the size of every page and map sent, in every precompressed encoding"""
+        from app.extensions import get_services, map_service
+        from app.main import get_landing_page, get_route_fragment, get_route_page
+        streamed = app.config['STREAM_PAGE_SHELL']
+        # Page shells link to their maps with url_for, which needs a request
+        with app.test_request_context():
+            report = {'landing': get_landing_page().sizes()}
+            if streamed:
+                # Streamed pages send the shell, then fetch the map from /map or /map/route
+                report['/map'] = map_service.get_empty_map().sizes()
+            for start, dest in get_services().campus_nav.get_route_keys():
+                page = get_route_fragment(start, dest) if streamed else get_route_page(start, dest)
+                if not isinstance(page, str):
+                    report[f"{'/map/route ' if streamed else ''}{start} -> {dest}"] = page.sizes()
+
+        if as_json:
+            click.echo(json.dumps(report, indent=2))
+        else:
+            for name, sizes in report.items():
+                click.echo(f"{name:<48}" + ''.join(f"{encoding:>10} {size:>7}" for encoding, size in sizes.items()))
+
+        if budget is not None:
+            over = [name for name, sizes in report.items()
+                    if min(size for encoding, size in sizes.items() if encoding != 'identity') > budget]
+            if over:
+                click.echo(f"Over the {budget} byte budget: {', '.join(over)}", err=True)
+                sys.exit(1)
+
+    @app.cli.command('build-tiles')
+    def build_tiles_command():
+        """Cut the campus GeoJSON into tiles in the disk cache"""
+        from app.extensions import get_services
+        stats = get_services().tiles.build()
+        click.echo(f"Wrote {stats['tiles']} tiles ({stats['bytes']} bytes) to {stats['path']}")
+
+    @app.cli.command('simplify-report')
+    @click.option('--json', 'as_json', is_flag=True, help='Print the full per-file report as JSON')
+    def simplify_report_command(as_json):
+        """Report GeoJSON bytes saved by simplification and rounding at each tile zoom"""
+        from app.geometry import GeometryStore
+        from app.services import MAP_MAX_ZOOM
+        from app.simplify import simplification_report
+        store = GeometryStore()
+        zooms = sorted(set(range(app.config['TILE_MIN_ZOOM'], app.config['TILE_MAX_ZOOM'] + 1)) | {MAP_MAX_ZOOM})
+        latitude = float(store.buildings()[0].coords[0, 0]) if store.buildings() else 0.0
+        report = simplification_report(store.buildings() + store.paths(), zooms, latitude,
+                                       app.config['GEOMETRY_SIMPLIFY_PX'])
+        if as_json:
+            click.echo(json.dumps(report, indent=2))
+            return
+        click.echo(f"{'zoom':>4}{'original':>10}{'simplified':>12}{'saved':>8}{'max error':>12}")
+        for zoom, totals in report['totals'].items():
+            saved = totals['saved_bytes'] / totals['original_bytes'] if totals['original_bytes'] else 0
+            click.echo(f"{zoom:>4}{totals['original_bytes']:>10}{totals['bytes']:>12}{saved:>8.0%}"
+                       f"{totals['max_error_m'] * 100:>10.1f}cm")
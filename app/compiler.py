@@ -0,0 +1,130 @@
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+from app.geometry import BUILDINGS_DIR, GeometryRecord, GeometryStore
+from app.routing import PATH_NAME_PATTERN, WalkwayGraph
+from app.spatial import RING_CLOSURE_TOLERANCE, SpatialIndex, is_closed_ring
+
+# Outlines within this many meters of a route are drawn with it
+ROUTE_OUTLINE_DISTANCE = 3.0
+# Walkway ends may stop this many meters outside the building they are named after
+ENTRANCE_TOLERANCE = 15.0
+
+
+def campus_spatial_index(records: Iterable[GeometryRecord], node_coords: np.ndarray = None) -> SpatialIndex:
+    """SpatialIndex over building outline records, projected around their center"""
+    outlines = {record.name: record.coords for record in records}
+    coords = np.vstack([c for c in outlines.values() if len(c)] or [np.zeros((1, 2))])
+    origin = tuple(((coords.min(axis=0) + coords.max(axis=0)) / 2).tolist())
+    return SpatialIndex(origin, outlines, node_coords if node_coords is not None else np.zeros((0, 2)))
+
+
+def describe_route(passed: List[str]) -> str:
+    """Route description from the outlines passed between its start and destination"""
+    if not passed:
+        return 'Direct'
+    if len(passed) == 1:
+        return f'Via {passed[0]}'
+    return f"Via {', '.join(passed[:-1])} and {passed[-1]}"
+
+
+def derive_route_table(routes: Dict[Tuple[str, str], np.ndarray], spatial: SpatialIndex,
+                       max_distance: float = ROUTE_OUTLINE_DISTANCE) -> Dict[Tuple[str, str], Dict]:
+    """Outlines drawn with each route and its description, from the outlines the route passes"""
+    table = {}
+    for (start, destination), coords in routes.items():
+        passed = [name for name in spatial.outlines_along(coords, max_distance) if name not in (start, destination)]
+        names = [name for name in [start] + passed + [destination] if name in spatial.outline_names]
+        table[(start, destination)] = {
+            'buildings': [f'{BUILDINGS_DIR}/{name}.geojson' for name in names],
+            'route_type': describe_route(passed)
+        }
+    return table
+
+
+def _check_positions(file_path: str, coords: np.ndarray, errors: List[str]) -> bool:
+    if not len(coords):
+        errors.append(f"{file_path}: no coordinates")
+        return False
+    if not np.isfinite(coords).all() or (np.abs(coords[:, 0]) > 90).any() or (np.abs(coords[:, 1]) > 180).any():
+        errors.append(f"{file_path}: coordinates outside the lat/lon range")
+        return False
+    return True
+
+
+def validate_campus(store: GeometryStore, entrance_tolerance: float = ENTRANCE_TOLERANCE,
+                    snap_tolerance: float = 3.0) -> List[str]:
+    """Check outlines are closed rings and walkways start and end at their named buildings
+
+    Connectivity is checked on the graph snapped with snap_tolerance, as the route index is built.
+    """
+    errors = []
+    outline_names = set()
+    spatial = campus_spatial_index(store.buildings())
+    for record in store.buildings():
+        features = record.geojson.get('features') or []
+        geometry = (features[-1].get('geometry') or {}) if features else {}
+        if geometry.get('type') not in ('Polygon', 'LineString'):
+            errors.append(f"{record.file_path}: outline must be a Polygon or closed LineString, "
+                          f"found {geometry.get('type')}")
+            continue
+        if not _check_positions(record.file_path, record.coords, errors):
+            continue
+        if not is_closed_ring(spatial.project(record.coords)):
+            errors.append(f"{record.file_path}: outline ring is not closed to within {RING_CLOSURE_TOLERANCE:g} m")
+            continue
+        outline_names.add(record.name)
+
+    for record in store.paths():
+        match = PATH_NAME_PATTERN.match(record.name)
+        lines = 0
+        for feature in record.geojson.get('features', []):
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'LineString':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiLineString':
+                parts = geometry['coordinates']
+            else:
+                continue
+            properties = feature.get('properties') or {}
+            ends = (properties.get('start') or (match.group('start') if match else None),
+                    properties.get('end') or (match.group('end') if match else None))
+            for part in parts:
+                coords = np.asarray(part, dtype=np.float64).reshape(-1, 2)[:, ::-1]
+                if not _check_positions(record.file_path, coords, errors):
+                    continue
+                if len(coords) < 2:
+                    errors.append(f"{record.file_path}: walkway has fewer than two points")
+                    continue
+                lines += 1
+                for building, (lat, lon), which in ((ends[0], coords[0], 'start'), (ends[1], coords[-1], 'end')):
+                    if not building:
+                        continue
+                    if building not in outline_names:
+                        errors.append(f"{record.file_path}: {which} building '{building}' has no valid outline")
+                        continue
+                    distance = spatial.outline_distance(building, lat, lon)
+                    if distance > entrance_tolerance:
+                        errors.append(f"{record.file_path}: {which} point is {distance:.1f} m from '{building}', "
+                                      f"more than {entrance_tolerance:g} m")
+        if not lines:
+            errors.append(f"{record.file_path}: no LineString walkway")
+
+    # Every pair of buildings with entrances must be connected
+    graph = WalkwayGraph.from_store(store, snap_tolerance)
+    buildings = sorted(graph.entrances)
+    for start in buildings:
+        for destination in buildings:
+            if start != destination and graph.route(start, destination) is None:
+                errors.append(f"No walkway connects '{start}' to '{destination}'")
+    return errors
+
+
+def route_table_rows(table: Dict[Tuple[str, str], Dict]) -> List[Dict]:
+    """A route table as JSON-serializable rows"""
+    return [dict(info, start=start, destination=destination) for (start, destination), info in table.items()]
+
+
+def route_table_from_rows(rows: List[Dict]) -> Dict[Tuple[str, str], Dict]:
+    """Inverse of route_table_rows"""
+    return {(row['start'], row['destination']): {'buildings': row['buildings'], 'route_type': row['route_type']}
+            for row in rows}
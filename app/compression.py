@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+from typing import Dict, Optional
+from flask import Request, Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are offered in gzip only
+    brotli = None
+
+
+class MapArtifact:
+    """Immutable rendered payload, precompressed once, with a content hash for HTTP caching"""
+
+    __slots__ = ('html', 'etag', '_encodings')
+
+    def __init__(self, html: str):
+        self.html = html
+        self.etag = hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+        self._encodings = None
+
+    @property
+    def encodings(self) -> Dict[str, bytes]:
+        """Body in every supported encoding, compressed once on first use"""
+        if self._encodings is None:
+            body = self.html.encode('utf-8')
+            # Highest levels, since the cost is paid once per artifact rather than per request
+            encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                encodings['br'] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+            self._encodings = encodings
+        return self._encodings
+
+    def sizes(self) -> Dict[str, int]:
+        """Payload size in bytes for every stored encoding"""
+        return {encoding: len(body) for encoding, body in self.encodings.items()}
+
+
+def negotiate_encoding(artifact: MapArtifact, incoming: Optional[Request] = None) -> str:
+    """Pick the smallest stored encoding the client accepts"""
+    accepted = (incoming or request).accept_encodings
+    best = 'identity'
+    for encoding in ('br', 'gzip'):
+        if encoding in artifact.encodings and accepted[encoding] > 0:
+            if len(artifact.encodings[encoding]) < len(artifact.encodings[best]):
+                best = encoding
+    return best
+
+
+def artifact_response(artifact: MapArtifact, max_age: Optional[int] = None, mimetype: str = 'text/html',
+                      incoming: Optional[Request] = None) -> Response:
+    """Serve an artifact in the negotiated encoding; with max_age it is also ETag-cacheable
+
+    incoming defaults to the current Flask request.
+    """
+    incoming = incoming or request
+    encoding = negotiate_encoding(artifact, incoming)
+    response = Response(artifact.encodings[encoding], mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    if max_age is not None:
+        # Each encoding is a different byte sequence, so it needs its own strong ETag
+        response.set_etag(artifact.etag if encoding == 'identity' else f'{artifact.etag}-{encoding}')
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(incoming)
+    return response
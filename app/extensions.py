@@ -0,0 +1,125 @@
+import threading
+from typing import Iterable, Tuple
+from flask import Flask, current_app
+from werkzeug.local import LocalProxy
+
+class CampusServices:
+    """Navigation and map services owned by the app, created on first use"""
+
+    def __init__(self, app: Flask = None):
+        self.config = {}
+        self._campus_nav = None
+        self._map_service = None
+        self._route_pages = None
+        self._tiles = None
+        self._reloader = None
+        self._lock = threading.RLock()
+        # Landing page rendered around the empty map, rebuilt only if that map changes
+        self.landing_page = {'source': None, 'page': None}
+        # Offline data bundle, rebuilt when a reload swaps in new campus data, and the service worker script
+        self.offline = {'source': None, 'data': None, 'worker': None}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Attach the services to an app without loading any campus data"""
+        self.config = app.config
+        app.extensions['campus'] = self
+        if app.config['DATA_RELOAD_BACKGROUND'] and app.config['GEOMETRY_REFRESH_INTERVAL'] > 0:
+            app.before_request(self.start_reloader)
+
+    def start_reloader(self) -> None:
+        """Poll for changed campus data in the background of this worker process"""
+        if self._reloader is None:
+            with self._lock:
+                if self._reloader is None:
+                    from app.reloader import DataReloader
+                    self._reloader = DataReloader(self, self.config['GEOMETRY_REFRESH_INTERVAL'])
+        self._reloader.start()
+
+    def invalidate_routes(self, routes: Iterable[Tuple[str, str]]) -> int:
+        """Drop the cached maps and pages of reloaded routes, leaving every other route cached"""
+        routes = list(routes)
+        dropped = 0
+        if self._map_service is not None:
+            dropped += self._map_service.route_cache.discard(routes)
+        if self._route_pages is not None:
+            dropped += self._route_pages.discard(routes + [('map',) + route for route in routes])
+        return dropped
+
+    @property
+    def campus_nav(self):
+        """The shared CampusNavigation, with its route index loaded"""
+        if self._campus_nav is None:
+            with self._lock:
+                if self._campus_nav is None:
+                    from app.geometry import GeometryStore
+                    from app.models import CampusNavigation
+                    geometry = GeometryStore(refresh_interval=self.config['GEOMETRY_REFRESH_INTERVAL'])
+                    campus_nav = CampusNavigation(geometry, self.config['ROUTING_SNAP_TOLERANCE'])
+                    campus_nav.load_route_index(self.config['ROUTE_INDEX_PATH'])
+                    self._campus_nav = campus_nav
+        return self._campus_nav
+
+    @property
+    def map_service(self):
+        """The shared MapService; Folium is only imported when a map is first rendered"""
+        if self._map_service is None:
+            with self._lock:
+                if self._map_service is None:
+                    from app.render_queue import RenderQueue
+                    from app.services import MapService
+                    tile_url = '/tiles/{z}/{x}/{y}' if self.config['MAP_BUILDING_TILES'] else None
+                    render_queue = RenderQueue(self.config['RENDER_CONCURRENCY'], self.config['RENDER_QUEUE_SIZE'],
+                                               self.config['RENDER_QUEUE_TIMEOUT'], self.config['RENDER_RETRY_AFTER'])
+                    self._map_service = MapService(self.campus_nav, self.config['ROUTE_CACHE_SIZE'], tile_url,
+                                                   self.config['TILE_MIN_ZOOM'], self.config['TILE_MAX_ZOOM'],
+                                                   self.config['GEOMETRY_SIMPLIFY_PX'], self.config['MAP_RENDERER'],
+                                                   render_queue)
+        return self._map_service
+
+    @property
+    def route_pages(self):
+        """LRU of full route pages, stored precompressed and keyed by route"""
+        if self._route_pages is None:
+            with self._lock:
+                if self._route_pages is None:
+                    from app.cache import RouteMapCache
+                    self._route_pages = RouteMapCache(self.config['ROUTE_CACHE_SIZE'], name='route_page')
+        return self._route_pages
+
+    @property
+    def tiles(self):
+        """The shared TileSet of campus GeoJSON tiles"""
+        if self._tiles is None:
+            with self._lock:
+                if self._tiles is None:
+                    from app.tiles import TileSet
+                    self._tiles = TileSet(self.campus_nav.geometry, self.config['TILE_CACHE_DIR'],
+                                          self.config['TILE_MIN_ZOOM'], self.config['TILE_MAX_ZOOM'],
+                                          self.config['ROUTING_SNAP_TOLERANCE'], self.config['GEOMETRY_SIMPLIFY_PX'])
+        return self._tiles
+
+    def warm_up(self) -> None:
+        """Load all data and render and compress every page up front (needs an app context)"""
+        from app.main import get_landing_page, get_route_fragment, get_route_page
+        self.map_service.warm_up()
+        # Page shells link to their maps with url_for, which needs a request
+        with current_app.test_request_context():
+            pages = [get_landing_page(), self.map_service.get_empty_map()]
+        # Streamed pages only ever serve the maps of routes, never whole route pages
+        get_page = get_route_fragment if self.config['STREAM_PAGE_SHELL'] else get_route_page
+        pages.extend(get_page(start, dest) for start, dest in self.campus_nav.get_route_keys())
+        for page in pages:
+            if not isinstance(page, str):
+                page.encodings
+
+
+def get_services() -> CampusServices:
+    """Return the services of the current app"""
+    return current_app.extensions['campus']
+
+
+# Request-time handles to the current app's shared instances
+campus_nav = LocalProxy(lambda: get_services().campus_nav)
+map_service = LocalProxy(lambda: get_services().map_service)
@@ -0,0 +1,85 @@
+import math
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+
+# Average walking speed used for estimated times, in meters per minute
+WALKING_SPEED_M_PER_MIN = 80.0
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters between two (lat, lon) points"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def segment_lengths(coords: np.ndarray) -> np.ndarray:
+    """Haversine length in meters of every segment of an (N, 2) lat/lon polyline"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.zeros(0, dtype=np.float64)
+    radians = np.radians(coords)
+    phi1, phi2 = radians[:-1, 0], radians[1:, 0]
+    d_phi = phi2 - phi1
+    d_lambda = radians[1:, 1] - radians[:-1, 1]
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def path_length(coords: np.ndarray) -> float:
+    """Total haversine length in meters of an (N, 2) lat/lon polyline"""
+    return float(segment_lengths(coords).sum())
+
+
+def walking_minutes(distance: float) -> int:
+    """Walking time estimate in whole minutes, never less than one"""
+    return max(1, math.ceil(distance / WALKING_SPEED_M_PER_MIN))
+
+
+class RouteMetrics:
+    """Measured length and walking time of one route"""
+
+    __slots__ = ('distance', 'walking_time_s', 'estimated_time', 'segment_lengths')
+
+    def __init__(self, segments: np.ndarray, distance: float = None):
+        self.segment_lengths = segments
+        self.distance = float(segments.sum()) if distance is None else float(distance)
+        self.walking_time_s = self.distance / WALKING_SPEED_M_PER_MIN * 60.0
+        self.estimated_time = walking_minutes(self.distance)
+
+    def to_dict(self) -> Dict:
+        """Numeric fields for route metadata and the API"""
+        return {
+            'distance': round(self.distance, 1),
+            'walking_time_s': round(self.walking_time_s, 1),
+            'estimated_time': self.estimated_time
+        }
+
+
+def measure_routes(routes: Sequence[np.ndarray]) -> List[RouteMetrics]:
+    """Measure many polylines with a single vectorized haversine pass"""
+    if not routes:
+        return []
+    counts = np.array([len(route) for route in routes], dtype=np.int64)
+    coords = np.concatenate([np.asarray(route, dtype=np.float64).reshape(-1, 2) for route in routes])
+
+    # Segments that would join the end of one route to the start of the next are dropped
+    lengths = segment_lengths(coords)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    segment_ends = np.maximum(starts, ends - 1)
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    totals = cumulative[segment_ends] - cumulative[starts]
+    return [RouteMetrics(lengths[start:end], total)
+            for start, end, total in zip(starts, segment_ends, totals)]
+
+
+def measure_route_table(routes: Dict[Tuple[str, str], np.ndarray]) -> Dict[Tuple[str, str], RouteMetrics]:
+    """Measure a (start, destination) -> polyline mapping"""
+    keys = list(routes)
+    return dict(zip(keys, measure_routes([routes[key] for key in keys])))
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional, Set
+
+# Project root, so data lookups don't depend on the current working directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUILDINGS_DIR = 'Buildings'
+PATHS_DIR = 'Paths'
+
+logger = logging.getLogger(__name__)
+
+
+class GeometryRecord:
+    """Parsed GeoJSON file with its coordinates in (lat, lon) display order"""
+
+    __slots__ = ('name', 'file_path', 'geojson', 'coords', 'mtime')
+
+    def __init__(self, name: str, file_path: str, geojson: Dict, coords: np.ndarray, mtime: int):
+        self.name = name
+        self.file_path = file_path
+        self.geojson = geojson
+        self.coords = coords
+        self.mtime = mtime
+
+
+def extract_coords(geojson: Dict) -> np.ndarray:
+    """Return the last feature's line or outer ring as an (N, 2) lat/lon array"""
+    coordinates = []
+    for feature in geojson.get('features', []):
+        geometry = feature.get('geometry') or {}
+        geometry_type = geometry.get('type')
+        if geometry_type == 'LineString':
+            coordinates = geometry['coordinates']
+        elif geometry_type == 'Polygon':
+            coordinates = geometry['coordinates'][0]
+        elif geometry_type == 'Point':
+            coordinates = [geometry['coordinates']]
+
+    coords = np.array(coordinates, dtype=np.float64).reshape(-1, 2)
+    # GeoJSON stores (lon, lat); swap once here instead of on every request
+    return np.ascontiguousarray(coords[:, ::-1])
+
+
+class GeometryStore:
+    """Process-wide cache of the campus GeoJSON, shared by every service"""
+
+    def __init__(self, base_dir: str = BASE_DIR, refresh_interval: float = 5.0):
+        self.base_dir = base_dir
+        self.refresh_interval = refresh_interval
+        # Set while a DataReloader polls the files, so requests never stat them
+        self.watched = False
+        self._records: Dict[str, GeometryRecord] = {}
+        # mtime of files that failed to parse, so a broken save is reported once, not every poll
+        self._broken: Dict[str, int] = {}
+        # Incremented whenever a reload changes any file
+        self.generation = 0
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        """Parse the GeoJSON on first access, skipped entirely when a route index serves requests"""
+        if not self._loaded:
+            self.refresh()
+
+    def refresh(self) -> Set[str]:
+        """Reload files whose mtime changed, returning the affected file paths"""
+        with self._lock:
+            records = dict(self._records)
+            seen = set()
+            changed = set()
+            for directory in (BUILDINGS_DIR, PATHS_DIR):
+                try:
+                    entries = sorted(os.listdir(os.path.join(self.base_dir, directory)))
+                except OSError as e:
+                    logger.warning('Error listing %s: %s', directory, e)
+                    continue
+                for file_name in entries:
+                    if not file_name.endswith('.geojson'):
+                        continue
+                    file_path = f'{directory}/{file_name}'
+                    record = self._load(file_path, records.get(file_path))
+                    if record is None:
+                        # Gone since listing, or never parsed; a removed record is handled below
+                        continue
+                    seen.add(file_path)
+                    if record is not records.get(file_path):
+                        records[file_path] = record
+                        changed.add(file_path)
+
+            for file_path in set(records) - seen:
+                del records[file_path]
+                self._broken.pop(file_path, None)
+                changed.add(file_path)
+
+            # Swap the whole mapping so readers never see a partial reload
+            self._records = records
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+            if changed:
+                self.generation += 1
+
+        if changed:
+            logger.info('Geometry store loaded %d changed files', len(changed))
+        return changed
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the GeoJSON has been parsed, which a route index can avoid entirely"""
+        return self._loaded
+
+    def maybe_refresh(self) -> Set[str]:
+        """Refresh at most once per refresh_interval seconds, once the store has been loaded"""
+        if not self._loaded or self.watched or self.refresh_interval <= 0 \
+                or time.monotonic() - self._last_refresh < self.refresh_interval:
+            return set()
+        return self.refresh()
+
+    def _load(self, file_path: str, current: Optional[GeometryRecord]) -> Optional[GeometryRecord]:
+        """Parse a single GeoJSON file unless the loaded copy is still current
+
+        A file that fails to parse, such as a half-written save, keeps its last good copy.
+        Returns None only if the file is gone or has never parsed.
+        """
+        full_path = os.path.join(self.base_dir, file_path)
+        try:
+            mtime = os.stat(full_path).st_mtime_ns
+        except OSError:
+            return None
+        if current is not None and current.mtime == mtime or self._broken.get(file_path) == mtime:
+            return current
+        try:
+            with open(full_path) as f:
+                geojson = json.load(f)
+            coords = extract_coords(geojson)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning('Error loading geometry file %s, keeping the last good copy: %s', file_path, e)
+            self._broken[file_path] = mtime
+            return current
+        self._broken.pop(file_path, None)
+        name = os.path.basename(file_path).replace('.geojson', '')
+        return GeometryRecord(name, file_path, geojson, coords, mtime)
+
+    def get(self, file_path: str) -> Optional[GeometryRecord]:
+        """Look up a record by its data-relative path, e.g. 'Buildings/A1 block.geojson'"""
+        self._ensure_loaded()
+        return self._records.get(file_path)
+
+    def building(self, name: str) -> Optional[GeometryRecord]:
+        """Look up a building outline by name"""
+        self._ensure_loaded()
+        return self._records.get(f'{BUILDINGS_DIR}/{name}.geojson')
+
+    def path(self, name: str) -> Optional[GeometryRecord]:
+        """Look up a walkway path by name"""
+        self._ensure_loaded()
+        return self._records.get(f'{PATHS_DIR}/{name}.geojson')
+
+    def buildings(self) -> List[GeometryRecord]:
+        """All building outlines, sorted by file name"""
+        self._ensure_loaded()
+        return [record for file_path, record in sorted(self._records.items())
+                if file_path.startswith(BUILDINGS_DIR + '/')]
+
+    def paths(self) -> List[GeometryRecord]:
+        """All walkway paths, sorted by file name"""
+        self._ensure_loaded()
+        return [record for file_path, record in sorted(self._records.items())
+                if file_path.startswith(PATHS_DIR + '/')]
+
+    def version(self, file_path: str) -> Optional[int]:
+        """Modification time of the loaded copy of a file, None if missing"""
+        self._ensure_loaded()
+        record = self._records.get(file_path)
+        return record.mtime if record is not None else None
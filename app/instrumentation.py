@@ -0,0 +1,184 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow renders
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Payload buckets in bytes, for JSON responses up to full map pages
+SIZE_BUCKETS = (1024, 4096, 16384, 32768, 65536, 131072, 262144, 524288)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Process-local counters, gauges and histograms exported in Prometheus text format
+
+    Each worker process keeps its own values, so a scrape sees only the worker that answered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def describe(self, name: str, kind: str, text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Declare a metric's type and help text"""
+        self._help[name] = (kind, text)
+        if kind == 'histogram':
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """Increase a counter"""
+        key = _key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge"""
+        key = _key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a histogram sample"""
+        key = _key(labels)
+        buckets = self._buckets.get(name, LATENCY_BUCKETS)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts, then the sum and count of all samples
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            state[bisect_left(buckets, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a block of code as one stage of request handling"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('campus_stage_duration_seconds', time.perf_counter() - start, stage=stage)
+
+    def render(self) -> str:
+        """Serialize every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            families = [(name, 'counter', series) for name, series in self._counters.items()]
+            families += [(name, 'gauge', series) for name, series in self._gauges.items()]
+            for name, kind, series in sorted(families):
+                self._header(lines, name, kind)
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{_labels(key)} {_number(value)}')
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                buckets = self._buckets.get(name, LATENCY_BUCKETS)
+                for key, state in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), state):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _number(bound)
+                        lines.append(f'{name}_bucket{_labels(key + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(key)} {_number(state[-2])}')
+                    lines.append(f'{name}_count{_labels(key)} {state[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines: list, name: str, kind: str) -> None:
+        kind, text = self._help.get(name, (kind, name.replace('_', ' ')))
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def reset(self) -> None:
+        """Drop all recorded samples"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def _key(labels: Dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    pairs = []
+    for name, value in key:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
+metrics.describe('campus_stage_duration_seconds', 'histogram', 'Time spent in each stage of request handling')
+metrics.describe('campus_http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+metrics.describe('campus_http_requests_total', 'counter', 'HTTP requests by endpoint and status')
+metrics.describe('campus_cache_requests_total', 'counter', 'Cache lookups by cache and result')
+metrics.describe('campus_cache_entries', 'gauge', 'Entries currently held by each cache')
+metrics.describe('campus_reloads_total', 'counter', 'Campus data reloads swapped in')
+metrics.describe('campus_payload_bytes', 'histogram', 'Size of rendered payloads in bytes', SIZE_BUCKETS)
+metrics.describe('campus_render_queue_depth', 'gauge', 'Map renders running or waiting for a slot')
+metrics.describe('campus_render_shed_total', 'counter', 'Map renders refused by a full render queue, by reason')
+metrics.describe('campus_render_coalesced_total', 'counter', 'Map requests served by a render already in progress')
+metrics.describe('campus_render_degraded_total', 'counter', 'Shed map requests answered with a stale map or route data')
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only a fraction of the records logged with extra={'sampled': True}"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sampled', False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging(level: str, sample_rate: float) -> None:
+    """Set the app's log level and sampling of per-request records"""
+    logger = logging.getLogger('app')
+    logger.setLevel(getattr(logging, level.upper(), logging.WARNING))
+    # Filters only run on a handler for records propagated from the module loggers
+    handler = next((h for h in logger.handlers if getattr(h, 'campus', False)), None)
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.campus = True
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    handler.filters = [SamplingFilter(sample_rate)]
+
+def init_request_metrics(app) -> None:
+    """Record the latency and status of every request the app serves"""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            endpoint = request.endpoint or 'unmatched'
+            metrics.observe('campus_http_request_duration_seconds', time.perf_counter() - start,
+                            endpoint=endpoint, method=request.method)
+            metrics.inc('campus_http_requests_total', endpoint=endpoint, status=response.status_code)
+        return response
@@ -0,0 +1,32 @@
+import numpy as np
+from typing import Tuple
+
+
+def clip_walkways(node_coords: np.ndarray, edges: np.ndarray, lengths: np.ndarray,
+                  node_distances: np.ndarray, budget: float) -> Tuple[np.ndarray, float]:
+    """Walkway pieces within budget meters of an origin, as (S, 2, 2) lat/lon segments, and their total length
+
+    A point x meters along edge (a, b) is reached after min(d[a] + x, d[b] + length - x),
+    so each edge is kept whole, cut back to the stubs walked into from either end,
+    or dropped, all in one pass over the edge arrays.
+    """
+    if not len(edges):
+        return np.zeros((0, 2, 2)), 0.0
+    a, b = edges[:, 0], edges[:, 1]
+    safe = np.maximum(lengths, 1e-9)
+    # Meters of each edge walkable from its a end and from its b end
+    from_a = np.clip(budget - node_distances[a], 0.0, lengths)
+    from_b = np.clip(budget - node_distances[b], 0.0, lengths)
+    whole = from_a + from_b >= lengths
+    stub_a = ~whole & (from_a > 0)
+    stub_b = ~whole & (from_b > 0)
+
+    start, end = node_coords[a], node_coords[b]
+    along = end - start
+    pieces = [
+        np.stack([start[whole], end[whole]], axis=1),
+        np.stack([start[stub_a], start[stub_a] + along[stub_a] * (from_a[stub_a] / safe[stub_a])[:, None]], axis=1),
+        np.stack([end[stub_b], end[stub_b] - along[stub_b] * (from_b[stub_b] / safe[stub_b])[:, None]], axis=1),
+    ]
+    total = float(lengths[whole].sum() + from_a[stub_a].sum() + from_b[stub_b].sum())
+    return np.concatenate(pieces), total
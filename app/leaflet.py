@@ -0,0 +1,191 @@
+import html
+from typing import Dict, List, Optional, Sequence, Tuple
+from jinja2 import Environment
+
+# Same assets, base layer and styles Folium emits, so both renderers draw identical maps
+LEAFLET_JS = [
+    'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.js',
+    'https://cdn.jsdelivr.net/npm/leaflet-ant-path@1.1.2/dist/leaflet-ant-path.min.js',
+]
+LEAFLET_CSS = [
+    'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/css/bootstrap.min.css',
+    'https://netdna.bootstrapcdn.com/bootstrap/3.0.0/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.2.0/css/all.min.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.css',
+    'https://cdn.jsdelivr.net/gh/python-visualization/folium/folium/templates/leaflet.awesome.rotate.min.css',
+]
+BASE_LAYER = {
+    'url': 'https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
+    'options': {
+        'attribution': 'Data by &copy; <a target="_blank" href="http://openstreetmap.org">OpenStreetMap</a>, '
+                       'under <a target="_blank" href="http://www.openstreetmap.org/copyright">ODbL</a>.',
+        'detectRetina': False, 'maxNativeZoom': 18, 'maxZoom': 18, 'minZoom': 0,
+        'noWrap': False, 'opacity': 1, 'subdomains': 'abc', 'tms': False
+    }
+}
+BUILDING_STYLE = {'color': '#000000', 'fillColor': '#3388ff', 'fillOpacity': 0.1, 'weight': 2}
+ROUTE_STYLE = {
+    'color': 'red', 'weight': 4, 'opacity': 0.8, 'dashArray': [10, 20], 'delay': 400,
+    'pulseColor': '#FFFFFF', 'paused': False, 'reverse': False, 'hardwareAcceleration': False
+}
+
+# Draws buildings and walkways from the /tiles endpoint onto the Leaflet map named map_name
+TILE_LAYER_SCRIPT = """
+        (function() {
+            var map = {{ map_name }};
+            var buildingStyle = {color: '#000000', weight: 2, fillColor: '#3388ff', fillOpacity: 0.1};
+            var walkwayStyle = {color: '#555555', weight: 2, opacity: 0.5, dashArray: '4 6'};
+            var buildings = L.layerGroup().addTo(map);
+            var walkways = L.layerGroup().addTo(map);
+            // Outlines are shared by every tile they overlap and drawn once
+            var drawn = {};
+            var tileLayers = {};
+
+            function keyOf(coords) {
+                return coords.z + '/' + coords.x + '/' + coords.y;
+            }
+
+            var tiles = L.GridLayer.extend({
+                createTile: function(coords, done) {
+                    var tile = document.createElement('div');
+                    var key = keyOf(coords);
+                    fetch(L.Util.template({{ url|tojson }}, coords))
+                        .then(function(response) {
+                            // Tiles off the campus are 404s, drawn as empty
+                            return response.ok ? response.json() : {features: []};
+                        })
+                        .then(function(data) {
+                            var owned = tileLayers[key] = {names: [], layers: []};
+                            data.features.forEach(function(feature) {
+                                var name = feature.properties.name;
+                                if (feature.properties.layer === 'buildings') {
+                                    if (!drawn[name]) {
+                                        drawn[name] = {count: 0, layer: L.geoJSON(feature, {style: buildingStyle})
+                                            .bindTooltip(name).bindPopup(name).addTo(buildings)};
+                                    }
+                                    drawn[name].count += 1;
+                                    owned.names.push(name);
+                                } else {
+                                    owned.layers.push(L.geoJSON(feature, {style: walkwayStyle}).addTo(walkways));
+                                }
+                            });
+                            done(null, tile);
+                        })
+                        .catch(function(error) { done(error, tile); });
+                    return tile;
+                }
+            });
+
+            new tiles({minZoom: {{ min_zoom }}, maxNativeZoom: {{ max_zoom }}, maxZoom: 22})
+                .on('tileunload', function(e) {
+                    var owned = tileLayers[keyOf(e.coords)];
+                    if (!owned) {
+                        return;
+                    }
+                    owned.layers.forEach(function(layer) { walkways.removeLayer(layer); });
+                    owned.names.forEach(function(name) {
+                        drawn[name].count -= 1;
+                        if (!drawn[name].count) {
+                            buildings.removeLayer(drawn[name].layer);
+                            delete drawn[name];
+                        }
+                    });
+                    delete tileLayers[keyOf(e.coords)];
+                })
+                .addTo(map);
+        })();
+"""
+
+MAP_DOCUMENT = """<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="content-type" content="text/html; charset=UTF-8" />
+<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no" />
+{% for url in css %}<link rel="stylesheet" href="{{ url }}"/>
+{% endfor %}{% for url in js %}<script src="{{ url }}"></script>
+{% endfor %}<style>html, body {width: 100%;height: 100%;margin: 0;padding: 0;} #map {position: absolute;top: 0;bottom: 0;right: 0;left: 0;} .leaflet-container { font-size: 1rem; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var data = {{ data|tojson }};
+var campusMap = L.map('map', {center: data.center, crs: L.CRS.EPSG3857, zoom: data.zoom, zoomControl: true, preferCanvas: false});
+var baseLayers = {'openstreetmap': L.tileLayer(data.base.url, data.base.options).addTo(campusMap)};
+var overlays = {};
+data.outlines.forEach(function(outline) {
+    var layer = L.geoJson(outline.geojson, {style: function() { return data.buildingStyle; }});
+    if (data.tooltips) {
+        var tooltip = document.createElement('div');
+        tooltip.textContent = outline.label;
+        layer.bindTooltip(tooltip, {sticky: true});
+    }
+    if (data.popups) {
+        var popup = document.createElement('div');
+        popup.style.width = '100%';
+        popup.style.height = '100%';
+        popup.textContent = outline.label;
+        layer.bindPopup(popup, {maxWidth: '100%'});
+    }
+    overlays[outline.label] = layer.addTo(campusMap);
+});
+if (data.path) {
+    L.polyline.antPath(data.path, data.routeStyle).addTo(campusMap);
+}
+data.markers.forEach(function(marker) {
+    var icon = L.AwesomeMarkers.icon({extraClasses: 'fa-rotate-0', icon: 'info-sign', iconColor: 'white',
+                                      markerColor: marker.color, prefix: 'glyphicon'});
+    var popup = document.createElement('div');
+    popup.textContent = marker.popup;
+    L.marker(marker.location, {icon: icon, name: marker.name}).bindPopup(popup, {maxWidth: '100%'}).addTo(campusMap);
+});
+{% if tiles %}{% with map_name='campusMap', url=tiles[0], min_zoom=tiles[1], max_zoom=tiles[2] %}""" + TILE_LAYER_SCRIPT + """{% endwith %}{% endif %}
+L.control.layers(baseLayers, overlays, {autoZIndex: true, collapsed: true, position: 'topright'}).addTo(campusMap);
+</script>
+</body>
+</html>"""
+
+# Folium's _repr_html_ iframe, so pages lay the map out the same whichever renderer drew it
+MAP_FRAME = ('<div style="width:100%;"><div style="position:relative;width:100%;height:0;padding-bottom:60%;">'
+             '<iframe srcdoc="{}" style="position:absolute;width:100%;height:100%;left:0;top:0;'
+             'border:none !important;" allowfullscreen webkitallowfullscreen mozallowfullscreen></iframe>'
+             '</div></div>')
+
+
+class LeafletRenderer:
+    """Writes Leaflet map pages straight from prepared geometry, without building a Folium element tree
+
+    The document template is compiled once; rendering a map only serializes its data.
+    """
+
+    def __init__(self, location: Sequence[float], zoom_start: int = 20, tile_url: Optional[str] = None,
+                 tile_min_zoom: int = 15, tile_max_zoom: int = 19):
+        self.location = list(location)
+        self.zoom_start = zoom_start
+        self.tiles = (tile_url, tile_min_zoom, tile_max_zoom) if tile_url else None
+        self._template = Environment(autoescape=False).from_string(MAP_DOCUMENT)
+
+    def render(self, outlines: List[Tuple[str, Dict]], path: Optional[List[List[float]]] = None,
+               markers: Sequence[Tuple[List[float], str, str, str]] = (), tooltips: bool = False,
+               popups: bool = False, tiles: bool = False) -> str:
+        """Map HTML with named outlines, an optional animated path and (location, popup, color, name) markers
+
+        tooltips and popups label each outline with its name on hover and on click.
+        """
+        data = {
+            'center': self.location,
+            'zoom': self.zoom_start,
+            'base': BASE_LAYER,
+            'buildingStyle': BUILDING_STYLE,
+            'routeStyle': ROUTE_STYLE,
+            'tooltips': tooltips,
+            'popups': popups,
+            'outlines': [{'label': label, 'geojson': geojson} for label, geojson in outlines],
+            'path': path,
+            'markers': [{'location': location, 'popup': popup, 'color': color, 'name': name}
+                        for location, popup, color, name in markers],
+        }
+        document = self._template.render(data=data, css=LEAFLET_CSS, js=LEAFLET_JS,
+                                         tiles=self.tiles if tiles else None)
+        return MAP_FRAME.format(html.escape(document))
@@ -1,12 +1,208 @@
-from flask import Blueprint, render_template, request
-from app.models import CampusNavigation
-from app.services import MapService
+import logging
+from typing import Dict, Iterable, Iterator, Optional, Union
+from flask import Blueprint, Response, current_app, jsonify, render_template, request, stream_template, url_for
+from app.compression import MapArtifact, artifact_response
+from app.extensions import campus_nav, get_services, map_service
+from app.instrumentation import metrics
+from app.render_queue import RenderQueueFull
 
 main = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
-# Initialize campus navigation and map service
-campus_nav = CampusNavigation()
-map_service = MapService(campus_nav)
+# Streamed pages are sent in pieces of about this many bytes rather than one per template fragment
+STREAM_CHUNK_SIZE = 8192
+
+# Third-party assets of index.html and the map documents, precached for offline use by the service worker
+PAGE_ASSETS = [
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+    'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css',
+    'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js',
+    'https://cdn.jsdelivr.net/gh/rubenspgcavalcante/leaflet-ant-path/dist/leaflet-ant-path.min.js',
+]
+FOLIUM_JS = [
+    'https://code.jquery.com/jquery-1.12.4.min.js',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.2.2/dist/js/bootstrap.bundle.min.js',
+]
+
+def _chunked(pieces: Iterable[str], size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """Join small template fragments into pieces of at least size characters"""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_page(**context) -> Response:
+    """Stream index.html as it renders; its map, if any, is fetched from map_url afterwards"""
+    pieces = stream_template('index.html', building_descriptions=campus_nav.get_building_descriptions(), **context)
+    return Response(_chunked(pieces), mimetype='text/html')
+
+def error_page(message: str):
+    """Index page showing an error over the empty map"""
+    if current_app.config['STREAM_PAGE_SHELL']:
+        return stream_page(map_url=url_for('main.empty_map'), error=message)
+    return render_template('index.html', 
+                        map=map_service.create_empty_map(), 
+                        error=message,
+                        building_descriptions=campus_nav.get_building_descriptions())
+
+def busy_payload(navigation, error: RenderQueueFull, start_file: str, dest_file: str) -> Dict:
+    """Body of a shed map request: the error and, for a valid route, its /api/route data to draw instead"""
+    payload = {'error': str(error), 'retry_after': error.retry_after}
+    if start_file and dest_file and start_file != dest_file and navigation.validate_route(start_file, dest_file)[0]:
+        payload['route'] = navigation.get_route_payload(start_file, dest_file)
+    return payload
+
+@main.app_errorhandler(RenderQueueFull)
+def render_queue_full(error: RenderQueueFull):
+    """503 with Retry-After for a map render shed under load"""
+    start_file = request.values.get('start', '').strip()
+    dest_file = request.values.get('dest', '').strip()
+    metrics.inc('campus_render_degraded_total', queue='route_map', fallback='busy')
+    response = jsonify(busy_payload(campus_nav, error, start_file, dest_file))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def get_landing_page() -> MapArtifact:
+    """Return the rendered landing page artifact"""
+    landing_page = get_services().landing_page
+    if current_app.config['STREAM_PAGE_SHELL']:
+        # The shell doesn't change with the data; the map is fetched from /map by the page
+        source, context = 'shell', {'map_url': url_for('main.empty_map')}
+    else:
+        empty_map = map_service.get_empty_map()
+        source, context = empty_map.etag, {'map': empty_map.html}
+    if landing_page['source'] != source:
+        metrics.inc('campus_cache_requests_total', cache='landing_page', result='miss')
+        with metrics.timer('template_render'):
+            page = MapArtifact(render_template('index.html', 
+                                              building_descriptions=campus_nav.get_building_descriptions(),
+                                              **context))
+        metrics.observe('campus_payload_bytes', len(page.html), payload='landing_page')
+        landing_page['page'], landing_page['source'] = page, source
+    else:
+        metrics.inc('campus_cache_requests_total', cache='landing_page', result='hit')
+    return landing_page['page']
+
+def get_route_page(start_file: str, dest_file: str) -> Union[MapArtifact, str]:
+    """Return the rendered page for a route, or the error message if it can't be drawn"""
+    map_html = map_service.create_route_map(start_file, dest_file)
+    if map_service.is_error(map_html):
+        return map_html
+
+    # Pages are deterministic per route map, so they are cached (and compressed) once
+    route_pages = get_services().route_pages
+    condition = (start_file, dest_file)
+    signature = (len(map_html), hash(map_html))
+    page = route_pages.get(condition, signature)
+    if page is None:
+        # Get route information for display
+        route_info = campus_nav.get_route_info(start_file, dest_file)
+        with metrics.timer('template_render'):
+            page = MapArtifact(render_template('index.html', 
+                                              map=map_html, 
+                                              route_info=route_info,
+                                              building_descriptions=campus_nav.get_building_descriptions()))
+        metrics.observe('campus_payload_bytes', len(page.html), payload='route_page')
+        route_pages.put(condition, signature, page)
+    return page
+
+def get_route_fragment(start_file: str, dest_file: str) -> Union[MapArtifact, str]:
+    """Return a route's map on its own, or the error message if it can't be drawn"""
+    map_html = map_service.create_route_map(start_file, dest_file)
+    if map_service.is_error(map_html):
+        return map_html
+
+    route_pages = get_services().route_pages
+    key = ('map', start_file, dest_file)
+    signature = (len(map_html), hash(map_html))
+    fragment = route_pages.get(key, signature)
+    if fragment is None:
+        fragment = MapArtifact(map_html)
+        route_pages.put(key, signature, fragment)
+    return fragment
+
+def route_error(start_file: str, dest_file: str) -> Optional[str]:
+    """Why a route can't be shown, without drawing its map"""
+    if not start_file or not dest_file:
+        return "Please select both start and destination locations."
+    if start_file == dest_file:
+        return "Start and destination cannot be the same."
+    is_valid, error_message = campus_nav.validate_route(start_file, dest_file)
+    return None if is_valid else error_message
+
+@main.route('/map')
+def empty_map():
+    """The campus map on its own, loaded by pages after their shell"""
+    return artifact_response(map_service.get_empty_map(), current_app.config['MAP_FRAGMENT_MAX_AGE'])
+
+@main.route('/map/route')
+def route_map():
+    """A route's map on its own, loaded by route pages after their shell"""
+    start_file = request.args.get('start', '').strip()
+    dest_file = request.args.get('dest', '').strip()
+    fragment = get_route_fragment(start_file, dest_file)
+    if isinstance(fragment, str):
+        return Response(fragment, 400 if not start_file or not dest_file else 404, mimetype='text/plain')
+    return artifact_response(fragment, current_app.config['MAP_FRAGMENT_MAX_AGE'])
+
+@main.route('/tour')
+def tour():
+    """Map of the shortest walk visiting every ?stops= building, starting at the first"""
+    stops = [name.strip() for name in request.args.getlist('stops') if name.strip()]
+    round_trip = request.args.get('round_trip', '').lower() in ('1', 'true', 'yes')
+
+    is_valid, message = campus_nav.validate_tour(stops)
+    error = None if is_valid else message
+    if error is None and len(stops) > current_app.config['TOUR_MAX_STOPS']:
+        error = f"At most {current_app.config['TOUR_MAX_STOPS']} stops per tour."
+    if error is None:
+        tour_plan = campus_nav.plan_tour(stops, round_trip=round_trip,
+                                         exact_max=current_app.config['TOUR_EXACT_MAX_STOPS'])
+        if tour_plan is None:
+            error = 'Some of these stops are not connected by a walkway.'
+        else:
+            try:
+                map_html = map_service.create_tour_map(tour_plan)
+            except RenderQueueFull as busy:
+                metrics.inc('campus_render_degraded_total', queue='route_map', fallback='busy')
+                return error_page(str(busy)), 503, {'Retry-After': str(busy.retry_after)}
+            if map_service.is_error(map_html):
+                error = map_html
+
+    if error is not None:
+        return error_page(error)
+
+    route_info = dict(tour_plan['metrics'].to_dict(), route_type='Tour: ' + ' → '.join(tour_plan['stops']))
+    return render_template('index.html', 
+                        map=map_html, 
+                        route_info=route_info,
+                        building_descriptions=campus_nav.get_building_descriptions())
+
+@main.route('/sw.js')
+def service_worker():
+    """Service worker that keeps the page, its assets and the offline data bundle for use without a connection"""
+    offline = get_services().offline
+    if offline['worker'] is None:
+        from app.leaflet import LEAFLET_CSS, LEAFLET_JS
+        # Folium maps also load jQuery and Bootstrap's scripts
+        assets = PAGE_ASSETS + LEAFLET_CSS + LEAFLET_JS + FOLIUM_JS
+        offline['worker'] = MapArtifact(render_template('sw.js', assets=list(dict.fromkeys(assets))))
+    return artifact_response(offline['worker'], 0, mimetype='application/javascript')
+
+@main.route('/tiles/<int:z>/<int:x>/<int:y>')
+def tile(z: int, x: int, y: int):
+    """GeoJSON tile of building outlines and walkways"""
+    artifact = get_services().tiles.get(z, x, y)
+    if artifact is None:
+        return Response('No such tile', 404, mimetype='text/plain')
+    return artifact_response(artifact, current_app.config['TILE_MAX_AGE'], mimetype='application/geo+json')
 
 @main.route('/', methods=['GET', 'POST'])
 def index():
@@ -15,33 +211,34 @@ def index():
         start_file = request.form.get('start', '').strip()
         dest_file = request.form.get('dest', '').strip()
         
-        print(f"Received POST request: {start_file} -> {dest_file}")
+        logger.debug('Received POST request: %s -> %s', start_file, dest_file, extra={'sampled': True})
         
         # Validate form data
         if not start_file or not dest_file:
-            return render_template('index.html', 
-                                map=map_service.create_empty_map(), 
-                                error="Please select both start and destination locations.",
-                                building_descriptions=campus_nav.get_building_descriptions())
+            return error_page("Please select both start and destination locations.")
+
+        if current_app.config['STREAM_PAGE_SHELL']:
+            # Send the sidebar now; the page fetches the route's map from /map/route
+            with metrics.timer('validation'):
+                error_message = route_error(start_file, dest_file)
+            if error_message is not None:
+                return error_page(error_message)
+            return stream_page(map_url=url_for('main.route_map', start=start_file, dest=dest_file),
+                               route_info=campus_nav.get_route_info(start_file, dest_file))
         
-        map_html = map_service.create_route_map(start_file, dest_file)
+        try:
+            page = get_route_page(start_file, dest_file)
+        except RenderQueueFull:
+            # Too busy to draw the map now; send the page without it, to fetch or draw it client-side
+            metrics.inc('campus_render_degraded_total', queue='route_map', fallback='shell')
+            return stream_page(map_url=url_for('main.route_map', start=start_file, dest=dest_file),
+                               route_info=campus_nav.get_route_info(start_file, dest_file))
         
         # Check if there was an error
-        if map_html.startswith("Error") or map_html.startswith("Invalid") or map_html.startswith("Please"):
-            return render_template('index.html', 
-                                map=map_service.create_empty_map(), 
-                                error=map_html,
-                                building_descriptions=campus_nav.get_building_descriptions())
+        if isinstance(page, str):
+            return error_page(page)
         
-        # Get route information for display
-        route_info = campus_nav.get_route_info(start_file, dest_file)
-        
-        return render_template('index.html', 
-                            map=map_html, 
-                            route_info=route_info,
-                            building_descriptions=campus_nav.get_building_descriptions())
+        return artifact_response(page)
     
-    print("Rendering initial page with empty map")
-    return render_template('index.html', 
-                        map=map_service.create_empty_map(),
-                        building_descriptions=campus_nav.get_building_descriptions()) 
\ No newline at end of file
+    # Serve the prerendered landing page, answering revalidations with 304
+    return artifact_response(get_landing_page(), current_app.config['LANDING_PAGE_MAX_AGE']) 
\ No newline at end of file
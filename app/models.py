@@ -1,11 +1,209 @@
-import json
+import logging
 import os
-from typing import Dict, List, Tuple, Optional
+import threading
+import time
+import numpy as np
+from typing import Dict, Iterator, List, Sequence, Set, Tuple, Optional
+from app.cache import RouteMapCache
+from app.compiler import campus_spatial_index, derive_route_table
+from app.geodesy import WALKING_SPEED_M_PER_MIN, RouteMetrics, measure_route_table, segment_lengths
+from app.geometry import BUILDINGS_DIR, GeometryStore
+from app.instrumentation import metrics
+from app.isochrone import clip_walkways
+from app.polyline import encode_polyline
+from app.route_index import RouteIndex, source_mtimes
+from app.routing import WalkwayGraph
+from app.spatial import SpatialIndex
+from app.tour import EXACT_MAX_STOPS, solve_tour
+
+logger = logging.getLogger(__name__)
+
+def _encode_coords(coords: np.ndarray, encoding: Optional[str]):
+    """Coordinates as rounded [lat, lon] pairs, or an encoded polyline"""
+    if encoding == 'polyline':
+        return encode_polyline(coords)
+    return np.round(coords, 7).tolist()
+
+class CampusData:
+    """Routes, outlines and lookups from one load of the campus data, swapped in whole on reload"""
+
+    def __init__(self, geometry: GeometryStore, snap_tolerance: float, route_index: Optional[RouteIndex],
+                 location: Tuple[float, float], generation: int = 0):
+        self.route_index = route_index
+        self.location = location
+        # Counts swaps; outline_generation only moves when an outline changed
+        self.generation = generation
+        self.outline_generation = 0
+        if route_index is None:
+            self.router = WalkwayGraph.from_store(geometry, snap_tolerance)
+            self.geometry_generation = geometry.generation
+            self._outlines = {record.file_path: record for record in geometry.buildings()}
+        else:
+            # Nothing is parsed; every lookup reads the memory-mapped index
+            self.router = None
+            self.geometry_generation = None
+            self._outlines = {}
+        self._route_metrics: Optional[Dict[Tuple[str, str], RouteMetrics]] = None
+        self._spatial: Optional[SpatialIndex] = None
+        self._route_table: Optional[Dict[Tuple[str, str], Dict]] = None
+        self._route_matrix: Optional[Tuple[Dict[str, int], np.ndarray]] = None
+        self._walkways: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._node_distances: Dict[str, np.ndarray] = {}
+        # Isochrone payloads per (origin, minutes, encoding); dropped with the snapshot on reload
+        self.isochrones = RouteMapCache(64, name='isochrone')
+
+    @property
+    def source(self):
+        """The route index, or the walkway graph when there is none"""
+        return self.route_index if self.route_index is not None else self.router
+
+    def buildings(self) -> List[str]:
+        if self.route_index is not None:
+            return list(self.route_index.buildings)
+        return sorted(self.router.entrances)
+
+    def find_route(self, start: str, destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        return self.source.route(start, destination)
+
+    def outline_names(self) -> List[str]:
+        if self.route_index is not None:
+            return list(self.route_index.outline_names)
+        return [record.name for record in self._outlines.values()]
+
+    def outline(self, name: str) -> Optional[Dict]:
+        if self.route_index is not None:
+            return self.route_index.outline(name)
+        record = self._outlines.get(f'{BUILDINGS_DIR}/{name}.geojson')
+        return record.geojson if record is not None else None
+
+    def outline_coords(self, name: str) -> Optional[np.ndarray]:
+        if self.route_index is not None:
+            return self.route_index.outline_coords_for(name)
+        record = self._outlines.get(f'{BUILDINGS_DIR}/{name}.geojson')
+        return record.coords if record is not None else None
+
+    def outline_version(self, file_path: str) -> Optional[int]:
+        if self.route_index is not None:
+            return self.route_index.sources.get(file_path)
+        record = self._outlines.get(file_path)
+        return record.mtime if record is not None else None
+
+    @property
+    def route_metrics(self) -> Dict[Tuple[str, str], RouteMetrics]:
+        """Distance and walking time of every route, measured on first use"""
+        if self._route_metrics is None:
+            buildings = self.buildings()
+            routes = {}
+            for start in buildings:
+                for dest in buildings:
+                    route = self.find_route(start, dest) if start != dest else None
+                    if route is not None:
+                        routes[(start, dest)] = route[1]
+            self._route_metrics = measure_route_table(routes)
+        return self._route_metrics
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """R-trees over the building outlines and walkway nodes"""
+        if self._spatial is None:
+            outlines = {name: self.outline_coords(name) for name in self.outline_names()}
+            node_coords = self.route_index.node_coords if self.route_index is not None else self.router.node_coords()
+            self._spatial = SpatialIndex(self.location, outlines, node_coords)
+        return self._spatial
+
+    @property
+    def route_table(self) -> Dict[Tuple[str, str], Dict]:
+        """Outlines and description of every route, compiled into the index or derived from the graph"""
+        if self._route_table is None:
+            if self.route_index is not None:
+                self._route_table = self.route_index.routes
+            else:
+                routes = {pair: self.find_route(*pair)[1] for pair in self.route_metrics}
+                self._route_table = derive_route_table(routes, campus_spatial_index(self._outlines.values()))
+        return self._route_table
+
+    @property
+    def route_matrix(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """Building ids and the (B, B) matrix of route distances, NaN where no walkway connects them"""
+        if self._route_matrix is None:
+            ids = {name: i for i, name in enumerate(self.buildings())}
+            distances = np.full((len(ids), len(ids)), np.nan)
+            np.fill_diagonal(distances, 0.0)
+            for (start, dest), route_metrics in self.route_metrics.items():
+                distances[ids[start], ids[dest]] = route_metrics.distance
+            self._route_matrix = ids, distances
+        return self._route_matrix
+
+    @property
+    def walkways(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Node coordinates, (E, 2) node id edges and edge lengths of the walkway graph"""
+        if self._walkways is None:
+            if self.route_index is not None:
+                self._walkways = self.route_index.node_coords, self.route_index.edges, self.route_index.edge_lengths
+            else:
+                self._walkways = (self.router.node_coords(),) + self.router.edges()
+        return self._walkways
+
+    def entrances(self, building: str) -> List[int]:
+        if self.route_index is not None:
+            return self.route_index.entrances(building)
+        return list(self.router.entrances.get(building, []))
+
+    def node_distances(self, origin: str) -> Optional[np.ndarray]:
+        """Walking distance from a building's nearest entrance to every walkway node, searched once per building"""
+        distances = self._node_distances.get(origin)
+        if distances is None:
+            sources = self.entrances(origin)
+            if not sources:
+                return None
+            if self.route_index is not None:
+                distances = self.route_index.distances_from(sources)
+            else:
+                distances = np.array(self.router.dijkstra_from(sources)[0], dtype=np.float64)
+            self._node_distances[origin] = distances
+        return distances
+
+    def warm(self) -> 'CampusData':
+        """Compute every lazy table now, so the first request after a swap doesn't pay for it"""
+        self.route_metrics
+        self.spatial
+        self.route_table
+        self.route_matrix
+        self.walkways
+        return self
+
+    def changes_since(self, old: 'CampusData') -> Tuple[Set[str], Set[Tuple[str, str]]]:
+        """Outline file paths and routes whose data differs from an older snapshot"""
+        files = set(old.outline_file_paths()) | set(self.outline_file_paths())
+        outlines = {file_path for file_path in files if old.outline_version(file_path) != self.outline_version(file_path)}
+        routes = set()
+        for pair in set(old.route_metrics) | set(self.route_metrics):
+            old_route, new_route = old.find_route(*pair), self.find_route(*pair)
+            old_info, new_info = old.route_table.get(pair), self.route_table.get(pair)
+            if old_route is None or new_route is None or old_info != new_info:
+                routes.add(pair)
+            elif not np.array_equal(old_route[1], new_route[1]) or outlines.intersection(new_info['buildings']):
+                routes.add(pair)
+        return outlines, routes
+
+    def outline_file_paths(self) -> List[str]:
+        return [f'{BUILDINGS_DIR}/{name}.geojson' for name in self.outline_names()]
+
 
 class CampusNavigation:
     """Handles campus navigation logic and data management"""
     
-    def __init__(self):
+    def __init__(self, geometry: Optional[GeometryStore] = None, snap_tolerance: float = 3.0):
+        # Parsed GeoJSON shared with MapService, loaded once per process
+        self.geometry = geometry or GeometryStore()
+        self.snap_tolerance = snap_tolerance
+        # Everything served comes from one CampusData snapshot, replaced by reference on reload
+        self._data: Optional[CampusData] = None
+        self._reload_lock = threading.Lock()
+        self._last_reload = time.monotonic()
+        # Precomputed building-to-building routes, used instead of the graph when available
+        self._index_path: Optional[str] = None
+        self._index_stat = None
         self.location = (41.42925349851171, 75.9012347499233)  # Default location coordinates
 
         # Building descriptions - updated to reflect that only Academic block is academic, others are dormitories
@@ -17,258 +215,190 @@ class CampusNavigation:
             'B2 block': 'Student dormitory'
         }
 
-        # Define paths and buildings for navigation
-        self.building_files = self._initialize_routes()
+    def load_route_index(self, path: str) -> bool:
+        """Memory-map a prebuilt route index, falling back to the graph if it is missing or stale"""
+        self._index_path = path
+        self._index_stat = self._stat_index()
+        route_index = RouteIndex.open(path, self.geometry.base_dir)
+        if route_index is not None:
+            logger.info('Loaded route index %s with %d buildings', path, len(route_index.buildings))
+        with self._reload_lock:
+            old = self._data
+            data = CampusData(self.geometry, self.snap_tolerance, route_index, self.location,
+                              old.generation + 1 if old is not None else 0)
+            if old is not None:
+                data.outline_generation = old.outline_generation + 1
+            self._data = data
+        return route_index is not None
+
+    def _stat_index(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._index_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def data(self) -> CampusData:
+        """The current snapshot; hold on to it to answer a request from one consistent load"""
+        data = self._data
+        if data is None:
+            with self._reload_lock:
+                if self._data is None:
+                    self._data = CampusData(self.geometry, self.snap_tolerance, None, self.location)
+                data = self._data
+        return data
+
+    @property
+    def route_index(self) -> Optional[RouteIndex]:
+        return self.data.route_index
+
+    def _current_index(self, old: CampusData) -> Optional[RouteIndex]:
+        """The route index the next snapshot should use, reopened only if it or its sources changed"""
+        if self._index_path is None:
+            return None
+        stat = self._stat_index()
+        if stat == self._index_stat:
+            # An unchanged file that was stale or missing stays unused until it is rebuilt
+            if old.route_index is None or old.route_index.sources == source_mtimes(self.geometry.base_dir):
+                return old.route_index
+        self._index_stat = stat
+        index = RouteIndex.open(self._index_path, self.geometry.base_dir)
+        if index is not None and old.route_index is not None and index.checksum == old.route_index.checksum:
+            # Keep the mtimes the data was just checked against, so the next poll doesn't hash it again
+            old.route_index.sources = index.sources
+            return old.route_index
+        return index
+
+    def reload(self) -> Optional[Dict]:
+        """Rebuild from changed GeoJSON or route index off to the side, then swap it in whole
 
-    def _initialize_routes(self) -> Dict[Tuple[str, str], Dict]:
-        """Initialize all available routes between buildings"""
+        Returns what changed and how long it took, or None if nothing did.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            self._last_reload = time.monotonic()
+            old = self._data
+            if old is None:
+                # Nothing loaded yet, the first request loads the current files
+                return None
+            index = self._current_index(old)
+            if index is None or self.geometry.loaded:
+                # Tiles read the store directly, so keep it current once anything has parsed it
+                self.geometry.refresh()
+            if index is old.route_index and (index is not None or self.geometry.generation == old.geometry_generation):
+                return None
+
+            data = CampusData(self.geometry, self.snap_tolerance, index, self.location, old.generation + 1).warm()
+            outlines, routes = data.changes_since(old)
+            data.outline_generation = old.outline_generation + (1 if outlines else 0)
+            # Requests already holding the old snapshot finish with it
+            self._data = data
+            duration = time.perf_counter() - started
+
+        metrics.observe('campus_stage_duration_seconds', duration, stage='reload')
+        metrics.inc('campus_reloads_total')
+        logger.info('Reloaded campus data in %.1f ms from %s: %d outlines and %d routes changed',
+                    duration * 1000, 'route index' if index is not None else 'GeoJSON', len(outlines), len(routes))
         return {
-            ('Academic block', 'A1 block'): {
-                'path': 'Paths/Academic block_to_A1 block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson'
-                ],
-                'estimated_time': 2,
-                'distance': '150m',
-                'route_type': 'Direct via bridge'
-            },
-            ('Academic block', 'A2 block'): {
-                'path': 'Paths/Academic block_to_A2 block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '250m',
-                'route_type': 'Via A1 block and under bridge'
-            },
-            ('Academic block', 'B1 block'): {
-                'path': 'Paths/Academic block_to_B1 block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '200m',
-                'route_type': 'Direct via bridge'
-            },
-            ('Academic block', 'B2 block'): {
-                'path': 'Paths/Academic block_to_B2 block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 4,
-                'distance': '300m',
-                'route_type': 'Via B1 block and under bridge'
-            },
-            ('A1 block', 'Academic block'): {
-                'path': 'Paths/A1 block_to_Academic block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson'
-                ],
-                'estimated_time': 2,
-                'distance': '150m',
-                'route_type': 'Direct via bridge'
-            },
-            ('A1 block', 'A2 block'): {
-                'path': 'Paths/A1 block_to_A2 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 1,
-                'distance': '100m',
-                'route_type': 'Direct under bridge'
-            },
-            ('A1 block', 'B1 block'): {
-                'path': 'Paths/A1 block_to_B1 block.geojson',
-                'buildings': [
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/B1 block.geojson'
-                ],
-                'estimated_time': 2,
-                'distance': '180m',
-                'route_type': 'Via bridge'
-            },
-            ('A1 block', 'B2 block'): {
-                'path': 'Paths/A1 block_to_B2 block.geojson',
-                'buildings': [
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '280m',
-                'route_type': 'Via bridge and B1 block'
-            },
-            ('A2 block', 'Academic block'): {
-                'path': 'Paths/A2 block_to_Academic block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '250m',
-                'route_type': 'Via A1 block and bridge'
-            },
-            ('A2 block', 'A1 block'): {
-                'path': 'Paths/A2 block_to_A1 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 1,
-                'distance': '100m',
-                'route_type': 'Direct under bridge'
-            },
-            ('A2 block', 'B1 block'): {
-                'path': 'Paths/A2 block_to_B1 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '280m',
-                'route_type': 'Via A1 block and bridge'
-            },
-            ('A2 block', 'B2 block'): {
-                'path': 'Paths/A2 block_to_B2 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 4,
-                'distance': '380m',
-                'route_type': 'Via A1 block, bridge, and B1 block'
-            },
-            ('B1 block', 'Academic block'): {
-                'path': 'Paths/B1 block_to_Academic block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '200m',
-                'route_type': 'Direct via bridge'
-            },
-            ('B1 block', 'A1 block'): {
-                'path': 'Paths/B1 block_to_A1 block.geojson',
-                'buildings': [
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/B1 block.geojson'
-                ],
-                'estimated_time': 2,
-                'distance': '180m',
-                'route_type': 'Via bridge'
-            },
-            ('B1 block', 'A2 block'): {
-                'path': 'Paths/B1 block_to_A2 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '280m',
-                'route_type': 'Via bridge and A1 block'
-            },
-            ('B1 block', 'B2 block'): {
-                'path': 'Paths/B1 block_to_B2 block.geojson',
-                'buildings': [
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 1,
-                'distance': '100m',
-                'route_type': 'Direct under bridge'
-            },
-            ('B2 block', 'Academic block'): {
-                'path': 'Paths/B2 block_to_Academic block.geojson',
-                'buildings': [
-                    'Buildings/Academic block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 4,
-                'distance': '300m',
-                'route_type': 'Via B1 block and bridge'
-            },
-            ('B2 block', 'A1 block'): {
-                'path': 'Paths/B2 block_to_A1 block.geojson',
-                'buildings': [
-                    'Buildings/A1 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 3,
-                'distance': '280m',
-                'route_type': 'Via bridge and B1 block'
-            },
-            ('B2 block', 'A2 block'): {
-                'path': 'Paths/B2 block_to_A2 block.geojson',
-                'buildings': [
-                    'Buildings/A2 block.geojson',
-                    'Buildings/A1 block.geojson',
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Bridge.geojson',
-                    'Buildings/Under the bridge A block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 4,
-                'distance': '380m',
-                'route_type': 'Via B1 block, bridge, and A1 block'
-            },
-            ('B2 block', 'B1 block'): {
-                'path': 'Paths/B2 block_to_B1 block.geojson',
-                'buildings': [
-                    'Buildings/B1 block.geojson',
-                    'Buildings/B2 block.geojson',
-                    'Buildings/Under the bridge B block.geojson'
-                ],
-                'estimated_time': 1,
-                'distance': '100m',
-                'route_type': 'Direct under bridge'
-            }
+            'source': 'route_index' if index is not None else 'geojson',
+            'checksum': index.checksum if index is not None else None,
+            'outlines': sorted(outlines),
+            'routes': sorted(routes),
+            'duration_ms': round(duration * 1000, 2)
         }
 
+    def maybe_refresh(self) -> None:
+        """Reload at most once per refresh interval, unless a DataReloader polls in the background"""
+        interval = self.geometry.refresh_interval
+        if self.geometry.watched or interval <= 0 or time.monotonic() - self._last_reload < interval:
+            return
+        self.reload()
+
+    @property
+    def outline_generation(self) -> int:
+        """Changes whenever a reload changes a building outline"""
+        return self.data.outline_generation
+
+    def get_buildings(self) -> List[str]:
+        """Return every building reachable through the walkway graph"""
+        return self.data.buildings()
+
+    def get_route_keys(self) -> List[Tuple[str, str]]:
+        """Return every ordered (start, destination) pair of routable buildings"""
+        return list(self.route_metrics)
+
+    @property
+    def route_metrics(self) -> Dict[Tuple[str, str], RouteMetrics]:
+        """Distance and walking time of every route, measured once per data load"""
+        return self.data.route_metrics
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """R-trees over the building outlines and walkway nodes of the current data"""
+        return self.data.spatial
+
+    @property
+    def route_table(self) -> Dict[Tuple[str, str], Dict]:
+        """Outlines and description of every route"""
+        return self.data.route_table
+
+    def locate(self, lat: float, lon: float) -> Dict:
+        """Nearest building outline and walkway node to a point"""
+        spatial = self.spatial
+        building = spatial.nearest_building(lat, lon)
+        node = spatial.nearest_node(lat, lon)
+        return {
+            'location': [lat, lon],
+            'nearest_building': {'name': building[0], 'distance': round(building[1], 1)} if building else None,
+            'nearest_walkway': {
+                'node': node[0],
+                'coordinates': np.round(spatial.node_coords[node[0]], 7).tolist(),
+                'distance': round(node[1], 1)
+            } if node else None
+        }
+
+    def find_route_from_point(self, lat: float, lon: float, destination_file: str,
+                              max_distance: float = 500.0) -> Optional[Tuple[float, np.ndarray]]:
+        """Walk to the nearest walkway node, then the shortest walkway to a building"""
+        data = self.data
+        node = data.spatial.nearest_node(lat, lon)
+        if node is None or node[1] > max_distance:
+            return None
+        route = data.source.route_from_node(node[0], destination_file)
+        if route is None:
+            return None
+        distance, coords = route
+        return node[1] + distance, np.vstack([[lat, lon], coords])
+
+    def find_route(self, start_file: str, destination_file: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Shortest walkway between two buildings as (meters, (lat, lon) array)"""
+        return self.data.find_route(start_file, destination_file)
+
+    def get_outline_names(self) -> List[str]:
+        """Return the names of every building outline drawn on the map"""
+        return self.data.outline_names()
+
+    def get_building_outline(self, name: str) -> Optional[Dict]:
+        """Return a building outline as GeoJSON"""
+        return self.data.outline(name)
+
+    def get_outline_coords(self, name: str) -> Optional[np.ndarray]:
+        """Return a building outline as an (N, 2) lat/lon array"""
+        return self.data.outline_coords(name)
+
+    def get_outline_version(self, file_path: str) -> Optional[int]:
+        """Return the modification time of the outline data behind a building file"""
+        return self.data.outline_version(file_path)
+
+    def route_signature(self, start_file: str, destination_file: str) -> Tuple:
+        """Building file versions and route geometry a rendering of a route depends on"""
+        data = self.data
+        building_info = self.get_route_info(start_file, destination_file)
+        route = data.find_route(start_file, destination_file)
+        return tuple(data.outline_version(file_path) for file_path in building_info['buildings']) \
+            + (route[1].tobytes() if route is not None else None,)
+
     def get_building_descriptions(self) -> Dict[str, str]:
         """Return building descriptions for the frontend"""
         return self.building_descriptions
@@ -276,12 +406,14 @@ class CampusNavigation:
     def get_available_routes(self) -> List[Dict]:
         """Return all available routes for the frontend"""
         routes = []
-        for (start, dest), info in self.building_files.items():
+        for start, dest in self.get_route_keys():
+            info = self.get_route_info(start, dest)
             routes.append({
                 'start': start,
                 'destination': dest,
                 'estimated_time': info['estimated_time'],
                 'distance': info['distance'],
+                'walking_time_s': info['walking_time_s'],
                 'route_type': info['route_type']
             })
         return routes
@@ -289,7 +421,7 @@ class CampusNavigation:
     def validate_route(self, start_file: str, destination_file: str) -> Tuple[bool, str]:
         """Validate if the requested route exists"""
         condition = (start_file, destination_file)
-        if condition not in self.building_files:
+        if condition not in self.route_metrics:
             return False, f"Route from {start_file} to {destination_file} is not available."
         return True, "Route is valid."
 
@@ -300,4 +432,270 @@ class CampusNavigation:
     def get_route_info(self, start_file: str, destination_file: str) -> Optional[Dict]:
         """Get route information for a specific route"""
         condition = (start_file, destination_file)
-        return self.building_files.get(condition) 
\ No newline at end of file
+        route_metrics = self.route_metrics.get(condition)
+        if route_metrics is None:
+            return None
+
+        info = self.route_table.get(condition) or {
+            'buildings': [f'Buildings/{name}.geojson' for name in condition
+                          if name in self.get_outline_names()],
+            'route_type': 'Computed walkway route'
+        }
+        return dict(info, **route_metrics.to_dict())
+
+    def get_route_payload(self, start_file: str, destination_file: str, encoding: Optional[str] = None) -> Optional[Dict]:
+        """Route geometry, building outlines and metadata for client-side rendering"""
+        info = self.get_route_info(start_file, destination_file)
+        route = self.find_route(start_file, destination_file)
+        if info is None or route is None:
+            return None
+
+        buildings = []
+        for file_path in info['buildings']:
+            name = file_path.split('/')[-1].replace('.geojson', '')
+            coords = self.get_outline_coords(name)
+            if coords is not None:
+                buildings.append({'name': name, 'coordinates': _encode_coords(coords, encoding)})
+
+        route_metrics = self.route_metrics[(start_file, destination_file)]
+        return {
+            'start': start_file,
+            'destination': destination_file,
+            'center': list(self.location),
+            'encoding': 'polyline6' if encoding == 'polyline' else 'latlon',
+            'route': _encode_coords(route[1], encoding),
+            'buildings': buildings,
+            'distance': info['distance'],
+            'walking_time_s': info['walking_time_s'],
+            'estimated_time': info['estimated_time'],
+            'route_type': info['route_type'],
+            'segment_lengths': np.round(route_metrics.segment_lengths, 1).tolist()
+        }
+
+    def get_offline_bundle(self) -> Dict:
+        """Every route with its metadata and outlines in one payload, for clients that route without the server
+
+        Geometry is polyline encoded and each outline is included once, referenced by name from its routes.
+        """
+        outlines = {}
+        routes = []
+        for start, dest in self.get_route_keys():
+            info = self.get_route_info(start, dest)
+            route = self.find_route(start, dest)
+            if info is None or route is None:
+                continue
+            names = []
+            for file_path in info['buildings']:
+                name = file_path.split('/')[-1].replace('.geojson', '')
+                if name not in outlines:
+                    coords = self.get_outline_coords(name)
+                    if coords is None:
+                        continue
+                    outlines[name] = encode_polyline(coords)
+                names.append(name)
+            routes.append({
+                'start': start,
+                'destination': dest,
+                'route': encode_polyline(route[1]),
+                'buildings': names,
+                'distance': info['distance'],
+                'walking_time_s': info['walking_time_s'],
+                'estimated_time': info['estimated_time'],
+                'route_type': info['route_type'],
+                'segment_lengths': np.round(self.route_metrics[(start, dest)].segment_lengths, 1).tolist()
+            })
+        return {
+            'center': list(self.location),
+            'encoding': 'polyline6',
+            'descriptions': self.get_building_descriptions(),
+            'outlines': outlines,
+            'routes': routes
+        }
+
+    def get_batch_routes(self, pairs: Sequence[Tuple[str, str]], geometry: bool = False,
+                         encoding: Optional[str] = None) -> Iterator[Dict]:
+        """Distance and walking time of many routes, looked up in one vectorized pass
+
+        Rows are yielded in request order, so large batches can be streamed. A building
+        paired with itself is zero meters away; unknown or unconnected pairs get an error.
+        """
+        data = self.data
+        ids, matrix = data.route_matrix
+        starts = np.array([ids.get(start, -1) for start, _ in pairs], dtype=np.int64)
+        ends = np.array([ids.get(dest, -1) for _, dest in pairs], dtype=np.int64)
+        known = (starts >= 0) & (ends >= 0)
+        distances = np.full(len(pairs), np.nan)
+        distances[known] = matrix[starts[known], ends[known]]
+        # Same rounding and minimum as RouteMetrics
+        seconds = np.round(distances / WALKING_SPEED_M_PER_MIN * 60.0, 1).tolist()
+        minutes = np.where(distances > 0, np.maximum(1, np.ceil(distances / WALKING_SPEED_M_PER_MIN)), 0)
+        rounded = np.round(distances, 1).tolist()
+
+        for k, (start, dest) in enumerate(pairs):
+            row = {'start': start, 'destination': dest}
+            if not known[k]:
+                row['error'] = f"Unknown building: {start if starts[k] < 0 else dest}"
+            elif np.isnan(distances[k]):
+                row['error'] = f"Route from {start} to {dest} is not available."
+            else:
+                row.update(distance=rounded[k], walking_time_s=seconds[k], estimated_time=int(minutes[k]))
+                if geometry:
+                    route = data.find_route(start, dest) if start != dest else None
+                    coords = route[1] if route is not None else np.zeros((0, 2))
+                    row['route'] = _encode_coords(coords, encoding)
+            yield row
+
+    def validate_tour(self, stops: Sequence[str]) -> Tuple[bool, str]:
+        """Validate a list of buildings to visit"""
+        ids = self.data.route_matrix[0]
+        for name in stops:
+            if name not in ids:
+                return False, f"Unknown building: {name}"
+        if len(stops) < 2:
+            return False, "Please select at least two stops."
+        if len(set(stops)) != len(stops):
+            return False, "Each building can only be visited once."
+        return True, "Tour is valid."
+
+    def plan_tour(self, stops: Sequence[str], optimize: bool = True, keep_end: bool = False,
+                  round_trip: bool = False, exact_max: int = EXACT_MAX_STOPS) -> Optional[Dict]:
+        """Visiting order, legs and joined geometry of a validated tour, None if a leg has no route
+
+        The first stop always stays first. With optimize the rest are reordered for the
+        shortest walk, exactly for up to exact_max stops and by 2-opt beyond that.
+        """
+        data = self.data
+        ids, matrix = data.route_matrix
+        index = [ids[name] for name in stops]
+        if optimize:
+            order, solver = solve_tour(matrix[np.ix_(index, index)], keep_end, round_trip, exact_max)
+        else:
+            order, solver = list(range(len(stops))), 'given'
+        visit = [stops[k] for k in order] + ([stops[order[0]]] if round_trip else [])
+
+        legs = []
+        for start, dest in zip(visit, visit[1:]):
+            route = data.find_route(start, dest)
+            if route is None or (start, dest) not in data.route_metrics:
+                return None
+            legs.append((start, dest, route[1]))
+        # Each leg starts where the previous one ended, so the joints are kept once
+        coords = np.concatenate([legs[0][2]] + [leg[2][1:] for leg in legs[1:]])
+        segments = np.concatenate([data.route_metrics[(start, dest)].segment_lengths for start, dest, _ in legs])
+        return {
+            'stops': visit,
+            'solver': solver,
+            'legs': legs,
+            'coords': coords,
+            'metrics': RouteMetrics(segments, sum(data.route_metrics[leg[:2]].distance for leg in legs)),
+        }
+
+    def get_tour_payload(self, stops: Sequence[str], optimize: bool = True, keep_end: bool = False,
+                         round_trip: bool = False, encoding: Optional[str] = None,
+                         exact_max: int = EXACT_MAX_STOPS) -> Optional[Dict]:
+        """Multi-stop route shaped like get_route_payload, with the visiting order and legs"""
+        tour = self.plan_tour(stops, optimize, keep_end, round_trip, exact_max)
+        if tour is None:
+            return None
+        visited = list(dict.fromkeys(tour['stops']))
+        buildings = []
+        for name in visited:
+            coords = self.get_outline_coords(name)
+            if coords is not None:
+                buildings.append({'name': name, 'coordinates': _encode_coords(coords, encoding)})
+
+        route_metrics = tour['metrics']
+        return dict(route_metrics.to_dict(), **{
+            'stops': tour['stops'],
+            'optimized': optimize,
+            'solver': tour['solver'],
+            'round_trip': round_trip,
+            'legs': [dict(self.route_metrics[(start, dest)].to_dict(), start=start, destination=dest)
+                     for start, dest, _ in tour['legs']],
+            'center': list(self.location),
+            'encoding': 'polyline6' if encoding == 'polyline' else 'latlon',
+            'route': _encode_coords(tour['coords'], encoding),
+            'buildings': buildings,
+            'route_type': 'Tour: ' + ' → '.join(tour['stops']),
+            'segment_lengths': np.round(route_metrics.segment_lengths, 1).tolist()
+        })
+
+    def get_isochrone_payload(self, origin: str, minutes: float, encoding: Optional[str] = None) -> Optional[Dict]:
+        """Buildings and walkway pieces within some minutes' walk of a building"""
+        data = self.data
+        key = (origin, minutes, encoding)
+        payload = data.isochrones.get(key, ())
+        if payload is not None:
+            return payload
+        distances = data.node_distances(origin)
+        if distances is None:
+            return None
+
+        budget = minutes * WALKING_SPEED_M_PER_MIN
+        segments, path_length = clip_walkways(*data.walkways, distances, budget)
+        reachable = []
+        for name in data.buildings():
+            entrances = data.entrances(name)
+            if name != origin and entrances:
+                distance = float(distances[entrances].min())
+                if distance <= budget:
+                    reachable.append((distance, name))
+
+        buildings = []
+        for distance, name in sorted(reachable):
+            building = dict(RouteMetrics(np.zeros(0), distance).to_dict(), name=name)
+            coords = data.outline_coords(name)
+            if coords is not None:
+                building['coordinates'] = _encode_coords(coords, encoding)
+            buildings.append(building)
+
+        payload = {
+            'origin': origin,
+            'minutes': minutes,
+            'distance': round(budget, 1),
+            'center': list(self.location),
+            'encoding': 'polyline6' if encoding == 'polyline' else 'latlon',
+            'buildings': buildings,
+            'paths': [_encode_coords(segment, encoding) for segment in segments],
+            'path_length': round(path_length, 1)
+        }
+        data.isochrones.put(key, (), payload)
+        return payload
+
+    def get_point_route_payload(self, lat: float, lon: float, destination_file: str,
+                                encoding: Optional[str] = None, max_distance: float = 500.0) -> Optional[Dict]:
+        """Route from an arbitrary point to a building, shaped like get_route_payload"""
+        route = self.find_route_from_point(lat, lon, destination_file, max_distance)
+        if route is None:
+            return None
+        location = self.locate(lat, lon)
+        route_metrics = RouteMetrics(segment_lengths(route[1]), route[0])
+
+        buildings = []
+        names = [destination_file]
+        if location['nearest_building'] and location['nearest_building']['name'] != destination_file:
+            names.insert(0, location['nearest_building']['name'])
+        for name in names:
+            coords = self.get_outline_coords(name)
+            if coords is not None:
+                buildings.append({'name': name, 'coordinates': _encode_coords(coords, encoding)})
+
+        return dict(route_metrics.to_dict(), **{
+            'start': 'Current location',
+            'destination': destination_file,
+            'center': list(self.location),
+            'encoding': 'polyline6' if encoding == 'polyline' else 'latlon',
+            'route': _encode_coords(route[1], encoding),
+            'buildings': buildings,
+            'nearest_building': location['nearest_building'],
+            'route_type': 'From current location',
+            'segment_lengths': np.round(route_metrics.segment_lengths, 1).tolist()
+        })
+
+    def get_route_path(self, start_file: str, destination_file: str) -> Optional[List[List[float]]]:
+        """Get the (lat, lon) coordinates of the shortest walkway between two buildings"""
+        route = self.find_route(start_file, destination_file)
+        if route is None:
+            return None
+        return route[1].tolist()
+ 
\ No newline at end of file
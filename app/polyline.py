@@ -0,0 +1,35 @@
+import numpy as np
+from typing import List
+
+
+def encode_polyline(coords: np.ndarray, precision: int = 6) -> str:
+    """Encode an (N, 2) lat/lon array with the Google encoded polyline algorithm"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if not len(coords):
+        return ''
+    # Zig-zag delta encoding of the scaled integer coordinates, row by row
+    scaled = np.round(coords * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks: List[str] = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = 6) -> List[List[float]]:
+    """Decode a Google encoded polyline into [lat, lon] pairs"""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    points = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return points.tolist()
@@ -0,0 +1,58 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DataReloader:
+    """Polls the campus GeoJSON and route index from a background thread, one per worker process"""
+
+    def __init__(self, services, interval: float):
+        self.services = services
+        self.interval = interval
+        self.last_report: Optional[Dict] = None
+        self._pid = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start polling in this process; a no-op if it already runs here"""
+        # Threads don't survive gunicorn's fork, so each worker starts its own
+        if self._pid == os.getpid() or self.interval <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='campus-data-reloader', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            self.services.campus_nav.geometry.watched = True
+
+    def stop(self) -> None:
+        """Stop polling and hand reloads back to the request path"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._pid = None
+        if self.services._campus_nav is not None:
+            self.services.campus_nav.geometry.watched = False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # A bad edit must not kill the thread; the last good data keeps serving
+                logger.exception('Campus data reload failed')
+
+    def poll(self) -> Optional[Dict]:
+        """Reload changed data and drop the cached renderings of the routes it affected"""
+        report = self.services.campus_nav.reload()
+        if report is not None:
+            report['invalidated'] = self.services.invalidate_routes(report['routes'])
+            self.last_report = report
+        return report
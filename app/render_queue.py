@@ -0,0 +1,98 @@
+import threading
+from typing import Callable, Dict, Hashable, TypeVar
+from app.instrumentation import metrics
+
+T = TypeVar('T')
+
+
+class RenderQueueFull(Exception):
+    """A render was shed because too many were already queued"""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Too many maps are being drawn right now, please try again shortly.')
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        # Raised in render pool processes too
+        return type(self), (self.retry_after,)
+
+
+class _Flight:
+    """One render in progress, shared by every caller asking for the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RenderQueue:
+    """Single-flight, bounded gate for expensive renders within one process
+
+    Concurrent calls for the same key share one render. At most concurrency renders
+    run at once and at most max_waiting more wait for a slot; calls beyond that, or
+    that waited longer than timeout seconds, raise RenderQueueFull.
+    """
+
+    def __init__(self, concurrency: int = 2, max_waiting: int = 16, timeout: float = 10.0,
+                 retry_after: int = 2, name: str = 'route_map'):
+        self.concurrency = max(concurrency, 1)
+        self.max_waiting = max(max_waiting, 0)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.name = name
+        self.running = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._slots = threading.Semaphore(self.concurrency)
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        """Renders queued for a slot"""
+        return len(self._flights) - self.running
+
+    def run(self, key: Hashable, render: Callable[[], T]) -> T:
+        """Result of render(), or of the render already in progress for key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                if len(self._flights) >= self.concurrency + self.max_waiting:
+                    metrics.inc('campus_render_shed_total', queue=self.name, reason='full')
+                    raise RenderQueueFull(self.retry_after)
+                flight = self._flights[key] = _Flight()
+                self._report()
+        if not leader:
+            metrics.inc('campus_render_coalesced_total', queue=self.name)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            if not self._slots.acquire(timeout=self.timeout):
+                metrics.inc('campus_render_shed_total', queue=self.name, reason='timeout')
+                raise RenderQueueFull(self.retry_after)
+            try:
+                with self._lock:
+                    self.running += 1
+                    self._report()
+                flight.result = render()
+            finally:
+                with self._lock:
+                    self.running -= 1
+                self._slots.release()
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self._report()
+            flight.done.set()
+        return flight.result
+
+    def _report(self) -> None:
+        # Called with the lock held
+        metrics.set('campus_render_queue_depth', self.running, queue=self.name, state='running')
+        metrics.set('campus_render_queue_depth', len(self._flights) - self.running, queue=self.name, state='waiting')
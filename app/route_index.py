@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.geometry import BASE_DIR, BUILDINGS_DIR, PATHS_DIR, GeometryStore
+from app.compiler import campus_spatial_index, derive_route_table, route_table_from_rows, route_table_rows
+from app.routing import WalkwayGraph
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'UCARIDX1'
+INDEX_VERSION = 4
+# Arrays start on 64-byte boundaries so every view is aligned
+ALIGNMENT = 64
+
+
+def _source_files(base_dir: str) -> List[str]:
+    file_paths = []
+    for directory in (BUILDINGS_DIR, PATHS_DIR):
+        try:
+            entries = os.listdir(os.path.join(base_dir, directory))
+        except OSError:
+            continue
+        file_paths.extend(f'{directory}/{name}' for name in entries if name.endswith('.geojson'))
+    return sorted(file_paths)
+
+
+def source_mtimes(base_dir: str = BASE_DIR) -> Dict[str, int]:
+    """Modification times of every campus GeoJSON file, keyed by data path"""
+    return {file_path: os.stat(os.path.join(base_dir, file_path)).st_mtime_ns
+            for file_path in _source_files(base_dir)}
+
+
+def source_hashes(base_dir: str = BASE_DIR) -> Dict[str, str]:
+    """Content hashes of every campus GeoJSON file, keyed by data path"""
+    hashes = {}
+    for file_path in _source_files(base_dir):
+        with open(os.path.join(base_dir, file_path), 'rb') as f:
+            hashes[file_path] = hashlib.sha256(f.read()).hexdigest()[:16]
+    return hashes
+
+
+def build_route_index(store: GeometryStore, output_path: str, snap_tolerance: float = 3.0) -> Dict:
+    """Compute every building-to-building route and the route table over the walkway graph, and write the binary index
+
+    One Dijkstra search runs per building, from all of its entrances at once, so
+    building takes O(B * E log N) time and the file grows with the routes and edges,
+    not with the square of the node count.
+    """
+    graph = WalkwayGraph.from_store(store, snap_tolerance)
+    node_count = len(graph)
+    node_coords = graph.node_coords()
+    edges, edge_lengths = graph.edges()
+
+    buildings = sorted(graph.entrances)
+    entrance_offsets = np.zeros(len(buildings) + 1, dtype=np.int32)
+    entrance_nodes = []
+    for i, building in enumerate(buildings):
+        entrance_nodes.extend(graph.entrances[building])
+        entrance_offsets[i + 1] = len(entrance_nodes)
+
+    # Building-to-building routes are packed back to back, one slice per ordered pair
+    pair_distance = np.full((len(buildings), len(buildings)), np.inf, dtype=np.float64)
+    pair_offsets = np.zeros(len(buildings) * len(buildings) + 1, dtype=np.int32)
+    pair_coords = []
+    routes = {}
+    for i, start in enumerate(buildings):
+        # The search tree from the start's entrances reaches every destination's entrances
+        distances, parents = graph.dijkstra_from(graph.entrances[start])
+        for j, destination in enumerate(buildings):
+            pair = i * len(buildings) + j
+            target = min(graph.entrances[destination], key=lambda node: distances[node]) if i != j else None
+            if target is not None and distances[target] < math.inf:
+                nodes = [target]
+                while parents[nodes[-1]] >= 0:
+                    nodes.append(parents[nodes[-1]])
+                nodes.reverse()
+                pair_distance[i, j] = distances[target]
+                pair_coords.extend(node_coords[nodes].tolist())
+                routes[(start, destination)] = node_coords[nodes]
+            pair_offsets[pair + 1] = len(pair_coords)
+
+    outline_names = []
+    outline_types = []
+    outline_offsets = [0]
+    outline_coords = []
+    for record in store.buildings():
+        outline_names.append(record.name)
+        geometry = record.geojson['features'][-1]['geometry'] if record.geojson.get('features') else {}
+        outline_types.append(geometry.get('type', 'LineString'))
+        outline_coords.extend(record.coords.tolist())
+        outline_offsets.append(len(outline_coords))
+
+    arrays = {
+        'node_coords': node_coords,
+        'edges': edges,
+        'edge_lengths': edge_lengths,
+        'entrance_offsets': entrance_offsets,
+        'entrance_nodes': np.array(entrance_nodes, dtype=np.int32),
+        'pair_distance': pair_distance,
+        'pair_offsets': pair_offsets,
+        'pair_coords': np.array(pair_coords, dtype=np.float64).reshape(-1, 2),
+        'outline_offsets': np.array(outline_offsets, dtype=np.int32),
+        'outline_coords': np.array(outline_coords, dtype=np.float64).reshape(-1, 2),
+    }
+    header = {
+        'version': INDEX_VERSION,
+        'snap_tolerance': snap_tolerance,
+        'buildings': buildings,
+        'outline_names': outline_names,
+        'outline_types': outline_types,
+        'sources': source_mtimes(store.base_dir),
+        'source_hashes': source_hashes(store.base_dir),
+        'routes': route_table_rows(derive_route_table(routes, campus_spatial_index(store.buildings()))),
+        'arrays': {},
+    }
+    _write_index(output_path, header, arrays)
+    # Read the written file back once; normal opens trust the header
+    RouteIndex(output_path, verify=True)
+    return {'nodes': node_count, 'buildings': len(buildings), 'routes': len(routes),
+            'bytes': os.path.getsize(output_path), 'checksum': header['checksum']}
+
+
+def _write_index(output_path: str, header: Dict, arrays: Dict[str, np.ndarray]) -> None:
+    """Serialize the header and aligned raw arrays, replacing the file atomically"""
+    # Array offsets are relative to the data section, which starts after the header
+    data = bytearray()
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': len(data)}
+        data += np.ascontiguousarray(array).tobytes()
+        data += bytes(-len(data) % ALIGNMENT)
+    header['checksum'] = hashlib.sha256(data).hexdigest()
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(INDEX_MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    temp_path = f'{output_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_MAGIC)
+        f.write(struct.pack('<II', len(header_bytes), data_start))
+        f.write(header_bytes)
+        f.write(bytes(data_start - f.tell()))
+        f.write(data)
+    os.replace(temp_path, output_path)
+
+
+class RouteIndex:
+    """Memory-mapped building-to-building route index; pages are shared by every worker
+
+    Opening reads only the header. With verify the whole data section is also
+    hashed against the checksum, which touches every page of the file.
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._buffer[:len(INDEX_MAGIC)]) != INDEX_MAGIC:
+            raise ValueError(f"Not a route index: {path}")
+        header_length, data_start = struct.unpack('<II', bytes(self._buffer[8:16]))
+        header = json.loads(bytes(self._buffer[16:16 + header_length]).decode('utf-8'))
+        if header.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported route index version: {header.get('version')}")
+
+        self.snap_tolerance = header['snap_tolerance']
+        self.buildings: List[str] = header['buildings']
+        self.outline_names: List[str] = header['outline_names']
+        self.outline_types: List[str] = header['outline_types']
+        # mtimes of the GeoJSON the index was built from, moved on when unchanged content is seen at new ones
+        self.sources: Dict[str, int] = header['sources']
+        self.source_hashes: Dict[str, str] = header['source_hashes']
+        self.routes = route_table_from_rows(header['routes'])
+        self.checksum: str = header['checksum']
+        self._data_start = data_start
+        if verify:
+            self.verify()
+        self._building_ids = {name: i for i, name in enumerate(self.buildings)}
+        self._outline_ids = {name: i for i, name in enumerate(self.outline_names)}
+        self._outline_geojson: Dict[str, Dict] = {}
+        self._graph: Optional[WalkwayGraph] = None
+
+        # Zero-copy views into the mapping
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            start = data_start + spec['offset']
+            view = self._buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+            setattr(self, name, view)
+
+    def verify(self) -> None:
+        """Raise ValueError if the data section doesn't match the header's checksum"""
+        if hashlib.sha256(self._buffer[self._data_start:]).hexdigest() != self.checksum:
+            raise ValueError(f"Route index checksum mismatch: {self.path}")
+
+    @classmethod
+    def open(cls, path: str, base_dir: str = BASE_DIR, verify: bool = False) -> Optional['RouteIndex']:
+        """Open an index if it exists and was built from the current GeoJSON files"""
+        if not os.path.exists(path):
+            return None
+        try:
+            index = cls(path, verify)
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring unreadable route index %s: %s', path, e)
+            return None
+        mtimes = source_mtimes(base_dir)
+        # A deployment may ship the index without the GeoJSON it was compiled from
+        if mtimes and index.sources != mtimes:
+            if index.source_hashes != source_hashes(base_dir):
+                logger.warning('Ignoring stale route index %s, GeoJSON changed since it was built', path)
+                return None
+            # Same content under new mtimes, e.g. after a clone; later checks compare these instead of hashing
+            index.sources = mtimes
+        return index
+
+    def route(self, start: str, destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Precomputed building route as (meters, (N, 2) lat/lon array)"""
+        i = self._building_ids.get(start)
+        j = self._building_ids.get(destination)
+        if i is None or j is None:
+            return None
+        distance = float(self.pair_distance[i, j])
+        if math.isinf(distance):
+            return None
+        pair = i * len(self.buildings) + j
+        return distance, self.pair_coords[self.pair_offsets[pair]:self.pair_offsets[pair + 1]]
+
+    @property
+    def graph(self) -> WalkwayGraph:
+        """Walkway graph rebuilt from the stored edges on first use, for searches from arbitrary nodes"""
+        if self._graph is None:
+            self._graph = WalkwayGraph.from_arrays(self.node_coords, self.edges, self.edge_lengths,
+                                                   {name: self.entrances(name) for name in self.buildings},
+                                                   self.snap_tolerance)
+        return self._graph
+
+    def route_from_node(self, node: int, destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Shortest walkway from a graph node to a building as (meters, (N, 2) lat/lon array)"""
+        if not 0 <= node < len(self.node_coords):
+            return None
+        return self.graph.route_from_node(node, destination)
+
+    def distances_from(self, sources: List[int]) -> np.ndarray:
+        """Walking distance from the nearest of some graph nodes to every node, searched on demand"""
+        return np.array(self.graph.dijkstra_from(sources)[0], dtype=np.float64)
+
+    def entrances(self, building: str) -> List[int]:
+        """Graph node ids of a building's entrances"""
+        i = self._building_ids.get(building)
+        if i is None:
+            return []
+        return self.entrance_nodes[self.entrance_offsets[i]:self.entrance_offsets[i + 1]].tolist()
+
+    def outline_coords_for(self, name: str) -> Optional[np.ndarray]:
+        """Building outline as a zero-copy (N, 2) lat/lon view"""
+        k = self._outline_ids.get(name)
+        if k is None:
+            return None
+        return self.outline_coords[self.outline_offsets[k]:self.outline_offsets[k + 1]]
+
+    def outline(self, name: str) -> Optional[Dict]:
+        """Building outline as GeoJSON, built from the packed coordinates on first use"""
+        if name not in self._outline_geojson:
+            k = self._outline_ids.get(name)
+            if k is None:
+                return None
+            coords = self.outline_coords_for(name)[:, ::-1].tolist()
+            geometry_type = self.outline_types[k]
+            if geometry_type == 'Polygon':
+                coords = [coords]
+            elif geometry_type == 'Point':
+                coords = coords[0]
+            self._outline_geojson[name] = {
+                'type': 'FeatureCollection',
+                'features': [{
+                    'type': 'Feature',
+                    'properties': {},
+                    'geometry': {'type': geometry_type, 'coordinates': coords}
+                }]
+            }
+        return self._outline_geojson[name]
@@ -0,0 +1,212 @@
+import heapq
+import math
+import re
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.geodesy import haversine
+from app.geometry import GeometryStore
+
+# Path files are named '<start building>_to_<destination building>.geojson'
+PATH_NAME_PATTERN = re.compile(r'^(?P<start>.+)_to_(?P<end>.+)$')
+
+
+class WalkwayGraph:
+    """Walkway network built from path segments, snapped at shared coordinates"""
+
+    def __init__(self, snap_tolerance: float = 3.0):
+        # Vertices closer than snap_tolerance meters are merged into one node
+        self.snap_tolerance = snap_tolerance
+        self.node_lat: List[float] = []
+        self.node_lon: List[float] = []
+        self.adjacency: List[Dict[int, float]] = []
+        self.entrances: Dict[str, List[int]] = {}
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        self._cell_lat = None
+        self._cell_lon = None
+
+    @classmethod
+    def from_store(cls, store: GeometryStore, snap_tolerance: float = 3.0) -> 'WalkwayGraph':
+        """Build the graph from every walkway file in the geometry store"""
+        graph = cls(snap_tolerance)
+        for record in store.paths():
+            for feature in record.geojson.get('features', []):
+                graph.add_feature(feature, record.name)
+        return graph
+
+    @classmethod
+    def from_arrays(cls, node_coords: np.ndarray, edges: np.ndarray, lengths: np.ndarray,
+                    entrances: Dict[str, List[int]], snap_tolerance: float = 3.0) -> 'WalkwayGraph':
+        """Rebuild a graph from its node, edge and entrance arrays, as stored in the route index"""
+        graph = cls(snap_tolerance)
+        graph.node_lat = node_coords[:, 0].tolist()
+        graph.node_lon = node_coords[:, 1].tolist()
+        graph.adjacency = [{} for _ in range(len(node_coords))]
+        for (a, b), length in zip(edges.tolist(), lengths.tolist()):
+            graph.adjacency[a][b] = length
+            graph.adjacency[b][a] = length
+        graph.entrances = {building: list(nodes) for building, nodes in entrances.items()}
+        return graph
+
+    def add_feature(self, feature: Dict, file_name: str = '') -> None:
+        """Add a LineString/MultiLineString feature, tagging its ends as building entrances"""
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'LineString':
+            lines = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiLineString':
+            lines = geometry['coordinates']
+        else:
+            return
+
+        # Entrances come from feature properties, or the '<start>_to_<end>' file name
+        properties = feature.get('properties') or {}
+        match = PATH_NAME_PATTERN.match(file_name)
+        start_building = properties.get('start') or (match.group('start') if match else None)
+        end_building = properties.get('end') or (match.group('end') if match else None)
+
+        for line in lines:
+            # GeoJSON positions are (lon, lat)
+            nodes = self.add_line([(position[1], position[0]) for position in line])
+            if not nodes:
+                continue
+            if start_building:
+                self._add_entrance(start_building, nodes[0])
+            if end_building:
+                self._add_entrance(end_building, nodes[-1])
+
+    def add_line(self, coords: Iterable[Tuple[float, float]]) -> List[int]:
+        """Add a (lat, lon) polyline, returning the node ids along it"""
+        nodes = []
+        for lat, lon in coords:
+            node = self._snap(lat, lon)
+            if nodes and nodes[-1] != node:
+                self._add_edge(nodes[-1], node)
+            if not nodes or nodes[-1] != node:
+                nodes.append(node)
+        return nodes
+
+    def _add_entrance(self, building: str, node: int) -> None:
+        entrances = self.entrances.setdefault(building, [])
+        if node not in entrances:
+            entrances.append(node)
+
+    def _add_edge(self, a: int, b: int) -> None:
+        length = haversine(self.node_lat[a], self.node_lon[a], self.node_lat[b], self.node_lon[b])
+        if length < self.adjacency[a].get(b, math.inf):
+            self.adjacency[a][b] = length
+            self.adjacency[b][a] = length
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        if self._cell_lat is None:
+            # Grid cells one snap tolerance wide, sized at the first vertex's latitude
+            self._cell_lat = max(self.snap_tolerance, 1e-3) / 111320.0
+            self._cell_lon = self._cell_lat / max(math.cos(math.radians(lat)), 1e-6)
+        return int(math.floor(lat / self._cell_lat)), int(math.floor(lon / self._cell_lon))
+
+    def _snap(self, lat: float, lon: float) -> int:
+        """Return the node within snap tolerance of a point, creating it if needed"""
+        row, col = self._cell(lat, lon)
+        best, best_distance = None, self.snap_tolerance
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                for node in self._grid.get((row + d_row, col + d_col), ()):
+                    distance = haversine(lat, lon, self.node_lat[node], self.node_lon[node])
+                    if distance <= best_distance:
+                        best, best_distance = node, distance
+        if best is not None:
+            return best
+
+        node = len(self.node_lat)
+        self.node_lat.append(lat)
+        self.node_lon.append(lon)
+        self.adjacency.append({})
+        self._grid.setdefault((row, col), []).append(node)
+        return node
+
+    def __len__(self) -> int:
+        return len(self.node_lat)
+
+    def shortest_path(self, sources: List[int], targets: List[int]) -> Optional[Tuple[float, List[int]]]:
+        """A* search from any source node to the nearest target node"""
+        if not sources or not targets:
+            return None
+        target_set = set(targets)
+        target_points = [(self.node_lat[t], self.node_lon[t]) for t in targets]
+
+        def heuristic(node: int) -> float:
+            lat, lon = self.node_lat[node], self.node_lon[node]
+            return min(haversine(lat, lon, t_lat, t_lon) for t_lat, t_lon in target_points)
+
+        best = {node: 0.0 for node in sources}
+        previous: Dict[int, int] = {}
+        queue = [(heuristic(node), 0.0, node) for node in sources]
+        heapq.heapify(queue)
+        closed = set()
+
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node in closed:
+                continue
+            if node in target_set:
+                path = [node]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                return cost, path[::-1]
+            closed.add(node)
+            for neighbour, length in self.adjacency[node].items():
+                new_cost = cost + length
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None
+
+    def dijkstra(self, source: int) -> Tuple[List[float], List[int]]:
+        """One-to-all shortest distances and predecessor nodes (-1 for none) from a node"""
+        return self.dijkstra_from([source])
+
+    def dijkstra_from(self, sources: Iterable[int]) -> Tuple[List[float], List[int]]:
+        """Shortest distances and predecessor nodes from whichever of several nodes is nearest"""
+        distances = [math.inf] * len(self.node_lat)
+        parents = [-1] * len(self.node_lat)
+        queue = []
+        for source in sources:
+            distances[source] = 0.0
+            queue.append((0.0, source))
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if cost > distances[node]:
+                continue
+            for neighbour, length in self.adjacency[node].items():
+                new_cost = cost + length
+                if new_cost < distances[neighbour]:
+                    distances[neighbour] = new_cost
+                    parents[neighbour] = node
+                    heapq.heappush(queue, (new_cost, neighbour))
+        return distances, parents
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Every walkway edge once, as an (E, 2) array of node ids and their lengths in meters"""
+        pairs = [(a, b, length) for a, neighbours in enumerate(self.adjacency)
+                 for b, length in neighbours.items() if a < b]
+        edges = np.array([pair[:2] for pair in pairs], dtype=np.int32).reshape(-1, 2)
+        return edges, np.array([pair[2] for pair in pairs], dtype=np.float64)
+
+    def route(self, start: str, destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Shortest walkway between two buildings as (meters, (N, 2) lat/lon array)"""
+        return self._route_between(self.entrances.get(start, []), destination)
+
+    def route_from_node(self, node: int, destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Shortest walkway from a graph node to a building as (meters, (N, 2) lat/lon array)"""
+        return self._route_between([node], destination)
+
+    def node_coords(self) -> np.ndarray:
+        """(N, 2) lat/lon array of every node, indexed by node id"""
+        return np.column_stack([self.node_lat, self.node_lon]).astype(np.float64).reshape(-1, 2)
+
+    def _route_between(self, sources: List[int], destination: str) -> Optional[Tuple[float, np.ndarray]]:
+        result = self.shortest_path(sources, self.entrances.get(destination, []))
+        if result is None:
+            return None
+        distance, nodes = result
+        coords = np.array([(self.node_lat[node], self.node_lon[node]) for node in nodes], dtype=np.float64)
+        return distance, coords.reshape(-1, 2)
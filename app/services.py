@@ -1,177 +1,363 @@
-import json
+import logging
 import os
+import threading
+import time
 import folium
+import numpy as np
+from branca.element import MacroElement
 from folium import plugins
-from typing import List, Dict, Optional
+from jinja2 import Template
+from typing import List, Dict, Optional, Tuple
+from app.cache import RouteMapCache
+from app.compression import MapArtifact
+from app.instrumentation import metrics
+from app.leaflet import TILE_LAYER_SCRIPT, LeafletRenderer
 from app.models import CampusNavigation
+from app.render_queue import RenderQueue, RenderQueueFull
+from app.simplify import COORDINATE_DECIMALS, douglas_peucker, simplify_geojson, zoom_tolerance
+
+logger = logging.getLogger(__name__)
+
+# Deepest zoom of Folium's default OpenStreetMap layer, the most detail a map ever shows
+MAP_MAX_ZOOM = 18
+
+class CampusTileLayer(MacroElement):
+    """Leaflet layer that draws buildings and walkways from the /tiles endpoint"""
+
+    _template = Template(
+        "{% macro script(this, kwargs) %}"
+        "{% with map_name=this._parent.get_name(), url=this.url, min_zoom=this.min_zoom, max_zoom=this.max_zoom %}"
+        + TILE_LAYER_SCRIPT +
+        "{% endwith %}{% endmacro %}"
+    )
+
+    def __init__(self, url: str, min_zoom: int, max_zoom: int):
+        super().__init__()
+        self._name = 'CampusTileLayer'
+        self.url = url
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
 
 class MapService:
     """Handles map generation and GeoJSON processing"""
     
-    def __init__(self, campus_nav: CampusNavigation):
+    def __init__(self, campus_nav: CampusNavigation, cache_size: int = 32, tile_url: Optional[str] = None,
+                 tile_min_zoom: int = 15, tile_max_zoom: int = 19, simplify_px: float = 0.5,
+                 renderer: str = 'folium', render_queue: Optional[RenderQueue] = None):
+        if renderer not in ('folium', 'leaflet'):
+            raise ValueError(f"Unknown map renderer: {renderer}")
         self.campus_nav = campus_nav
+        # With a tile URL the empty map fetches outlines per tile instead of inlining them all
+        self.tile_url = tile_url
+        self.tile_zooms = (tile_min_zoom, tile_max_zoom)
         self.location = campus_nav.location
+        self.geometry = campus_nav.geometry
+        self.route_cache = RouteMapCache(cache_size)
+        # Identical concurrent renders are shared, and renders beyond the queue's bound are shed
+        self.render_queue = render_queue or RenderQueue()
+        # The leaflet renderer writes the same maps from one template instead of a Folium object tree
+        self.leaflet = LeafletRenderer(self.location, 20, tile_url, tile_min_zoom, tile_max_zoom) \
+            if renderer == 'leaflet' else None
+        # Geometry is simplified to a fraction of a pixel at the deepest zoom and rounded to ~1 cm
+        self.simplify_tolerance = zoom_tolerance(MAP_MAX_ZOOM, self.location[0], simplify_px)
+        self._outlines: Dict[str, Tuple] = {}
+        self._empty_map = None
+        self._empty_map_generation = None
+        self._empty_map_lock = threading.Lock()
+
+    def warm_up(self) -> int:
+        """Pre-render the empty map and every known route into the caches"""
+        self.get_empty_map()
+        rendered = 0
+        for start_file, destination_file in self.campus_nav.get_route_keys():
+            map_html = self.create_route_map(start_file, destination_file)
+            if not self.is_error(map_html):
+                rendered += 1
+        logger.info('Route map cache warmed with %d routes', rendered)
+        return rendered
+
+    @staticmethod
+    def is_error(map_html: str) -> bool:
+        """Check whether a create_route_map result is an error message"""
+        # Rendered maps are always HTML markup, every failure is a plain sentence
+        return not map_html.startswith('<')
+
+    def get_map_outline(self, name: str) -> Optional[Dict]:
+        """Building outline as simplified GeoJSON, cached until its source file changes"""
+        version = self.campus_nav.get_outline_version(f'Buildings/{name}.geojson')
+        cached = self._outlines.get(name)
+        if cached is None or cached[0] != version:
+            outline = self.campus_nav.get_building_outline(name)
+            if outline is None:
+                return None
+            cached = (version, simplify_geojson(outline, self.simplify_tolerance)[0])
+            self._outlines[name] = cached
+        return cached[1]
+
+    def get_map_path(self, start_file: str, destination_file: str) -> Optional[List[List[float]]]:
+        """Route coordinates simplified and rounded like the building outlines"""
+        route = self.campus_nav.find_route(start_file, destination_file)
+        if route is None or not len(route[1]):
+            return None
+        kept, _ = douglas_peucker(route[1], self.simplify_tolerance)
+        return np.round(route[1][kept], COORDINATE_DECIMALS).tolist()
+
+    def get_empty_map(self) -> MapArtifact:
+        """Return the empty map artifact, rendering it on first use or after a data reload"""
+        self.campus_nav.maybe_refresh()
+        if self._empty_map is None or self._empty_map_generation != self.campus_nav.outline_generation:
+            with self._empty_map_lock:
+                generation = self.campus_nav.outline_generation
+                if self._empty_map is None or self._empty_map_generation != generation:
+                    metrics.inc('campus_cache_requests_total', cache='empty_map', result='miss')
+                    map_html, complete = self._render_empty_map()
+                    metrics.observe('campus_payload_bytes', len(map_html), payload='empty_map')
+                    if not complete:
+                        # Don't pin the fallback map, retry on the next request
+                        return MapArtifact(map_html)
+                    self._empty_map = MapArtifact(map_html)
+                    self._empty_map_generation = generation
+                    return self._empty_map
+        metrics.inc('campus_cache_requests_total', cache='empty_map', result='hit')
+        return self._empty_map
 
     def create_empty_map(self) -> str:
         """Create an empty map with building outlines"""
+        return self.get_empty_map().html
+
+    def _render_empty_map(self) -> Tuple[str, bool]:
+        """Render the empty map, reporting whether every building was included"""
+        if self.leaflet is not None:
+            return self._render_empty_leaflet_map()
+        complete = True
         try:
-            print("Creating empty map...")
+            logger.debug('Creating empty map')
+            build_start = time.perf_counter()
             map_empty = folium.Map(location=self.location, width="100%", height="100%", zoom_start=20)
             
             # Add all building outlines to the empty map, each as a named layer
             building_count = 0
-            for building_file in os.listdir('Buildings'):
-                if building_file.endswith('.geojson'):
-                    try:
-                        with open(f'Buildings/{building_file}') as f:
-                            building_data = json.load(f)
-                            building_name = building_file.replace('.geojson', '')
-                            folium.GeoJson(
-                                building_data, 
-                                name=building_name,  # Named layer for LayerControl
-                                tooltip=building_name,
-                                popup=building_name,
-                                style_function=lambda x: {
-                                    'fillColor': '#3388ff',
-                                    'color': '#000000',
-                                    'weight': 2,
-                                    'fillOpacity': 0.1
-                                }
-                            ).add_to(map_empty)
-                            building_count += 1
-                    except Exception as e:
-                        print(f"Error loading building {building_file}: {e}")
+            if self.tile_url:
+                CampusTileLayer(self.tile_url, *self.tile_zooms).add_to(map_empty)
+            for building_name in ([] if self.tile_url else self.campus_nav.get_outline_names()):
+                try:
+                    folium.GeoJson(
+                        self.get_map_outline(building_name), 
+                        name=building_name,  # Named layer for LayerControl
+                        tooltip=building_name,
+                        # Folium drops a plain string popup, it has to be a Popup
+                        popup=folium.Popup(building_name, parse_html=True),
+                        style_function=lambda x: {
+                            'fillColor': '#3388ff',
+                            'color': '#000000',
+                            'weight': 2,
+                            'fillOpacity': 0.1
+                        }
+                    ).add_to(map_empty)
+                    building_count += 1
+                except Exception as e:
+                    logger.warning('Error loading building %s: %s', building_name, e)
+                    complete = False
             
-            print(f"Added {building_count} buildings to the map")
+            logger.debug('Added %d buildings to the map', building_count)
             
             # Add layer control in the top right
             folium.LayerControl(position='topright').add_to(map_empty)
+            metrics.observe('campus_stage_duration_seconds', time.perf_counter() - build_start, stage='folium_build')
             
             # Generate HTML
-            map_html = map_empty._repr_html_()
-            print(f"Map HTML generated, length: {len(map_html)}")
-            return map_html
+            with metrics.timer('repr_html'):
+                map_html = map_empty._repr_html_()
+            logger.debug('Map HTML generated, length: %d', len(map_html))
+            return map_html, complete
             
         except Exception as e:
-            print(f"Error creating empty map: {e}")
+            logger.warning('Error creating empty map: %s', e)
             # Return a simple fallback map
             fallback_map = folium.Map(location=self.location, zoom_start=20)
-            return fallback_map._repr_html_()
+            return fallback_map._repr_html_(), False
+
+    def _render_empty_leaflet_map(self) -> Tuple[str, bool]:
+        """The empty map from the leaflet renderer, reporting whether every building was included"""
+        complete = True
+        outlines = []
+        for building_name in ([] if self.tile_url else self.campus_nav.get_outline_names()):
+            outline = self.get_map_outline(building_name)
+            if outline is None:
+                logger.warning('Error loading building %s', building_name)
+                complete = False
+                continue
+            outlines.append((building_name, outline))
+        with metrics.timer('leaflet_render'):
+            map_html = self.leaflet.render(outlines, tooltips=True, popups=True, tiles=True)
+        return map_html, complete
 
     def create_route_map(self, start_file: str, destination_file: str) -> str:
         """Create a navigation map with route between two buildings"""
-        print(f"Processing route from {start_file} to {destination_file}")
-        
-        # Validate input
-        if not start_file or not destination_file:
-            return "Please select both start and destination locations."
-        
-        if start_file == destination_file:
-            return "Start and destination cannot be the same."
-        
-        # Validate route exists
-        is_valid, error_message = self.campus_nav.validate_route(start_file, destination_file)
-        if not is_valid:
-            return error_message
+        logger.debug('Processing route from %s to %s', start_file, destination_file, extra={'sampled': True})
 
-        path = None
-        building1 = []
+        with metrics.timer('validation'):
+            # Validate input
+            if not start_file or not destination_file:
+                return "Please select both start and destination locations."
 
+            if start_file == destination_file:
+                return "Start and destination cannot be the same."
+
+            # Validate route exists
+            is_valid, error_message = self.campus_nav.validate_route(start_file, destination_file)
+            if not is_valid:
+                return error_message
+
+        # Serve a previous rendering if none of the source files changed since
+        self.campus_nav.maybe_refresh()
         condition = (start_file, destination_file)
-        building_info = self.campus_nav.building_files.get(condition)
+        signature = self.campus_nav.route_signature(start_file, destination_file)
+        map_html = self.route_cache.get(condition, signature)
+        if map_html is not None:
+            return map_html
 
-        if building_info:
-            p_file = building_info['path']
-            building1_paths = building_info['buildings']
+        def render() -> str:
+            map_html = self._render_route_map(start_file, destination_file)
+            if not self.is_error(map_html):
+                metrics.observe('campus_payload_bytes', len(map_html), payload='route_map')
+                self.route_cache.put(condition, signature, map_html)
+            return map_html
+        return self._queued_render(condition, render)
 
-            # Load building data with error handling
-            for file_path in building1_paths:
-                try:
-                    if os.path.exists(file_path):
-                        with open(file_path) as f:
-                            building1.append((file_path, json.load(f)))
-                    else:
-                        return f"Building file not found: {file_path}"
-                except json.JSONDecodeError:
-                    return f"Invalid JSON in building file: {file_path}"
-                except Exception as e:
-                    return f"Error loading building file {file_path}: {str(e)}"
-
-            # Load path data with error handling
-            try:
-                if os.path.exists(p_file):
-                    with open(p_file) as f1:
-                        path = json.load(f1)
-                else:
-                    return f"Path file not found: {p_file}"
-            except json.JSONDecodeError:
-                return f"Invalid JSON in path file: {p_file}"
-            except Exception as e:
-                return f"Error loading path file {p_file}: {str(e)}"
-
-        if path:
-            path_coords = None
-            for feature in path['features']:
-                path_coords = feature['geometry']['coordinates']
-
-            if path_coords:
-                final_path = list(map(self.campus_nav.switch_coords, path_coords))
-
-                # Create a map with improved styling
-                try:
-                    map_academic = folium.Map(location=self.location, width="100%", height="100%", zoom_start=20)
-                    
-                    # Add building outlines with better styling, each as a named layer
-                    for file_path, outline in building1:
-                        building_name = os.path.basename(file_path).replace('.geojson', '')
-                        folium.GeoJson(
-                            outline, 
-                            name=building_name,  # Named layer for LayerControl
-                            style_function=lambda x: {
-                                'fillColor': '#3388ff',
-                                'color': '#000000',
-                                'weight': 2,
-                                'fillOpacity': 0.1
-                            }
-                        ).add_to(map_academic)
-                    
-                    # Add animated path with better styling
-                    folium.plugins.AntPath(
-                        final_path, 
-                        use_arrows=True,
-                        color='red',
-                        weight=4,
-                        opacity=0.8,
-                        name='Route Path'  # Named layer for LayerControl
-                    ).add_to(map_academic)
-                    
-                    # Add start and end markers
-                    if final_path:
-                        folium.Marker(
-                            final_path[0],
-                            popup=f"Start: {start_file}",
-                            icon=folium.Icon(color='green', icon='info-sign'),
-                            name='Start Marker'
-                        ).add_to(map_academic)
-                        
-                        folium.Marker(
-                            final_path[-1],
-                            popup=f"Destination: {destination_file}",
-                            icon=folium.Icon(color='red', icon='info-sign'),
-                            name='End Marker'
-                        ).add_to(map_academic)
-
-                    # Add layer control in the top right
-                    folium.LayerControl(position='topright').add_to(map_academic)
-
-                    map_html = map_academic._repr_html_()
-                    print(f"Route map generated successfully, HTML length: {len(map_html)}")
-                    return map_html
-                    
-                except Exception as e:
-                    print(f"Error creating route map: {e}")
-                    return f"Error creating map: {str(e)}"
-            else:
+    def _queued_render(self, key: Tuple, render) -> str:
+        """Render through the render queue, falling back to the last rendering of key when it is full
+
+        Raises RenderQueueFull when there is nothing to fall back to.
+        """
+        try:
+            return self.render_queue.run(key, render)
+        except RenderQueueFull:
+            stale = self.route_cache.last(key)
+            if stale is None:
+                raise
+            metrics.inc('campus_render_degraded_total', queue=self.render_queue.name, fallback='stale')
+            logger.info('Render queue full, serving the last map of %s', key)
+            return stale
+
+    def _render_route_map(self, start_file: str, destination_file: str) -> str:
+        """Build the Folium route map for a validated route"""
+        building1 = []
+
+        with metrics.timer('geojson_load'):
+            building_info = self.campus_nav.get_route_info(start_file, destination_file)
+            if not building_info:
+                return "Invalid address: Path data not found."
+
+            # Look up building outlines in the route index or shared geometry store
+            for file_path in building_info['buildings']:
+                outline = self.get_map_outline(os.path.basename(file_path).replace('.geojson', ''))
+                if outline is None:
+                    return f"Building file not found: {file_path}"
+                building1.append((file_path, outline))
+
+            # Route geometry comes from the precomputed route index or the walkway graph
+            final_path = self.get_map_path(start_file, destination_file)
+            if not final_path:
                 return "Invalid geojson data: No coordinates found in path."
-        else:
-            return "Invalid address: Path data not found." 
\ No newline at end of file
+
+        # Create a map with improved styling
+        try:
+            map_html = self._build_path_map(building1, final_path, [
+                (final_path[0], f"Start: {start_file}", 'green', 'Start Marker'),
+                (final_path[-1], f"Destination: {destination_file}", 'red', 'End Marker'),
+            ])
+            logger.debug('Route map generated successfully, HTML length: %d', len(map_html))
+            return map_html
+            
+        except Exception as e:
+            logger.warning('Error creating route map: %s', e)
+            return f"Error creating map: {str(e)}"
+
+    def create_tour_map(self, tour: Dict) -> str:
+        """Create a navigation map of a planned tour, numbering the stops in visiting order"""
+        stops = tour['stops']
+        key = ('tour',) + tuple(stops)
+        signature = tuple(self.campus_nav.route_signature(start, dest) for start, dest, _ in tour['legs'])
+        map_html = self.route_cache.get(key, signature)
+        if map_html is not None:
+            return map_html
+        return self._queued_render(key, lambda: self._render_tour_map(tour, key, signature))
+
+    def _render_tour_map(self, tour: Dict, key: Tuple, signature: Tuple) -> str:
+        """Build and cache the map of a planned tour"""
+        stops = tour['stops']
+        with metrics.timer('geojson_load'):
+            outlines = []
+            for name in dict.fromkeys(stops):
+                outline = self.get_map_outline(name)
+                if outline is not None:
+                    outlines.append((f'Buildings/{name}.geojson', outline))
+            kept, _ = douglas_peucker(tour['coords'], self.simplify_tolerance)
+            final_path = np.round(tour['coords'][kept], COORDINATE_DECIMALS).tolist()
+
+        markers = []
+        for number, (start, dest, coords) in enumerate(tour['legs'], 1):
+            color = 'green' if number == 1 else 'blue'
+            markers.append((np.round(coords[0], COORDINATE_DECIMALS).tolist(), f"{number}. {start}", color, f'Stop {number}'))
+        if stops[-1] != stops[0]:
+            markers.append((final_path[-1], f"{len(stops)}. {stops[-1]}", 'red', 'End Marker'))
+        try:
+            map_html = self._build_path_map(outlines, final_path, markers)
+        except Exception as e:
+            logger.warning('Error creating tour map: %s', e)
+            return f"Error creating map: {str(e)}"
+        metrics.observe('campus_payload_bytes', len(map_html), payload='tour_map')
+        self.route_cache.put(key, signature, map_html)
+        return map_html
+
+    def _build_path_map(self, outlines: List[Tuple[str, Dict]], final_path: List[List[float]],
+                        markers: List[Tuple[List[float], str, str, str]]) -> str:
+        """Render outlines, an animated path and (location, popup, color, layer name) markers to HTML"""
+        if self.leaflet is not None:
+            with metrics.timer('leaflet_render'):
+                return self.leaflet.render([(os.path.basename(file_path).replace('.geojson', ''), outline)
+                                            for file_path, outline in outlines], final_path, markers)
+        build_start = time.perf_counter()
+        map_academic = folium.Map(location=self.location, width="100%", height="100%", zoom_start=20)
+        
+        # Add building outlines with better styling, each as a named layer
+        for file_path, outline in outlines:
+            building_name = os.path.basename(file_path).replace('.geojson', '')
+            folium.GeoJson(
+                outline, 
+                name=building_name,  # Named layer for LayerControl
+                style_function=lambda x: {
+                    'fillColor': '#3388ff',
+                    'color': '#000000',
+                    'weight': 2,
+                    'fillOpacity': 0.1
+                }
+            ).add_to(map_academic)
+        
+        # Add animated path with better styling
+        folium.plugins.AntPath(
+            final_path, 
+            use_arrows=True,
+            color='red',
+            weight=4,
+            opacity=0.8,
+            name='Route Path'  # Named layer for LayerControl
+        ).add_to(map_academic)
+        
+        # Add the start, stop and end markers
+        for location, popup, color, marker_name in markers:
+            folium.Marker(
+                location,
+                popup=popup,
+                icon=folium.Icon(color=color, icon='info-sign'),
+                name=marker_name
+            ).add_to(map_academic)
+
+        # Add layer control in the top right
+        folium.LayerControl(position='topright').add_to(map_academic)
+        metrics.observe('campus_stage_duration_seconds', time.perf_counter() - build_start, stage='folium_build')
+
+        with metrics.timer('repr_html'):
+            return map_academic._repr_html_()
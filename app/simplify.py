@@ -0,0 +1,157 @@
+import copy
+import json
+import math
+import numpy as np
+from typing import Dict, List, Tuple
+from app.geodesy import EARTH_RADIUS_M
+
+# 1e-7 degrees is 1.1 cm of latitude, and less of longitude away from the equator
+COORDINATE_DECIMALS = 7
+# Web mercator ground resolution at the equator for zoom 0, in meters per 256px tile pixel
+METERS_PER_PIXEL_Z0 = 2 * math.pi * 6378137.0 / 256
+
+
+def zoom_tolerance(zoom: int, latitude: float, pixels: float = 0.5) -> float:
+    """Ground distance in meters covered by a number of screen pixels at a zoom level"""
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def quantization_error(decimals: int, latitude: float) -> float:
+    """Largest distance in meters a point can move when rounded to some decimal places"""
+    half_step = math.radians(0.5 * 10 ** -decimals) * EARTH_RADIUS_M
+    return math.hypot(half_step, half_step * math.cos(math.radians(latitude)))
+
+
+def douglas_peucker(coords: np.ndarray, tolerance: float) -> Tuple[np.ndarray, float]:
+    """Indices of the (N, 2) lat/lon vertices Douglas-Peucker keeps, and the largest distance dropped
+
+    Every dropped vertex lies within tolerance meters of the simplified line.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 3 or tolerance <= 0:
+        return np.arange(len(coords)), 0.0
+
+    # Local equirectangular meters around the first vertex
+    scale = math.radians(1) * EARTH_RADIUS_M
+    xy = np.column_stack([(coords[:, 1] - coords[0, 1]) * scale * math.cos(math.radians(coords[0, 0])),
+                          (coords[:, 0] - coords[0, 0]) * scale])
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+    max_dropped = 0.0
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        points = xy[first + 1:last]
+        start, end = xy[first], xy[last]
+        edge = end - start
+        length_sq = float(edge @ edge)
+        if length_sq > 0:
+            # Distance to the segment, so closed rings and backtracking lines are handled too
+            t = np.clip(((points - start) @ edge) / length_sq, 0.0, 1.0)
+            distances = np.hypot(*(start + t[:, None] * edge - points).T)
+        else:
+            distances = np.hypot(*(points - start).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+        else:
+            max_dropped = max(max_dropped, float(distances[farthest]))
+    return np.nonzero(keep)[0], max_dropped
+
+
+def _simplify_line(positions: List, tolerance: float, decimals: int, min_points: int) -> Tuple[List, float]:
+    """Simplify and round one GeoJSON (lon, lat) position list"""
+    coords = np.asarray(positions, dtype=np.float64).reshape(-1, 2)[:, ::-1]
+    kept, error = douglas_peucker(coords, tolerance)
+    if len(kept) < min(min_points, len(coords)):
+        # Don't collapse a ring or line below what its geometry type needs
+        kept, error = np.arange(len(coords)), 0.0
+    rounded = np.round(coords[kept][:, ::-1], decimals).tolist()
+    # Rounding can merge neighbouring vertices
+    line = [rounded[0]] + [point for previous, point in zip(rounded, rounded[1:]) if point != previous]
+    if len(line) < min(min_points, len(rounded)):
+        line = rounded
+    return line, error
+
+
+def simplify_geometry(geometry: Dict, tolerance: float, decimals: int = COORDINATE_DECIMALS) -> Tuple[Dict, float]:
+    """Simplified copy of a GeoJSON geometry and the largest vertex displacement in meters"""
+    geometry_type = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    error = 0.0
+    if geometry_type == 'Point':
+        coordinates = [round(value, decimals) for value in coordinates]
+    elif geometry_type == 'LineString':
+        coordinates, error = _simplify_line(coordinates, tolerance, decimals, 2)
+    elif geometry_type in ('MultiLineString', 'Polygon'):
+        min_points = 4 if geometry_type == 'Polygon' else 2
+        parts = [_simplify_line(part, tolerance, decimals, min_points) for part in coordinates]
+        coordinates = [part for part, _ in parts]
+        error = max((part_error for _, part_error in parts), default=0.0)
+    elif geometry_type == 'MultiPolygon':
+        parts = [[_simplify_line(ring, tolerance, decimals, 4) for ring in polygon] for polygon in coordinates]
+        coordinates = [[ring for ring, _ in polygon] for polygon in parts]
+        error = max((ring_error for polygon in parts for _, ring_error in polygon), default=0.0)
+    else:
+        return copy.deepcopy(geometry), 0.0
+    return dict(geometry, coordinates=coordinates), error
+
+
+def simplify_geojson(geojson: Dict, tolerance: float, decimals: int = COORDINATE_DECIMALS) -> Tuple[Dict, float]:
+    """Simplified copy of a FeatureCollection and the largest vertex displacement in meters"""
+    features = []
+    max_error = 0.0
+    for feature in geojson.get('features', []):
+        geometry = feature.get('geometry')
+        if geometry:
+            geometry, error = simplify_geometry(geometry, tolerance, decimals)
+            max_error = max(max_error, error)
+        features.append(dict(feature, geometry=geometry))
+    return dict(geojson, features=features), max_error
+
+
+def simplification_report(records, zooms: List[int], latitude: float, pixels: float = 0.5,
+                          decimals: int = COORDINATE_DECIMALS) -> Dict:
+    """Embedded GeoJSON bytes and vertex counts per zoom level, before and after simplification"""
+    rounding = quantization_error(decimals, latitude)
+    report = {'files': {}, 'totals': {}, 'quantization_error_m': rounding}
+    for record in records:
+        original = json.dumps(record.geojson)
+        entry = {'original_bytes': len(original), 'original_points': _count_points(record.geojson), 'zooms': {}}
+        for zoom in zooms:
+            tolerance = zoom_tolerance(zoom, latitude, pixels)
+            simplified, error = simplify_geojson(record.geojson, tolerance, decimals)
+            entry['zooms'][zoom] = {
+                'bytes': len(json.dumps(simplified)),
+                'points': _count_points(simplified),
+                'tolerance_m': tolerance,
+                # Douglas-Peucker displacement plus rounding, the bound on any vertex's error
+                'max_error_m': error + rounding
+            }
+        report['files'][record.file_path] = entry
+
+    for zoom in zooms:
+        original = sum(entry['original_bytes'] for entry in report['files'].values())
+        simplified = sum(entry['zooms'][zoom]['bytes'] for entry in report['files'].values())
+        report['totals'][zoom] = {
+            'original_bytes': original,
+            'bytes': simplified,
+            'saved_bytes': original - simplified,
+            'max_error_m': max((entry['zooms'][zoom]['max_error_m'] for entry in report['files'].values()),
+                               default=rounding)
+        }
+    return report
+
+
+def _count_points(geojson: Dict) -> int:
+    def count(coordinates) -> int:
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            return 1
+        return sum(count(part) for part in coordinates)
+    return sum(count((feature.get('geometry') or {}).get('coordinates') or [])
+               for feature in geojson.get('features', []))
@@ -0,0 +1,205 @@
+import heapq
+import math
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from app.geodesy import EARTH_RADIUS_M, haversine
+
+# Entries per R-tree node; small enough that one node's boxes are checked in a single numpy call
+NODE_CAPACITY = 16
+# Hand-drawn outlines whose ends are this many meters apart or less are treated as closed rings
+RING_CLOSURE_TOLERANCE = 0.5
+
+
+class RTree:
+    """Static R-tree over (min_x, min_y, max_x, max_y) boxes, bulk loaded with Sort-Tile-Recursive packing"""
+
+    def __init__(self, boxes: np.ndarray, node_capacity: int = NODE_CAPACITY):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.node_capacity = node_capacity
+        order = self._str_order(boxes, node_capacity)
+        self.item_ids = order
+        # Level 0 holds the item boxes; level k > 0 holds one box per node_capacity entries of level k - 1
+        self.levels: List[np.ndarray] = [boxes[order]]
+        while len(self.levels[-1]) > node_capacity:
+            below = self.levels[-1]
+            starts = np.arange(0, len(below), node_capacity)
+            self.levels.append(np.column_stack([
+                np.minimum.reduceat(below[:, 0], starts),
+                np.minimum.reduceat(below[:, 1], starts),
+                np.maximum.reduceat(below[:, 2], starts),
+                np.maximum.reduceat(below[:, 3], starts),
+            ]))
+
+    @staticmethod
+    def _str_order(boxes: np.ndarray, node_capacity: int) -> np.ndarray:
+        """Item order that tiles the plane into vertical slices sorted by y"""
+        if not len(boxes):
+            return np.zeros(0, dtype=np.int64)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        slice_count = math.ceil(math.sqrt(math.ceil(len(boxes) / node_capacity)))
+        per_slice = slice_count * node_capacity
+        by_x = np.argsort(centers[:, 0], kind='stable')
+        slices = [by_x[i:i + per_slice] for i in range(0, len(boxes), per_slice)]
+        return np.concatenate([chunk[np.argsort(centers[chunk, 1], kind='stable')] for chunk in slices])
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @staticmethod
+    def _box_distance(boxes: np.ndarray, x: float, y: float) -> np.ndarray:
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0.0)
+        return np.hypot(dx, dy)
+
+    def nearest(self, x: float, y: float, count: int = 1,
+                exact: Optional[Callable[[int], float]] = None) -> List[Tuple[int, float]]:
+        """Best-first search for the closest items as (item id, distance) pairs
+
+        Box distances bound the true distance from below; exact(item) refines them
+        for items that aren't points, such as polygons.
+        """
+        if not len(self):
+            return []
+        top = len(self.levels) - 1
+        queue = [(float(d), top, i) for i, d in enumerate(self._box_distance(self.levels[top], x, y))]
+        heapq.heapify(queue)
+        found = []
+        while queue and len(found) < count:
+            distance, level, index = heapq.heappop(queue)
+            if level < 0:
+                found.append((index, distance))
+            elif level == 0:
+                item = int(self.item_ids[index])
+                if exact is None:
+                    found.append((item, distance))
+                else:
+                    heapq.heappush(queue, (exact(item), -1, item))
+            else:
+                start = index * self.node_capacity
+                children = self.levels[level - 1][start:start + self.node_capacity]
+                for offset, d in enumerate(self._box_distance(children, x, y)):
+                    heapq.heappush(queue, (float(d), level - 1, start + offset))
+        return found
+
+    def intersecting(self, box: Tuple[float, float, float, float]) -> List[int]:
+        """Ids of the items whose boxes overlap a (min_x, min_y, max_x, max_y) box"""
+        if not len(self):
+            return []
+        min_x, min_y, max_x, max_y = box
+        candidates = np.arange(len(self.levels[-1]))
+        for level in range(len(self.levels) - 1, -1, -1):
+            boxes = self.levels[level][candidates]
+            hits = candidates[(boxes[:, 0] <= max_x) & (boxes[:, 2] >= min_x)
+                              & (boxes[:, 1] <= max_y) & (boxes[:, 3] >= min_y)]
+            if level == 0:
+                return sorted(int(item) for item in self.item_ids[hits])
+            # Expand every overlapping node into its children on the level below
+            children = (hits[:, None] * self.node_capacity + np.arange(self.node_capacity)).ravel()
+            candidates = children[children < len(self.levels[level - 1])]
+        return []
+
+
+def is_closed_ring(ring: np.ndarray) -> bool:
+    """Check whether a projected outline ends where it starts"""
+    return len(ring) >= 4 and float(np.hypot(*(ring[0] - ring[-1]))) <= RING_CLOSURE_TOLERANCE
+
+
+def outline_distances(points: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    """Planar distance from each (P, 2) point to an outline, zero inside a closed polygon"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x, y = points[:, :1], points[:, 1:]
+    if len(ring) == 1:
+        return np.hypot(ring[0, 0] - x[:, 0], ring[0, 1] - y[:, 0])
+    a, b = ring[:-1], ring[1:]
+    edge = b - a
+    length_sq = np.einsum('ij,ij->i', edge, edge)
+    # (P, E) projections of every point onto every edge
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length_sq > 0, ((x - a[:, 0]) * edge[:, 0] + (y - a[:, 1]) * edge[:, 1]) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    distances = np.hypot(a[:, 0] + t * edge[:, 0] - x, a[:, 1] + t * edge[:, 1] - y).min(axis=1)
+    if is_closed_ring(ring):
+        # Even-odd ray casting along +x, across the closing edge too
+        a, b = ring, np.roll(ring, -1, axis=0)
+        edge = b - a
+        crosses = (a[:, 1] > y) != (b[:, 1] > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at = a[:, 0] + (y - a[:, 1]) * edge[:, 0] / edge[:, 1]
+        inside = np.count_nonzero(crosses & (x < x_at), axis=1) % 2 == 1
+        distances[inside] = 0.0
+    return distances
+
+
+def point_outline_distance(x: float, y: float, ring: np.ndarray) -> float:
+    """Planar distance from a point to an outline, zero inside a closed polygon"""
+    return float(outline_distances(np.array([[x, y]]), ring)[0])
+
+
+class SpatialIndex:
+    """Nearest building outline and walkway node lookups around the campus"""
+
+    def __init__(self, origin: Tuple[float, float], outlines: Dict[str, np.ndarray], node_coords: np.ndarray):
+        # Equirectangular projection to meters; the error is negligible at campus scale
+        self.origin = origin
+        self._scale_y = math.radians(1) * EARTH_RADIUS_M
+        self._scale_x = self._scale_y * math.cos(math.radians(origin[0]))
+
+        self.outline_names = [name for name, coords in outlines.items() if coords is not None and len(coords)]
+        self._outlines = [self.project(outlines[name]) for name in self.outline_names]
+        self.buildings = RTree([np.concatenate([ring.min(axis=0), ring.max(axis=0)]) for ring in self._outlines])
+
+        self.node_coords = np.asarray(node_coords, dtype=np.float64).reshape(-1, 2)
+        nodes = self.project(self.node_coords)
+        self.nodes = RTree(np.hstack([nodes, nodes]))
+
+    def project(self, coords: np.ndarray) -> np.ndarray:
+        """(N, 2) lat/lon array to (N, 2) x/y meters east and north of the origin"""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([(coords[:, 1] - self.origin[1]) * self._scale_x,
+                                (coords[:, 0] - self.origin[0]) * self._scale_y])
+
+    def nearest_building(self, lat: float, lon: float) -> Optional[Tuple[str, float]]:
+        """Closest building outline as (name, meters), zero when the point is inside it"""
+        x, y = self.project([lat, lon])[0]
+        found = self.buildings.nearest(x, y, exact=lambda item: point_outline_distance(x, y, self._outlines[item]))
+        if not found:
+            return None
+        item, distance = found[0]
+        return self.outline_names[item], distance
+
+    def nearest_node(self, lat: float, lon: float) -> Optional[Tuple[int, float]]:
+        """Closest walkway graph node as (node id, meters)"""
+        x, y = self.project([lat, lon])[0]
+        found = self.nodes.nearest(x, y)
+        if not found:
+            return None
+        node = found[0][0]
+        node_lat, node_lon = self.node_coords[node]
+        return node, haversine(lat, lon, node_lat, node_lon)
+
+    def outline_distance(self, name: str, lat: float, lon: float) -> Optional[float]:
+        """Meters from a point to a named outline, zero inside it"""
+        if name not in self.outline_names:
+            return None
+        return float(outline_distances(self.project([lat, lon]), self._outlines[self.outline_names.index(name)])[0])
+
+    def outlines_along(self, coords: np.ndarray, max_distance: float, step: float = 1.0) -> List[str]:
+        """Outlines within max_distance meters of a polyline, in the order the line reaches them"""
+        points = self.project(coords)
+        if len(points) > 1:
+            # Sample the line every step meters so long segments can't skip past an outline
+            samples = [points[:1]]
+            for a, b in zip(points[:-1], points[1:]):
+                count = max(1, math.ceil(float(np.hypot(*(b - a))) / step))
+                samples.append(a + (b - a) * (np.arange(1, count + 1)[:, None] / count))
+            points = np.vstack(samples)
+        if not len(points):
+            return []
+        low = points.min(axis=0) - max_distance
+        high = points.max(axis=0) + max_distance
+        reached = []
+        for item in self.buildings.intersecting((low[0], low[1], high[0], high[1])):
+            close = np.nonzero(outline_distances(points, self._outlines[item]) <= max_distance)[0]
+            if len(close):
+                reached.append((int(close[0]), self.outline_names[item]))
+        return [name for _, name in sorted(reached)]
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.cache import RouteMapCache
+from app.compression import MapArtifact
+from app.geometry import GeometryStore
+from app.routing import WalkwayGraph
+from app.simplify import simplify_geometry, zoom_tolerance
+from app.spatial import RTree
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are rounded to about 1/TILE_EXTENT of a tile edge, as in vector tiles
+TILE_EXTENT = 4096
+
+Bounds = Tuple[float, float, float, float]
+
+
+def tile_bounds(z: int, x: int, y: int) -> Bounds:
+    """(west, south, east, north) degrees of an XYZ web mercator tile"""
+    scale = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / scale))))
+
+    return x / scale * 360.0 - 180.0, lat(y + 1), (x + 1) / scale * 360.0 - 180.0, lat(y)
+
+
+def tile_at(lon: float, lat: float, z: int) -> Tuple[int, int]:
+    """(x, y) of the tile containing a point at a zoom level"""
+    scale = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * scale)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * scale)
+    return min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)
+
+
+def coordinate_decimals(z: int) -> int:
+    """Decimal places that resolve one tile extent step at a zoom level"""
+    return max(0, math.ceil(math.log10(TILE_EXTENT * 2 ** z / 360.0)))
+
+
+def clip_segment(a: Tuple[float, float], b: Tuple[float, float], bounds: Bounds) -> Optional[Tuple]:
+    """Liang-Barsky clip of an (x, y) segment to a box, None if it lies outside"""
+    (x0, y0), (x1, y1) = a, b
+    dx, dy = x1 - x0, y1 - y0
+    low, high = 0.0, 1.0
+    for p, q in ((-dx, x0 - bounds[0]), (dx, bounds[2] - x0), (-dy, y0 - bounds[1]), (dy, bounds[3] - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            low = max(low, t)
+        else:
+            high = min(high, t)
+        if low > high:
+            return None
+    return (x0 + low * dx, y0 + low * dy), (x0 + high * dx, y0 + high * dy)
+
+
+def _round_positions(coordinates, decimals: int):
+    """Round every position of nested GeoJSON coordinates"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, decimals) for value in coordinates]
+    return [_round_positions(part, decimals) for part in coordinates]
+
+
+class _TileIndex:
+    """Campus features and their R-trees for one geometry store generation, published as a whole"""
+
+    __slots__ = ('generation', 'version', 'bounds', 'buildings', 'building_tree', 'segments', 'segment_tree')
+
+    def __init__(self, generation: int, version: str, bounds: Optional[Bounds], buildings: List[Dict],
+                 building_tree: RTree, segments: np.ndarray, segment_tree: RTree):
+        self.generation = generation
+        self.version = version
+        self.bounds = bounds
+        self.buildings = buildings
+        self.building_tree = building_tree
+        self.segments = segments
+        self.segment_tree = segment_tree
+
+
+class TileSet:
+    """Campus buildings and walkways cut into XYZ tiles of GeoJSON, cached on disk and in memory"""
+
+    def __init__(self, store: GeometryStore, cache_dir: str, min_zoom: int = 15, max_zoom: int = 19,
+                 snap_tolerance: float = 3.0, simplify_px: float = 0.5, memory_size: int = 256):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.snap_tolerance = snap_tolerance
+        self.simplify_px = simplify_px
+        self.memory = RouteMapCache(memory_size, name='tile')
+        self._index: Optional[_TileIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        """Hash of the source files and settings the current tiles are cut with"""
+        return self._index.version if self._index is not None else None
+
+    @property
+    def bounds(self) -> Optional[Bounds]:
+        """Lon/lat box around every building and walkway"""
+        return self._index.bounds if self._index is not None else None
+
+    def _ensure_index(self) -> _TileIndex:
+        """Index the current geometry by bounding box, once per geometry store reload"""
+        self.store.maybe_refresh()
+        index = self._index
+        if index is not None and index.generation == self.store.generation:
+            return index
+        with self._lock:
+            generation = self.store.generation
+            if self._index is not None and self._index.generation == generation:
+                return self._index
+
+            buildings = []
+            boxes = []
+            for record in self.store.buildings():
+                features = record.geojson.get('features') or []
+                if not features or not len(record.coords):
+                    continue
+                buildings.append({
+                    'type': 'Feature',
+                    'id': record.name,
+                    'properties': {'name': record.name, 'layer': 'buildings'},
+                    'geometry': features[-1]['geometry']
+                })
+                lat, lon = record.coords[:, 0], record.coords[:, 1]
+                boxes.append((lon.min(), lat.min(), lon.max(), lat.max()))
+
+            # Walkways come from the snapped graph, so shared segments are only sent once
+            graph = WalkwayGraph.from_store(self.store, self.snap_tolerance)
+            edges = [(a, b) for a in range(len(graph)) for b in graph.adjacency[a] if a < b]
+            segments = np.array([(graph.node_lon[a], graph.node_lat[a], graph.node_lon[b], graph.node_lat[b])
+                                 for a, b in edges], dtype=np.float64).reshape(-1, 4)
+            segment_boxes = np.column_stack([np.minimum(segments[:, 0], segments[:, 2]),
+                                             np.minimum(segments[:, 1], segments[:, 3]),
+                                             np.maximum(segments[:, 0], segments[:, 2]),
+                                             np.maximum(segments[:, 1], segments[:, 3])])
+
+            all_boxes = np.vstack([np.array(boxes, dtype=np.float64).reshape(-1, 4), segment_boxes])
+            bounds = (tuple(all_boxes[:, :2].min(axis=0)) + tuple(all_boxes[:, 2:].max(axis=0))
+                      if len(all_boxes) else None)
+            # Tiles on disk are keyed by the source files and settings they were cut with
+            sources = sorted((record.file_path, record.mtime)
+                             for record in self.store.buildings() + self.store.paths())
+            settings = [self.snap_tolerance, self.simplify_px]
+            version = hashlib.sha1(json.dumps([sources, settings]).encode('utf-8')).hexdigest()[:12]
+            # Published in one assignment, so a tile never pairs one reload's R-tree with another's features
+            self._index = index = _TileIndex(generation, version, bounds, buildings, RTree(boxes),
+                                             segments, RTree(segment_boxes))
+        return index
+
+    def covers(self, z: int, x: int, y: int) -> bool:
+        """Check whether a tile is in the zoom range and overlaps the campus"""
+        return self._covers(self._ensure_index(), z, x, y)
+
+    def _covers(self, index: _TileIndex, z: int, x: int, y: int) -> bool:
+        if index.bounds is None or not self.min_zoom <= z <= self.max_zoom:
+            return False
+        west, south, east, north = tile_bounds(z, x, y)
+        return west <= index.bounds[2] and east >= index.bounds[0] \
+            and south <= index.bounds[3] and north >= index.bounds[1]
+
+    def tile_keys(self) -> Iterator[Tuple[int, int, int]]:
+        """Every tile overlapping the campus, from min_zoom to max_zoom"""
+        index = self._ensure_index()
+        if index.bounds is None:
+            return
+        west, south, east, north = index.bounds
+        for z in range(self.min_zoom, self.max_zoom + 1):
+            x0, y0 = tile_at(west, north, z)
+            x1, y1 = tile_at(east, south, z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    yield z, x, y
+
+    def render(self, z: int, x: int, y: int) -> str:
+        """GeoJSON for one tile: whole building outlines and clipped walkways"""
+        return self._render(self._ensure_index(), z, x, y)
+
+    def _render(self, index: _TileIndex, z: int, x: int, y: int) -> str:
+        features: List[Dict] = []
+        if self._covers(index, z, x, y):
+            bounds = tile_bounds(z, x, y)
+            decimals = coordinate_decimals(z)
+            tolerance = zoom_tolerance(z, (bounds[1] + bounds[3]) / 2, self.simplify_px)
+            # Outlines are sent whole, so a browser can draw each one once without seams at tile edges
+            for item in index.building_tree.intersecting(bounds):
+                feature = index.buildings[item]
+                geometry, _ = simplify_geometry(feature['geometry'], tolerance, decimals)
+                features.append(dict(feature, geometry=geometry))
+
+            lines = []
+            for item in index.segment_tree.intersecting(bounds):
+                segment = index.segments[item]
+                clipped = clip_segment(tuple(segment[:2]), tuple(segment[2:]), bounds)
+                if clipped is None:
+                    continue
+                line = _round_positions([list(clipped[0]), list(clipped[1])], decimals)
+                if line[0] != line[1]:
+                    lines.append(line)
+            if lines:
+                features.append({
+                    'type': 'Feature',
+                    'properties': {'name': 'Walkways', 'layer': 'walkways'},
+                    'geometry': {'type': 'MultiLineString', 'coordinates': lines}
+                })
+        return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':'))
+
+    def _tile_path(self, version: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.cache_dir, version, str(z), str(x), f'{y}.json')
+
+    def get(self, z: int, x: int, y: int) -> Optional[MapArtifact]:
+        """Return a tile from memory, the disk cache, or a fresh cut written to the disk cache
+
+        Tiles outside the zoom range or the campus are None, and never cached.
+        """
+        index = self._ensure_index()
+        if not self._covers(index, z, x, y):
+            return None
+        key = (z, x, y)
+        artifact = self.memory.get(key, (index.version,))
+        if artifact is not None:
+            return artifact
+
+        tile_path = self._tile_path(index.version, z, x, y)
+        try:
+            with open(tile_path, encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            text = self._render(index, z, x, y)
+            self._write(tile_path, text)
+        artifact = MapArtifact(text)
+        self.memory.put(key, (index.version,), artifact)
+        return artifact
+
+    def _write(self, tile_path: str, text: str) -> None:
+        """Write a tile atomically, so concurrent workers never read a partial file"""
+        try:
+            os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+            temp_path = f'{tile_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, tile_path)
+        except OSError as e:
+            logger.warning('Could not cache tile %s: %s', tile_path, e)
+
+    def build(self) -> Dict:
+        """Cut every campus tile into the disk cache"""
+        index = self._ensure_index()
+        count = 0
+        size = 0
+        for z, x, y in self.tile_keys():
+            text = self._render(index, z, x, y)
+            self._write(self._tile_path(index.version, z, x, y), text)
+            count += 1
+            size += len(text.encode('utf-8'))
+        return {'tiles': count, 'bytes': size, 'version': index.version,
+                'path': os.path.join(self.cache_dir, index.version)}
@@ -0,0 +1,124 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Held-Karp's table has 2^n * n entries; past this many stops the heuristic is used
+EXACT_MAX_STOPS = 13
+# Hard cap on exact_max, whatever is configured: 2^15 * 15 entries is a few MB, 2^20 * 20 is GBs
+EXACT_STOPS_LIMIT = 15
+
+
+def tour_cost(distances: np.ndarray, order: List[int], round_trip: bool = False) -> float:
+    """Total distance of visiting stops in order, back to the first one for a round trip"""
+    order = list(order) + ([order[0]] if round_trip and order else [])
+    return float(sum(distances[a, b] for a, b in zip(order, order[1:])))
+
+
+def held_karp(distances: np.ndarray, end: Optional[int] = None, round_trip: bool = False) -> List[int]:
+    """Exact shortest visiting order of every stop, starting at stop 0
+
+    The table is filled one subset size at a time, with each size done in a few
+    numpy operations per last stop rather than a Python loop per subset.
+    """
+    n = len(distances)
+    if n <= 2:
+        return list(range(n))
+    full = 1 << n
+    masks = np.arange(full)
+    masks = masks[(masks & 1) == 1]
+    sizes = np.zeros(len(masks), dtype=np.int64)
+    for bit in range(n):
+        sizes += (masks >> bit) & 1
+
+    # cost[mask, j]: shortest path from stop 0 through the stops in mask, ending at j
+    cost = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int16)
+    cost[1, 0] = 0.0
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for j in range(1, n):
+            subsets = layer[(layer >> j) & 1 == 1]
+            if not len(subsets):
+                continue
+            candidates = cost[subsets ^ (1 << j)] + distances[:, j]
+            best = np.argmin(candidates, axis=1)
+            cost[subsets, j] = candidates[np.arange(len(subsets)), best]
+            parent[subsets, j] = best
+
+    final = cost[full - 1] + (distances[:, 0] if round_trip else 0.0)
+    last = end if end is not None else int(np.argmin(final[1:])) + 1
+    order = [last]
+    mask = full - 1
+    while order[-1] != 0:
+        previous = int(parent[mask, order[-1]])
+        mask ^= 1 << order[-1]
+        order.append(previous)
+    return order[::-1]
+
+
+def two_opt(distances: np.ndarray, order: List[int], fixed_end: bool = False, round_trip: bool = False) -> List[int]:
+    """Improve a visiting order by reversing stretches of it while that shortens it
+
+    Assumes symmetric distances, as walkways are. Every candidate reversal of a pass
+    is scored at once; the best one is applied until none helps.
+    """
+    order = np.array(order)
+    n = len(order)
+    # Positions i..k may be reversed; the first stop, and a fixed last stop, stay put
+    last = n - 2 if fixed_end and not round_trip else n - 1
+    i, k = np.triu_indices(n, 1)
+    keep = (i >= 1) & (k <= last)
+    i, k = i[keep], k[keep]
+    if not len(i):
+        return order.tolist()
+    for _ in range(n * n):
+        before = order[i - 1]
+        first = order[i]
+        end = order[k]
+        has_next = (k + 1 < n) | round_trip
+        after = order[(k + 1) % n]
+        gain = distances[before, first] - distances[before, end]
+        gain = gain + np.where(has_next, distances[end, after] - distances[first, after], 0.0)
+        best = int(np.argmax(gain))
+        if gain[best] <= 1e-9:
+            break
+        order[i[best]:k[best] + 1] = order[i[best]:k[best] + 1][::-1]
+    return order.tolist()
+
+
+def nearest_neighbor(distances: np.ndarray, end: Optional[int] = None) -> List[int]:
+    """Greedy visiting order from stop 0, always walking to the closest stop not yet visited"""
+    n = len(distances)
+    remaining = np.ones(n, dtype=bool)
+    remaining[0] = False
+    if end is not None:
+        remaining[end] = False
+    order = [0]
+    while remaining.any():
+        step = np.where(remaining, distances[order[-1]], np.inf)
+        following = int(np.argmin(step))
+        if not remaining[following]:
+            # Only unreachable stops are left; take them in index order
+            following = int(np.nonzero(remaining)[0][0])
+        order.append(following)
+        remaining[following] = False
+    if end is not None and end != 0:
+        order.append(end)
+    return order
+
+
+def solve_tour(distances: np.ndarray, keep_end: bool = False, round_trip: bool = False,
+               exact_max: int = EXACT_MAX_STOPS) -> Tuple[List[int], str]:
+    """Visiting order of every stop from stop 0, and whether it is 'exact' or 'heuristic'
+
+    With keep_end the last stop stays last. Unconnected stops make the cost infinite.
+    exact_max is capped at EXACT_STOPS_LIMIT.
+    """
+    n = len(distances)
+    distances = np.where(np.isnan(distances), np.inf, distances)
+    end = n - 1 if keep_end and n > 1 and not round_trip else None
+    if n <= min(exact_max, EXACT_STOPS_LIMIT):
+        return held_karp(distances, end, round_trip), 'exact'
+    # Large but finite, so reversal gains stay comparable
+    finite = np.where(np.isinf(distances), 1e12, distances)
+    order = nearest_neighbor(finite, end)
+    return two_opt(finite, order, end is not None, round_trip), 'heuristic'
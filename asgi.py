@@ -0,0 +1,5 @@
+import os
+from app.asgi import create_asgi_app
+
+# Serve with an ASGI server, e.g. `uvicorn asgi:app`
+app = create_asgi_app(os.environ.get('FLASK_ENV', 'development'))
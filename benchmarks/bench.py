@@ -0,0 +1,237 @@
+"""Benchmarks for map rendering, the HTTP endpoints and app startup.
+
+Usage:
+    python benchmarks/bench.py [--iterations N] [--output results.json]
+                               [--baseline previous.json] [--tolerance 0.2]
+
+Each benchmark reports p50/p95/p99 latency, throughput, peak traced
+allocations and payload size. With --baseline the run exits non-zero when
+any benchmark's p50 regressed by more than the tolerance.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from app.services import MapService  # noqa: E402
+
+# Startup is measured in fresh interpreters, so it gets fewer iterations
+STARTUP_SNIPPET = (
+    "import time; t = time.perf_counter(); "
+    "from app import create_app; create_app('testing'); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float], size: Optional[int], alloc_peak: Optional[int]) -> Dict:
+    """Latency percentiles in milliseconds plus throughput, allocations and size"""
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 4),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 4),
+        'throughput_per_s': round(len(samples) / total, 1) if total else None,
+        'alloc_peak_kb': round(alloc_peak / 1024, 1) if alloc_peak is not None else None,
+        'size_bytes': size
+    }
+
+
+def measure(func: Callable[[], Optional[int]], iterations: int, warmup: int = 2) -> Dict:
+    """Time func, then trace a few extra calls for allocations; func returns its payload size"""
+    size = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            func()
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            size = func()
+            samples.append(time.perf_counter() - start)
+
+        # Allocation tracing slows calls down, so it runs separately from the timings
+        tracemalloc.start()
+        peak = 0
+        for _ in range(min(iterations, 5)):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            func()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+    return summarize(samples, size, peak)
+
+
+def measure_startup(iterations: int) -> Dict:
+    """Time create_app in fresh interpreters"""
+    samples = []
+    for _ in range(iterations):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SNIPPET], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return summarize(samples, None, None)
+
+
+def run(iterations: int) -> Dict[str, Dict]:
+    """Run every benchmark and return results keyed by benchmark name"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app('testing')
+        client = app.test_client()
+        with app.app_context():
+            services = app.extensions['campus']
+            map_service = services.map_service
+            # Same maps from the template renderer, to compare the two MAP_RENDERER backends
+            leaflet_service = MapService(services.campus_nav, renderer='leaflet',
+                                         simplify_px=app.config['GEOMETRY_SIMPLIFY_PX'])
+            pairs = services.campus_nav.get_route_keys()
+
+    pair_cycle = itertools.cycle(pairs)
+    results = {}
+
+    def render_route_cold():
+        return len(map_service._render_route_map(*next(pair_cycle)))
+
+    def render_route_cached():
+        return len(map_service.create_route_map(*next(pair_cycle)))
+
+    def render_route_leaflet():
+        return len(leaflet_service._render_route_map(*next(pair_cycle)))
+
+    def render_empty_cold():
+        return len(map_service._render_empty_map()[0])
+
+    def render_empty_leaflet():
+        return len(leaflet_service._render_empty_map()[0])
+
+    def render_empty_cached():
+        return len(map_service.create_empty_map())
+
+    def http(method: str, url: str, **kwargs) -> Callable[[], int]:
+        def call():
+            response = client.open(url, method=method, **kwargs)
+            assert response.status_code == 200, (url, response.status_code)
+            return len(response.data)
+        return call
+
+    def post_route():
+        start, dest = next(pair_cycle)
+        return http('POST', '/', data={'start': start, 'dest': dest})()
+
+    def post_route_inline():
+        # The whole page with its map, as sent with STREAM_PAGE_SHELL off
+        app.config['STREAM_PAGE_SHELL'] = False
+        try:
+            return post_route()
+        finally:
+            app.config['STREAM_PAGE_SHELL'] = True
+
+    def route_fragment():
+        start, dest = next(pair_cycle)
+        return http('GET', '/map/route', query_string={'start': start, 'dest': dest})()
+
+    def cold(func: Callable[[], int]) -> Callable[[], int]:
+        # Time to first byte and to interactive differ most before any route is rendered
+        def call():
+            map_service.route_cache.clear()
+            services.route_pages.clear()
+            return func()
+        return call
+
+    def api_route():
+        start, dest = next(pair_cycle)
+        return http('GET', '/api/route', query_string={'start': start, 'dest': dest})()
+
+    benchmarks = {
+        'render.empty_map.cold': render_empty_cold,
+        'render.empty_map.leaflet.cold': render_empty_leaflet,
+        'render.empty_map.cached': render_empty_cached,
+        'render.route_map.cold': render_route_cold,
+        'render.route_map.leaflet.cold': render_route_leaflet,
+        'render.route_map.cached': render_route_cached,
+        'http.index.get': http('GET', '/'),
+        'http.index.get.gzip': http('GET', '/', headers={'Accept-Encoding': 'gzip, br'}),
+        'http.index.post_route': post_route,
+        'http.index.post_route.cold': cold(post_route),
+        'http.index.post_route.inline.cold': cold(post_route_inline),
+        'http.map.route': route_fragment,
+        'http.map.route.cold': cold(route_fragment),
+        'http.api.routes': http('GET', '/api/routes'),
+        'http.api.buildings': http('GET', '/api/buildings'),
+        'http.api.route': api_route,
+    }
+    with app.app_context():
+        for name, func in benchmarks.items():
+            # Cold renders are slow, so they cycle through every pair a few times at most;
+            # everything else first visits every pair so the timings measure warm caches
+            if name.endswith('.cold'):
+                results[name] = measure(func, max(len(pairs), iterations // 10))
+            else:
+                results[name] = measure(func, iterations, warmup=len(pairs))
+    results['startup.create_app'] = measure_startup(max(3, iterations // 40))
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Names of benchmarks whose p50 regressed beyond the tolerance"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {result['p50_ms']}ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per benchmark')
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='Compare against a previous results file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p50 slowdown as a fraction')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+
+    print(f"{'benchmark':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'alloc KB':>10}{'bytes':>9}")
+    for name, result in results.items():
+        print(f"{name:<32}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['throughput_per_s'] or 0:>10.1f}{result['alloc_peak_kb'] or 0:>10.1f}"
+              f"{result['size_bytes'] or 0:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions:\n  ' + '\n  '.join(regressions))
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
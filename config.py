@@ -1,10 +1,67 @@
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DEBUG = False
     TESTING = False
+    # Maximum number of rendered route maps kept in memory
+    ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 32))
+    # Render every route at startup so route requests are served from the cache
+    ROUTE_CACHE_WARMUP = os.environ.get('ROUTE_CACHE_WARMUP', '').lower() in ('1', 'true', 'yes')
+    # Seconds between checks of the GeoJSON files for changes (0 disables reloading)
+    GEOMETRY_REFRESH_INTERVAL = float(os.environ.get('GEOMETRY_REFRESH_INTERVAL', 5))
+    # Poll for data changes from a background thread in each worker instead of on requests
+    DATA_RELOAD_BACKGROUND = os.environ.get('DATA_RELOAD_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    # Walkway vertices closer than this many meters are merged into one graph node
+    ROUTING_SNAP_TOLERANCE = float(os.environ.get('ROUTING_SNAP_TOLERANCE', 3.0))
+    # Binary building-to-building route index written by `flask build-route-index`
+    ROUTE_INDEX_PATH = os.environ.get('ROUTE_INDEX_PATH') or os.path.join(BASE_DIR, 'instance', 'route_index.bin')
+    # Processes the ASGI server renders route maps in (0 renders in a thread of the server process)
+    ASGI_RENDER_PROCESSES = int(os.environ.get('ASGI_RENDER_PROCESSES', 2))
+    # Map renders run at once per process; more wait in a queue of RENDER_QUEUE_SIZE, beyond which they are shed
+    RENDER_CONCURRENCY = int(os.environ.get('RENDER_CONCURRENCY', 2))
+    RENDER_QUEUE_SIZE = int(os.environ.get('RENDER_QUEUE_SIZE', 16))
+    # Seconds a queued render may wait for a slot before it is shed
+    RENDER_QUEUE_TIMEOUT = float(os.environ.get('RENDER_QUEUE_TIMEOUT', 10))
+    # Retry-After seconds sent with a shed render's 503
+    RENDER_RETRY_AFTER = int(os.environ.get('RENDER_RETRY_AFTER', 2))
+    # Stream the page shell right away and have the page fetch its map from /map or /map/route
+    STREAM_PAGE_SHELL = os.environ.get('STREAM_PAGE_SHELL', 'true').lower() in ('1', 'true', 'yes')
+    # Seconds browsers may reuse a map fetched from /map or /map/route before revalidating its ETag
+    MAP_FRAGMENT_MAX_AGE = int(os.environ.get('MAP_FRAGMENT_MAX_AGE', 300))
+    # Seconds browsers may reuse the landing page before revalidating its ETag
+    LANDING_PAGE_MAX_AGE = int(os.environ.get('LANDING_PAGE_MAX_AGE', 300))
+    # Douglas-Peucker tolerance for map geometry, in screen pixels at the deepest zoom (0 only rounds)
+    GEOMETRY_SIMPLIFY_PX = float(os.environ.get('GEOMETRY_SIMPLIFY_PX', 0.5))
+    # Map backend: 'folium' builds Folium's element tree, 'leaflet' fills one template with the same map
+    MAP_RENDERER = os.environ.get('MAP_RENDERER', 'folium')
+    # Draw the landing map's buildings from /tiles instead of inlining every outline in the page
+    MAP_BUILDING_TILES = os.environ.get('MAP_BUILDING_TILES', '').lower() in ('1', 'true', 'yes')
+    # Disk cache of GeoJSON tiles written by `flask build-tiles` or on first request
+    TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR') or os.path.join(BASE_DIR, 'instance', 'tiles')
+    # Zoom levels tiles are cut for; the map overzooms the last one
+    TILE_MIN_ZOOM = int(os.environ.get('TILE_MIN_ZOOM', 15))
+    TILE_MAX_ZOOM = int(os.environ.get('TILE_MAX_ZOOM', 19))
+    # Seconds browsers may reuse a tile before revalidating its ETag
+    TILE_MAX_AGE = int(os.environ.get('TILE_MAX_AGE', 3600))
+    # Most (start, destination) pairs one /api/routes/batch request may ask for
+    BATCH_MAX_PAIRS = int(os.environ.get('BATCH_MAX_PAIRS', 10000))
+    # Most stops one tour may visit, and up to how many its order is solved exactly
+    TOUR_MAX_STOPS = int(os.environ.get('TOUR_MAX_STOPS', 50))
+    TOUR_EXACT_MAX_STOPS = int(os.environ.get('TOUR_EXACT_MAX_STOPS', 13))
+    # Longest walk, in minutes, /api/isochrone reports on
+    ISOCHRONE_MAX_MINUTES = float(os.environ.get('ISOCHRONE_MAX_MINUTES', 30))
+    # Seconds browsers may keep a versioned offline data bundle
+    OFFLINE_DATA_MAX_AGE = int(os.environ.get('OFFLINE_DATA_MAX_AGE', 31536000))
+    # Farthest a location may be from a walkway, in meters, to be routed from
+    LOCATE_MAX_DISTANCE = float(os.environ.get('LOCATE_MAX_DISTANCE', 500))
+    # Level of the app's log records (DEBUG logs every request)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING')
+    # Fraction of per-request debug records that are actually emitted
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -15,6 +72,7 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     FLASK_ENV = 'production'
+    ROUTE_CACHE_WARMUP = os.environ.get('ROUTE_CACHE_WARMUP', 'true').lower() in ('1', 'true', 'yes')
     # Add production-specific settings here
     # SECRET_KEY = os.environ.get('SECRET_KEY')
 
@@ -22,6 +80,8 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     DEBUG = True
+    # Tests reload on demand rather than from a background thread
+    DATA_RELOAD_BACKGROUND = False
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,20 @@
+import gc
+import os
+from config import Config
+
+# Usage: FLASK_ENV=production gunicorn run:app (this file is picked up automatically)
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threaded workers, so concurrent map requests in one worker reach its render queue to be coalesced or shed.
+# The default leaves room for renders past RENDER_CONCURRENCY + RENDER_QUEUE_SIZE, plus a few cheap requests
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', Config.RENDER_CONCURRENCY + Config.RENDER_QUEUE_SIZE + 4))
+
+# Load the app, campus data and rendered maps once in the master, then fork
+preload_app = True
+
+
+def when_ready(server):
+    """Move everything loaded so far out of the collector's reach before forking"""
+    # Workers then share these pages instead of copying them when gc touches headers
+    gc.freeze()
@@ -0,0 +1,110 @@
+// Keeps the page, its third-party assets and the current offline data bundle, so routes work without a connection
+const SHELL_CACHE = 'campus-shell-v2';
+const DATA_CACHE = 'campus-data';
+const RUNTIME_CACHE = 'campus-runtime';
+// Map tiles and asset files fetched later are kept up to this many entries
+const RUNTIME_LIMIT = 500;
+const ASSETS = {{ assets|tojson }};
+const MANIFEST_URL = '/api/offline/manifest';
+
+function cacheData() {
+    return fetch(MANIFEST_URL, { cache: 'no-cache' })
+        .then(response => response.json())
+        .then(manifest => caches.open(DATA_CACHE).then(cache =>
+            cache.match(manifest.data).then(found => found || cache.add(manifest.data).then(() => pruneData(cache, manifest.data)))));
+}
+
+function pruneData(cache, current) {
+    // Only the bundle the manifest names is kept
+    return cache.keys().then(requests => Promise.all(requests
+        .filter(request => new URL(request.url).pathname + new URL(request.url).search !== current)
+        .map(request => cache.delete(request))));
+}
+
+function trim(cache) {
+    return cache.keys().then(requests => Promise.all(
+        requests.slice(0, Math.max(0, requests.length - RUNTIME_LIMIT)).map(request => cache.delete(request))));
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(Promise.all([
+        caches.open(SHELL_CACHE).then(cache => Promise.all([
+            cache.add('/'),
+            // The landing page fetches its map separately
+            cache.add('/map'),
+            // Cross-origin assets are cached as opaque responses
+            ...ASSETS.map(url => fetch(url, { mode: 'no-cors' }).then(response => cache.put(url, response)).catch(() => null))
+        ])),
+        cacheData().catch(() => null)
+    ]).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    const current = [SHELL_CACHE, DATA_CACHE, RUNTIME_CACHE];
+    event.waitUntil(caches.keys()
+        .then(names => Promise.all(names.filter(name => !current.includes(name)).map(name => caches.delete(name))))
+        .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin && url.pathname === MANIFEST_URL) {
+        // Always ask the server for the current version, answering from the cache when it can't be reached
+        event.respondWith(fetch(request).then(response => {
+            const copy = response.clone();
+            caches.open(SHELL_CACHE).then(cache => cache.put(MANIFEST_URL, copy));
+            return response;
+        }).catch(() => caches.match(MANIFEST_URL)));
+        return;
+    }
+    if (url.origin === self.location.origin && url.pathname === '/api/offline/data') {
+        // Versioned bundles never change, so a cached copy is always current
+        event.respondWith(caches.open(DATA_CACHE).then(cache => cache.match(request).then(found => found ||
+            fetch(request).then(response => {
+                if (response.ok) {
+                    cache.put(request, response.clone()).then(() => pruneData(cache, url.pathname + url.search));
+                }
+                return response;
+            }))));
+        return;
+    }
+    if (url.origin === self.location.origin && url.pathname.startsWith('/map')) {
+        // Maps loaded by page shells: the server's while reachable, else the last copy or the empty map.
+        // A server too busy to draw one (503) is answered from the last copy too, when there is one
+        event.respondWith(fetch(request).then(response => {
+            if (response.status === 503) {
+                return caches.match(request).then(found => found || response);
+            }
+            if (response.ok) {
+                const copy = response.clone();
+                caches.open(RUNTIME_CACHE).then(cache => cache.put(request, copy).then(() => trim(cache)));
+            }
+            return response;
+        }).catch(() => caches.match(request).then(found => found || caches.match('/map'))));
+        return;
+    }
+    if (request.mode === 'navigate') {
+        // Pages come from the server while it is reachable, the landing page stands in otherwise
+        event.respondWith(fetch(request).then(response => {
+            if (response.ok && url.pathname === '/') {
+                const copy = response.clone();
+                caches.open(SHELL_CACHE).then(cache => cache.put('/', copy));
+            }
+            return response;
+        }).catch(() => caches.match('/', { ignoreSearch: true })));
+        return;
+    }
+    if (url.origin !== self.location.origin) {
+        // Assets and map tiles from other origins: cached copy first, then the network
+        event.respondWith(caches.match(request).then(found => found || fetch(request).then(response => {
+            const copy = response.clone();
+            caches.open(RUNTIME_CACHE).then(cache => cache.put(request, copy).then(() => trim(cache)));
+            return response;
+        })));
+    }
+});
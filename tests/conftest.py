@@ -0,0 +1,15 @@
+import pytest
+from app import create_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing', warm_up=False)
+    # Route with the walkway graph and cut tiles into a scratch directory
+    app.config.update(ROUTE_INDEX_PATH=str(tmp_path / 'route_index.bin'), TILE_CACHE_DIR=str(tmp_path / 'tiles'))
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
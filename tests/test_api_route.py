@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from app.polyline import decode_polyline
+
+START, DEST = 'A1 block', 'Academic block'
+
+
+def test_route_payload(client):
+    response = client.get('/api/route', query_string={'start': START, 'dest': DEST})
+    assert response.status_code == 200
+    payload = response.json
+    assert (payload['start'], payload['destination'], payload['encoding']) == (START, DEST, 'latlon')
+    assert payload['distance'] > 0 and len(payload['route']) >= 2
+    assert len(payload['segment_lengths']) == len(payload['route']) - 1
+    assert payload['distance'] == pytest.approx(sum(payload['segment_lengths']), abs=0.1)
+
+
+def test_polyline_encoding_matches_coordinates(client):
+    plain = client.get('/api/route', query_string={'start': START, 'dest': DEST}).json
+    encoded = client.get('/api/route', query_string={'start': START, 'dest': DEST, 'encoding': 'polyline'}).json
+    assert encoded['encoding'] == 'polyline6'
+    assert np.allclose(decode_polyline(encoded['route'], 6), plain['route'], atol=1e-6)
+
+
+@pytest.mark.parametrize('query, status', [
+    ({'start': START}, 400),
+    ({'start': START, 'dest': START}, 400),
+    ({'start': START, 'dest': DEST, 'encoding': 'wkt'}, 400),
+    ({'start': START, 'dest': 'Library'}, 404),
+])
+def test_bad_requests(client, query, status):
+    response = client.get('/api/route', query_string=query)
+    assert response.status_code == status
+    assert 'error' in response.json
+
+
+def test_route_revalidates_with_etag(client):
+    response = client.get('/api/route', query_string={'start': START, 'dest': DEST})
+    etag = response.headers['ETag']
+    revalidated = client.get('/api/route', query_string={'start': START, 'dest': DEST},
+                             headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import pytest
+from app.asgi import CampusASGI
+
+ROUTE = 'start=A1%20block&dest=Academic%20block'
+
+
+def call(asgi, method, path, query='', headers=(), body=b''):
+    """Run one HTTP request through the ASGI app, returning (status, headers, body)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    asyncio.run(asgi(scope, receive, send))
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture
+def asgi(app):
+    app.config['ASGI_RENDER_PROCESSES'] = 0
+    return CampusASGI(app, 'testing')
+
+
+@pytest.mark.parametrize('query', [ROUTE, ROUTE + '&encoding=polyline', 'start=A1%20block',
+                                   'start=A1%20block&dest=A1%20block', ROUTE + '&encoding=wkt',
+                                   'start=A1%20block&dest=Library'])
+def test_route_matches_flask(asgi, client, query):
+    status, headers, body = call(asgi, 'GET', '/api/route', query)
+    expected = client.get(f'/api/route?{query}')
+    assert status == expected.status_code
+    assert body == expected.data
+    assert headers.get(b'etag') == (expected.headers['ETag'].encode() if 'ETag' in expected.headers else None)
+
+
+def test_route_revalidates(asgi):
+    _, headers, _ = call(asgi, 'GET', '/api/route', ROUTE)
+    status, _, body = call(asgi, 'GET', '/api/route', ROUTE, [('If-None-Match', headers[b'etag'].decode())])
+    assert status == 304 and body == b''
+
+
+def test_campus_data_loads_off_the_event_loop(asgi, monkeypatch):
+    from app.models import CampusNavigation
+    loads = []
+    original = CampusNavigation.load_route_index
+
+    def load_route_index(self, path):
+        loads.append(threading.current_thread() is threading.main_thread())
+        return original(self, path)
+    monkeypatch.setattr(CampusNavigation, 'load_route_index', load_route_index)
+
+    assert call(asgi, 'GET', '/api/buildings')[0] == 200
+    assert loads == [False]
+
+
+def test_route_map_and_fallback_to_flask(asgi, client):
+    status, headers, body = call(asgi, 'GET', '/map/route', ROUTE)
+    assert status == 200
+    assert b'L.map(' in body
+    # Bad requests and every other path are answered by the Flask app
+    assert call(asgi, 'GET', '/map/route', 'start=A1%20block')[0] == 400
+    status, _, body = call(asgi, 'GET', '/api/offline/manifest')
+    assert status == 200 and body == client.get('/api/offline/manifest').data
@@ -0,0 +1,45 @@
+import json
+import pytest
+
+ORIGINS = ['A1 block', 'B1 block']
+DESTINATIONS = ['Academic block', 'A1 block', 'Library']
+
+
+def test_matrix_rows_are_origin_major(client):
+    response = client.post('/api/routes/batch', json={'origins': ORIGINS, 'destinations': DESTINATIONS})
+    assert response.status_code == 200
+    rows = response.json['routes']
+    assert [(row['start'], row['destination']) for row in rows] == \
+        [(start, dest) for start in ORIGINS for dest in DESTINATIONS]
+    single = client.get('/api/route', query_string={'start': 'A1 block', 'dest': 'Academic block'}).json
+    assert rows[0]['distance'] == single['distance']
+    assert rows[1]['distance'] == 0
+    assert 'error' in rows[2]
+
+
+def test_ndjson_streams_the_same_rows(client):
+    body = {'pairs': [['A1 block', 'B1 block'], ['B1 block', 'A1 block']], 'geometry': True, 'encoding': 'polyline'}
+    plain = client.post('/api/routes/batch', json=body).json['routes']
+    streamed = client.post('/api/routes/batch', json=body, headers={'Accept': 'application/x-ndjson'})
+    assert streamed.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in streamed.data.decode().splitlines()]
+    assert rows == plain
+    assert all(isinstance(row['route'], str) for row in rows)
+
+
+@pytest.mark.parametrize('body', [
+    ['A1 block', 'B1 block'],
+    {'pairs': [['A1 block']]},
+    {'origins': 'A1 block', 'destinations': ['B1 block']},
+    {'pairs': [['A1 block', 'B1 block']], 'encoding': 'wkt'},
+])
+def test_bad_bodies(client, body):
+    response = client.post('/api/routes/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_too_many_pairs(app, client):
+    app.config['BATCH_MAX_PAIRS'] = 3
+    response = client.post('/api/routes/batch', json={'origins': ORIGINS, 'destinations': DESTINATIONS})
+    assert response.status_code == 413
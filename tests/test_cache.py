@@ -0,0 +1,32 @@
+from app.cache import RouteMapCache
+
+ROUTE = ('A1 block', 'B1 block')
+
+
+def test_changed_source_misses_but_keeps_the_stale_rendering():
+    cache = RouteMapCache(4)
+    cache.put(ROUTE, ('v1',), 'old map')
+    assert cache.get(ROUTE, ('v1',)) == 'old map'
+
+    # The data changed: a miss, but the old map stays as a fallback for a shed render
+    assert cache.get(ROUTE, ('v2',)) is None
+    assert len(cache) == 1
+    assert cache.last(ROUTE) == 'old map'
+    assert cache.get(ROUTE, ('v1',)) == 'old map'
+
+    cache.put(ROUTE, ('v2',), 'new map')
+    assert cache.get(ROUTE, ('v1',)) is None
+    assert cache.last(ROUTE) == 'new map'
+
+
+def test_stale_renderings_are_evicted_and_discarded_like_any_other():
+    cache = RouteMapCache(2)
+    cache.put(ROUTE, ('v1',), 'old map')
+    cache.get(ROUTE, ('v2',))
+    cache.put(('A2 block', 'B1 block'), ('v1',), 'map')
+    cache.put(('B2 block', 'B1 block'), ('v1',), 'map')
+    assert cache.last(ROUTE) is None
+
+    cache.put(ROUTE, ('v1',), 'old map')
+    assert cache.discard([ROUTE, ('A1 block', 'A2 block')]) == 1
+    assert cache.last(ROUTE) is None
@@ -0,0 +1,28 @@
+import json
+import pytest
+
+
+@pytest.mark.parametrize('streamed', [True, False])
+def test_payload_report_runs_outside_a_request(app, streamed):
+    app.config['STREAM_PAGE_SHELL'] = streamed
+    result = app.test_cli_runner().invoke(args=['payload-report', '--json'])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.output)
+    assert 'landing' in report
+    routes = [name for name in report if '->' in name]
+    assert routes
+    if streamed:
+        # The maps streamed pages fetch, not the whole route pages they never send
+        assert '/map' in report
+        assert all(name.startswith('/map/route ') for name in routes)
+    else:
+        assert '/map' not in report
+        assert not any(name.startswith('/map/route ') for name in routes)
+    for sizes in report.values():
+        assert sizes['gzip'] < sizes['identity']
+
+
+def test_payload_report_budget(app):
+    result = app.test_cli_runner().invoke(args=['payload-report', '--budget', '1'])
+    assert result.exit_code == 1
+    assert 'Over the 1 byte budget' in result.output
@@ -0,0 +1,38 @@
+import json
+import os
+import pytest
+from app.compiler import validate_campus
+from app.geometry import GeometryStore
+
+# About 2 m of longitude at the equator
+GAP = 0.000018
+
+
+def write_geojson(path, features):
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+@pytest.fixture
+def campus(tmp_path):
+    os.makedirs(tmp_path / 'Buildings')
+    os.makedirs(tmp_path / 'Paths')
+    for name, lon in (('West', 0.0), ('East', 0.002)):
+        ring = [[lon - 0.0003, -0.0002], [lon + 0.0003, -0.0002], [lon + 0.0003, 0.0002],
+                [lon - 0.0003, 0.0002], [lon - 0.0003, -0.0002]]
+        write_geojson(tmp_path / 'Buildings' / f'{name}.geojson',
+                      [{'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}])
+    # Two walkways whose ends almost meet halfway
+    write_geojson(tmp_path / 'Paths' / 'Walkways.geojson', [
+        {'type': 'Feature', 'properties': {'start': 'West'},
+         'geometry': {'type': 'LineString', 'coordinates': [[0.0003, 0.0], [0.001, 0.0]]}},
+        {'type': 'Feature', 'properties': {'end': 'East'},
+         'geometry': {'type': 'LineString', 'coordinates': [[0.001 + GAP, 0.0], [0.0017, 0.0]]}},
+    ])
+    return GeometryStore(str(tmp_path))
+
+
+def test_connectivity_uses_the_snap_tolerance(campus):
+    assert validate_campus(campus, snap_tolerance=3.0) == []
+    errors = validate_campus(campus, snap_tolerance=1.0)
+    assert "No walkway connects 'East' to 'West'" in errors
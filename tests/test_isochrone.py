@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from app.isochrone import clip_walkways
+
+
+def test_edges_kept_cut_and_dropped():
+    # A straight walkway 0 - 1 - 2 - 3 with 100 m edges, walked from node 0
+    nodes = np.array([[0.0, 0.0], [0.0, 1.0], [0.0, 2.0], [0.0, 3.0]])
+    edges = np.array([[0, 1], [1, 2], [2, 3]])
+    lengths = np.array([100.0, 100.0, 100.0])
+    distances = np.array([0.0, 100.0, 200.0, 300.0])
+    segments, total = clip_walkways(nodes, edges, lengths, distances, 150.0)
+    assert total == pytest.approx(150.0)
+    assert segments.shape == (2, 2, 2)
+    # The second edge is cut halfway along
+    assert np.allclose(segments[1], [[0.0, 1.0], [0.0, 1.5]])
+
+
+def test_edge_reached_from_both_ends_is_kept_whole():
+    nodes = np.array([[0.0, 0.0], [0.0, 1.0]])
+    segments, total = clip_walkways(nodes, np.array([[0, 1]]), np.array([100.0]), np.array([40.0, 70.0]), 110.0)
+    assert total == pytest.approx(100.0) and len(segments) == 1
+
+
+def test_total_matches_sampling():
+    rng = np.random.default_rng(0)
+    count = 40
+    edges = np.array([(a, b) for a in range(count) for b in range(a + 1, count) if rng.random() < 0.1])
+    lengths = rng.uniform(10, 100, len(edges))
+    distances = rng.uniform(0, 300, count)
+    _, total = clip_walkways(rng.uniform(0, 1, (count, 2)), edges, lengths, distances, 200.0)
+    # Reachable meters of each edge, sampled every centimeter
+    sampled = 0.0
+    for (a, b), length in zip(edges, lengths):
+        x = np.arange(0, length, 0.01) + 0.005
+        sampled += 0.01 * np.count_nonzero(np.minimum(distances[a] + x, distances[b] + length - x) <= 200.0)
+    assert total == pytest.approx(sampled, abs=0.01 * len(edges))
+
+
+def test_no_edges():
+    segments, total = clip_walkways(np.zeros((1, 2)), np.zeros((0, 2), dtype=int), np.zeros(0), np.zeros(1), 10.0)
+    assert segments.shape == (0, 2, 2) and total == 0.0
+
+
+def test_isochrone_endpoint(client):
+    near = client.get('/api/isochrone', query_string={'from': 'A1 block', 'minutes': 1})
+    far = client.get('/api/isochrone', query_string={'from': 'A1 block', 'minutes': 5})
+    assert near.status_code == far.status_code == 200
+    assert near.json['origin'] == 'A1 block'
+    assert near.json['path_length'] < far.json['path_length']
+    reached = {building['name']: building['distance'] for building in near.json['buildings']}
+    assert all(distance <= near.json['distance'] for distance in reached.values())
+    assert set(reached) <= {building['name'] for building in far.json['buildings']}
+    revalidated = client.get('/api/isochrone', query_string={'from': 'A1 block', 'minutes': 1},
+                             headers={'If-None-Match': near.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.parametrize('query, status', [
+    ({'minutes': 5}, 400),
+    ({'from': 'A1 block'}, 400),
+    ({'from': 'A1 block', 'minutes': 0}, 400),
+    ({'from': 'A1 block', 'minutes': 999}, 400),
+    ({'from': 'Library', 'minutes': 5}, 404),
+])
+def test_isochrone_endpoint_errors(client, query, status):
+    assert client.get('/api/isochrone', query_string=query).status_code == status
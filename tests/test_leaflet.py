@@ -0,0 +1,78 @@
+import html
+import json
+import re
+import pytest
+
+ROUTE = ('A1 block', 'Academic block')
+
+
+def document(map_html):
+    """The map page inside a renderer's srcdoc iframe"""
+    return html.unescape(re.search(r'srcdoc="([^"]*)"', map_html).group(1))
+
+
+def folium_map(doc):
+    """Outlines, labels, path and markers of a Folium map page, keyed as leaflet_map's"""
+    names = dict((layer, name) for name, layer in re.findall(r'"([^"]+)" : (geo_json_\w+),', doc))
+    contents = dict(re.findall(r'var (html_\w+) = \$\(`<div id="html_\w+" [^>]*>([^<]*)</div>`\)', doc))
+    popup_contents = {popup: contents[content] for popup, content in re.findall(r'(popup_\w+)\.setContent\((html_\w+)\)', doc)}
+    popups = {layer: popup_contents[popup] for layer, popup in re.findall(r'(\w+)\.bindPopup\((popup_\w+)\)', doc)}
+    icons = {icon: json.loads(options)['markerColor']
+             for icon, options in re.findall(r'var (icon_\w+) = L\.AwesomeMarkers\.icon\(\s*(\{.*?\})\s*\)', doc)}
+    colors = dict(re.findall(r'(marker_\w+)\.setIcon\((icon_\w+)\)', doc))
+    path = re.search(r'L\.polyline\.antPath\(\s*(\[\[.*?\]\]),', doc)
+    return {
+        'outlines': {names[layer]: json.loads(data)['features'][-1]['geometry']['coordinates']
+                     for layer, data in re.findall(r'(geo_json_\w+)_add\((\{.*\})\);', doc)},
+        'tooltips': {names[layer]: label.strip()
+                     for layer, label in re.findall(r'(geo_json_\w+)\.bindTooltip\(\s*`<div>([^<]*)</div>`', doc)},
+        'popups': {names[layer]: text for layer, text in popups.items() if layer in names},
+        'path': json.loads(path.group(1)) if path else None,
+        'markers': sorted((json.loads(location), popups[marker], icons[colors[marker]])
+                          for marker, location in re.findall(r'var (marker_\w+) = L\.marker\(\s*(\[.*?\]),', doc)),
+    }
+
+
+def leaflet_map(doc):
+    """Outlines, labels, path and markers of a template map page, from the data it draws"""
+    data = json.loads(re.search(r'^var data = (.*);$', doc, re.M).group(1))
+    labels = {outline['label']: outline['label'] for outline in data['outlines']}
+    return {
+        'outlines': {outline['label']: outline['geojson']['features'][-1]['geometry']['coordinates']
+                     for outline in data['outlines']},
+        'tooltips': labels if data['tooltips'] else {},
+        'popups': labels if data['popups'] else {},
+        'path': data['path'],
+        'markers': sorted((marker['location'], marker['popup'], marker['color']) for marker in data['markers']),
+    }
+
+
+@pytest.fixture
+def maps(app):
+    """The empty and route maps drawn by each renderer"""
+    drawn = {}
+    for renderer in ('folium', 'leaflet'):
+        app.config['MAP_RENDERER'] = renderer
+        services = app.extensions['campus']
+        services._map_service = None
+        with app.app_context():
+            drawn[renderer] = (document(services.map_service.create_empty_map()),
+                               document(services.map_service.create_route_map(*ROUTE)))
+    return drawn
+
+
+def test_empty_maps_match(maps):
+    folium, leaflet = folium_map(maps['folium'][0]), leaflet_map(maps['leaflet'][0])
+    assert len(folium['outlines']) == 8
+    assert folium == leaflet
+    # Every building is labelled on hover and on click
+    assert folium['tooltips'] == folium['popups'] == {name: name for name in folium['outlines']}
+
+
+def test_route_maps_match(maps):
+    folium, leaflet = folium_map(maps['folium'][1]), leaflet_map(maps['leaflet'][1])
+    assert folium == leaflet
+    assert set(folium['outlines']) >= set(ROUTE)
+    assert len(folium['path']) >= 2
+    assert [(location, color) for location, _, color in folium['markers']] == sorted(
+        [(folium['path'][0], 'green'), (folium['path'][-1], 'red')])
@@ -0,0 +1,31 @@
+def test_manifest_names_a_versioned_bundle(client):
+    manifest = client.get('/api/offline/manifest')
+    assert manifest.headers['Cache-Control'] == 'no-cache'
+    version = manifest.json['version']
+    assert manifest.json['data'].endswith(f'?v={version}')
+
+    data = client.get(manifest.json['data'])
+    assert data.status_code == 200
+    assert data.headers['ETag'] == f'"{version}"'
+    assert 'immutable' in data.headers['Cache-Control']
+    bundle = data.json
+    routes = client.get('/api/routes').json
+    assert len(bundle['routes']) == len(routes)
+    assert set(bundle['descriptions']) <= set(bundle['outlines'])
+
+
+def test_unversioned_bundle_is_revalidated(client):
+    data = client.get('/api/offline/data')
+    assert data.headers['Cache-Control'] == 'public, max-age=0'
+    assert client.get('/api/offline/data', headers={'If-None-Match': data.headers['ETag']}).status_code == 304
+    # A stale version is served the current bundle, but never cached as if it were that version
+    stale = client.get('/api/offline/data?v=old')
+    assert stale.headers['Cache-Control'] == 'public, max-age=0'
+    assert stale.data == data.data
+
+
+def test_service_worker(client):
+    worker = client.get('/sw.js')
+    assert worker.status_code == 200
+    assert worker.mimetype == 'application/javascript'
+    assert b'leaflet' in worker.data
@@ -0,0 +1,26 @@
+import gzip
+
+
+def test_landing_page_revalidates_with_etag(client):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    etag = response.headers['ETag']
+
+    revalidated = client.get('/', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert client.get('/', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_pages_are_sent_precompressed(client):
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+    # Each encoding is its own byte sequence, with its own ETag
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/', headers={'Accept-Encoding': 'gzip',
+                                    'If-None-Match': compressed.headers['ETag']}).status_code == 304
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from app.polyline import decode_polyline, encode_polyline
+
+
+def test_known_encoding():
+    # The example from Google's polyline documentation, at 1e-5 precision
+    coords = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+    assert encode_polyline(coords, precision=5) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+@pytest.mark.parametrize('precision', [5, 6])
+def test_round_trip(precision):
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.uniform(-90, 90, 200), rng.uniform(-180, 180, 200)])
+    decoded = np.array(decode_polyline(encode_polyline(coords, precision), precision))
+    assert decoded.shape == coords.shape
+    assert np.abs(decoded - coords).max() <= 0.5 * 10 ** -precision + 1e-12
+
+
+def test_empty():
+    assert encode_polyline(np.zeros((0, 2))) == ''
+    assert decode_polyline('') == []
@@ -0,0 +1,54 @@
+import os
+import shutil
+from pathlib import Path
+import pytest
+from app.geometry import BASE_DIR, GeometryStore
+from app.models import CampusNavigation
+
+
+@pytest.fixture
+def navigation(tmp_path):
+    for directory in ('Buildings', 'Paths'):
+        shutil.copytree(os.path.join(BASE_DIR, directory), tmp_path / directory)
+    navigation = CampusNavigation(GeometryStore(str(tmp_path)))
+    navigation.route_metrics
+    return navigation
+
+
+def rewrite(path, text):
+    # Step the mtime forward, as a coarse clock might not
+    mtime = os.stat(path).st_mtime_ns
+    path.write_text(text)
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+
+def walkway(navigation):
+    return Path(navigation.geometry.base_dir, navigation.geometry.paths()[0].file_path)
+
+
+def test_half_written_file_keeps_last_good_copy(navigation):
+    path = walkway(navigation)
+    text = path.read_text()
+    routes, generation = dict(navigation.route_metrics), navigation.geometry.generation
+
+    rewrite(path, text[:len(text) // 2])
+    for _ in range(3):
+        assert navigation.reload() is None
+    assert navigation.geometry.generation == generation
+    assert navigation.route_metrics == routes
+
+    # Finishing the save is a real change
+    rewrite(path, text.replace('[', '[ ', 1))
+    report = navigation.reload()
+    assert navigation.geometry.generation == generation + 1
+    assert report is not None and report['source'] == 'geojson'
+
+
+def test_removed_file_is_dropped(navigation):
+    path = walkway(navigation)
+    name = path.stem
+    generation = navigation.geometry.generation
+    os.remove(path)
+    assert navigation.reload() is not None
+    assert navigation.geometry.generation == generation + 1
+    assert navigation.geometry.path(name) is None
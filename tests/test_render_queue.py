@@ -0,0 +1,140 @@
+import pickle
+import threading
+import pytest
+from app.instrumentation import metrics
+from app.render_queue import RenderQueue, RenderQueueFull
+
+
+def start(queue, key, render, results):
+    def call():
+        try:
+            results.append(queue.run(key, render))
+        except Exception as error:
+            results.append(error)
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError('timed out')
+
+
+def test_same_key_renders_once():
+    queue = RenderQueue(concurrency=1, max_waiting=0, name='coalesce_test')
+    release, calls, results = threading.Event(), [], []
+
+    def render():
+        calls.append(1)
+        release.wait(5)
+        return 'map'
+
+    threads = [start(queue, 'route', render, results)]
+    wait_for(lambda: queue.running == 1)
+    threads += [start(queue, 'route', render, results) for _ in range(4)]
+    # Followers count themselves as coalesced just before waiting on the leader
+    wait_for(lambda: '{queue="coalesce_test"} 4' in metrics.render())
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ['map'] * 5
+    assert queue.running == 0 and queue.waiting == 0
+
+
+def test_full_queue_sheds_new_keys():
+    queue = RenderQueue(concurrency=1, max_waiting=1, retry_after=7)
+    release, results = threading.Event(), []
+    threads = [start(queue, 'first', lambda: release.wait(5), results)]
+    wait_for(lambda: queue.running == 1)
+    threads.append(start(queue, 'second', lambda: release.wait(5), results))
+    wait_for(lambda: queue.waiting == 1)
+    with pytest.raises(RenderQueueFull) as shed:
+        queue.run('third', lambda: 'never')
+    assert shed.value.retry_after == 7
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [True, True]
+    assert queue.run('third', lambda: 'drawn') == 'drawn'
+
+
+def test_waiting_too_long_sheds():
+    queue = RenderQueue(concurrency=1, max_waiting=1, timeout=0.05)
+    release, results = threading.Event(), []
+    thread = start(queue, 'first', lambda: release.wait(5), results)
+    wait_for(lambda: queue.running == 1)
+    with pytest.raises(RenderQueueFull):
+        queue.run('second', lambda: 'never')
+    release.set()
+    thread.join(5)
+    assert queue.waiting == 0
+
+
+def test_errors_reach_every_caller():
+    queue = RenderQueue(concurrency=1, max_waiting=0)
+    release, results = threading.Event(), []
+
+    def render():
+        release.wait(5)
+        raise ValueError('no route')
+
+    threads = [start(queue, 'route', render, results)]
+    wait_for(lambda: queue.running == 1)
+    threads.append(start(queue, 'route', render, results))
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 2 and all(isinstance(r, ValueError) for r in results)
+    assert queue.run('route', lambda: 'retried') == 'retried'
+
+
+def test_full_error_pickles():
+    error = pickle.loads(pickle.dumps(RenderQueueFull(3)))
+    assert isinstance(error, RenderQueueFull) and error.retry_after == 3
+
+
+def shed_every_render(app, monkeypatch):
+    queue = app.extensions['campus'].map_service.render_queue
+
+    def run(key, render):
+        raise RenderQueueFull(3)
+    monkeypatch.setattr(queue, 'run', run)
+
+
+def test_shed_map_is_503_with_route_data(app, client, monkeypatch):
+    shed_every_render(app, monkeypatch)
+    response = client.get('/map/route', query_string={'start': 'A1 block', 'dest': 'B1 block'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert response.json['retry_after'] == 3
+    route = client.get('/api/route', query_string={'start': 'A1 block', 'dest': 'B1 block'}).json
+    assert response.json['route'] == route
+
+
+def test_shed_map_serves_last_rendering(app, client, monkeypatch):
+    drawn = client.get('/map/route', query_string={'start': 'A1 block', 'dest': 'B1 block'}).data
+    cache = app.extensions['campus'].map_service.route_cache
+    # As if the data changed since it was drawn
+    key = ('A1 block', 'B1 block')
+    cache.put(key, ('old',), cache.last(key))
+    app.extensions['campus'].route_pages.clear()
+    shed_every_render(app, monkeypatch)
+    response = client.get('/map/route', query_string={'start': 'A1 block', 'dest': 'B1 block'})
+    assert response.status_code == 200
+    assert response.data == drawn
+
+
+def test_shed_inline_page_falls_back_to_shell(app, client, monkeypatch):
+    app.config['STREAM_PAGE_SHELL'] = False
+    shed_every_render(app, monkeypatch)
+    response = client.post('/', data={'start': 'A1 block', 'dest': 'B1 block'})
+    assert response.status_code == 200
+    assert 'data-map-src' in response.get_data(as_text=True)
+    tour = client.get('/tour', query_string={'stops': ['A1 block', 'B1 block']})
+    assert tour.status_code == 503
+    assert tour.headers['Retry-After'] == '3'
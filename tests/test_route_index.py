@@ -0,0 +1,121 @@
+import json
+import os
+import numpy as np
+import pytest
+from app.geometry import GeometryStore
+import app.route_index
+from app.models import CampusNavigation
+from app.route_index import RouteIndex, build_route_index
+from app.routing import WalkwayGraph
+
+# Three buildings in a row, joined by walkways that meet at Middle's door
+BUILDINGS = {'West': 0.0, 'Middle': 0.001, 'East': 0.002}
+WALKWAYS = {
+    'West_to_Middle': [[0.0003, 0.0], [0.0005, 0.0002], [0.0007, 0.0]],
+    'Middle_to_East': [[0.0007, 0.0], [0.0012, -0.0002], [0.0017, 0.0]],
+    'Middle_to_West': [[0.0007, 0.0], [0.0005, -0.0002], [0.0003, 0.0]],
+}
+
+
+def write_geojson(path, geometry):
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection',
+                   'features': [{'type': 'Feature', 'properties': {}, 'geometry': geometry}]}, f)
+
+
+@pytest.fixture
+def campus(tmp_path):
+    os.makedirs(tmp_path / 'Buildings')
+    os.makedirs(tmp_path / 'Paths')
+    for name, lon in BUILDINGS.items():
+        ring = [[lon - 0.0003, -0.0002], [lon + 0.0003, -0.0002], [lon + 0.0003, 0.0002],
+                [lon - 0.0003, 0.0002], [lon - 0.0003, -0.0002]]
+        write_geojson(tmp_path / 'Buildings' / f'{name}.geojson', {'type': 'Polygon', 'coordinates': [ring]})
+    for name, line in WALKWAYS.items():
+        write_geojson(tmp_path / 'Paths' / f'{name}.geojson', {'type': 'LineString', 'coordinates': line})
+    return tmp_path
+
+
+def test_build_and_open_round_trip(campus):
+    store = GeometryStore(str(campus))
+    output = str(campus / 'index.bin')
+    stats = build_route_index(store, output, 1.0)
+    index = RouteIndex(output, verify=True)
+    graph = WalkwayGraph.from_store(store, 1.0)
+
+    assert stats['checksum'] == index.checksum
+    assert index.buildings == sorted(graph.entrances)
+    for start in index.buildings:
+        for destination in index.buildings:
+            expected = graph.route(start, destination) if start != destination else None
+            route = index.route(start, destination)
+            assert (route is None) == (expected is None), (start, destination)
+            if route is not None:
+                assert route[0] == pytest.approx(expected[0])
+                assert np.allclose(route[1][[0, -1]], expected[1][[0, -1]])
+    # West reaches East only through the door it shares with Middle
+    assert index.route('West', 'East') is not None
+
+    for node in range(len(index.node_coords)):
+        assert np.allclose(index.distances_from([node]), graph.dijkstra(node)[0])
+        route, expected = index.route_from_node(node, 'East'), graph.route_from_node(node, 'East')
+        assert route[0] == pytest.approx(expected[0])
+
+    outline = index.outline('Middle')['features'][0]['geometry']
+    assert outline['type'] == 'Polygon'
+    assert np.allclose(outline['coordinates'][0], store.building('Middle').geojson['features'][0]['geometry']['coordinates'][0])
+
+
+def test_checksum_is_only_checked_on_request(campus):
+    output = str(campus / 'index.bin')
+    build_route_index(GeometryStore(str(campus)), output, 1.0)
+    with open(output, 'r+b') as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b'corrupt!')
+    index = RouteIndex(output)
+    with pytest.raises(ValueError):
+        index.verify()
+    with pytest.raises(ValueError):
+        RouteIndex(output, verify=True)
+
+
+def test_stale_index_is_ignored(campus):
+    output = str(campus / 'index.bin')
+    build_route_index(GeometryStore(str(campus)), output, 1.0)
+    assert RouteIndex.open(output, str(campus)) is not None
+    write_geojson(campus / 'Paths' / 'West_to_Middle.geojson',
+                  {'type': 'LineString', 'coordinates': WALKWAYS['West_to_Middle'][::-1]})
+    assert RouteIndex.open(output, str(campus)) is None
+
+
+def test_other_files_are_rejected(campus):
+    path = campus / 'not_an_index.bin'
+    path.write_bytes(b'x' * 64)
+    with pytest.raises(ValueError):
+        RouteIndex(str(path))
+    assert RouteIndex.open(str(path), str(campus)) is None
+
+
+def test_moved_mtimes_are_hashed_once(campus, monkeypatch):
+    output = str(campus / 'index.bin')
+    build_route_index(GeometryStore(str(campus)), output, 1.0)
+    # A clone or deploy gives every file a new mtime but the same content
+    for directory in ('Buildings', 'Paths'):
+        for name in os.listdir(campus / directory):
+            os.utime(campus / directory / name, ns=(10 ** 18, 10 ** 18))
+
+    hashed = []
+    source_hashes = app.route_index.source_hashes
+    monkeypatch.setattr(app.route_index, 'source_hashes', lambda base_dir: hashed.append(1) or source_hashes(base_dir))
+    navigation = CampusNavigation(GeometryStore(str(campus)), 1.0)
+    assert navigation.load_route_index(output)
+    for _ in range(3):
+        assert navigation.reload() is None
+    assert len(hashed) == 1
+    assert navigation.data.route_index is not None
+
+    # A rewritten index is checked once, then trusted again
+    os.utime(output, ns=(10 ** 18, 10 ** 18))
+    for _ in range(3):
+        navigation.reload()
+    assert len(hashed) == 2
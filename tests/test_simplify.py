@@ -0,0 +1,41 @@
+import math
+import numpy as np
+from app.geodesy import EARTH_RADIUS_M
+from app.simplify import douglas_peucker
+
+
+def to_meters(coords):
+    scale = math.radians(1) * EARTH_RADIUS_M
+    return np.column_stack([(coords[:, 1] - coords[0, 1]) * scale * math.cos(math.radians(coords[0, 0])),
+                            (coords[:, 0] - coords[0, 0]) * scale])
+
+
+def segment_distance(point, start, end):
+    edge = end - start
+    t = np.clip((point - start) @ edge / max(edge @ edge, 1e-12), 0, 1)
+    return float(np.hypot(*(start + t * edge - point)))
+
+
+def test_dropped_vertices_stay_within_tolerance():
+    rng = np.random.default_rng(0)
+    # A wiggly walkway of about 200 m
+    coords = np.column_stack([40.0 + np.linspace(0, 0.0018, 300), -74.0 + rng.normal(0, 2e-6, 300).cumsum()])
+    kept, max_dropped = douglas_peucker(coords, 0.5)
+    assert kept[0] == 0 and kept[-1] == len(coords) - 1 and len(kept) < len(coords)
+    assert max_dropped <= 0.5
+    xy = to_meters(coords)
+    for a, b in zip(kept, kept[1:]):
+        for i in range(a + 1, b):
+            assert segment_distance(xy[i], xy[a], xy[b]) <= 0.5 + 1e-9
+
+
+def test_straight_line_keeps_ends_only():
+    coords = np.column_stack([np.linspace(40, 40.001, 20), np.linspace(-74, -74.001, 20)])
+    kept, _ = douglas_peucker(coords, 0.1)
+    assert kept.tolist() == [0, 19]
+
+
+def test_short_lines_and_zero_tolerance_are_unchanged():
+    assert douglas_peucker(np.array([[0.0, 0.0], [1.0, 1.0]]), 1.0)[0].tolist() == [0, 1]
+    coords = np.random.default_rng(1).uniform(0, 0.001, (10, 2))
+    assert douglas_peucker(coords, 0)[0].tolist() == list(range(10))
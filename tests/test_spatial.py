@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from app.spatial import RTree
+
+
+@pytest.mark.parametrize('count', [1, 15, 16, 17, 300])
+def test_nearest_matches_linear_scan(count):
+    rng = np.random.default_rng(count)
+    points = rng.uniform(0, 1000, (count, 2))
+    tree = RTree(np.hstack([points, points]))
+    for x, y in rng.uniform(-100, 1100, (50, 2)):
+        distances = np.hypot(points[:, 0] - x, points[:, 1] - y)
+        found = tree.nearest(x, y, count=3)
+        assert [d for _, d in found] == pytest.approx(np.sort(distances)[:3])
+        assert distances[found[0][0]] == pytest.approx(distances.min())
+
+
+def test_nearest_with_exact_distance():
+    rng = np.random.default_rng(7)
+    corners = rng.uniform(0, 1000, (100, 2))
+    boxes = np.hstack([corners, corners + rng.uniform(1, 20, (100, 2))])
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    tree = RTree(boxes)
+    for x, y in rng.uniform(0, 1000, (30, 2)):
+        exact = np.hypot(centers[:, 0] - x, centers[:, 1] - y)
+        item, distance = tree.nearest(x, y, exact=lambda i: float(exact[i]))[0]
+        assert distance == pytest.approx(exact.min())
+
+
+def test_intersecting_matches_linear_scan():
+    rng = np.random.default_rng(1)
+    corners = rng.uniform(0, 1000, (200, 2))
+    boxes = np.hstack([corners, corners + 10])
+    tree = RTree(boxes)
+    query = (100.0, 200.0, 400.0, 350.0)
+    expected = [i for i, b in enumerate(boxes)
+                if b[0] <= query[2] and b[2] >= query[0] and b[1] <= query[3] and b[3] >= query[1]]
+    assert tree.intersecting(query) == expected
+
+
+def test_empty_tree():
+    tree = RTree(np.zeros((0, 4)))
+    assert tree.nearest(0, 0) == [] and tree.intersecting((0, 0, 1, 1)) == []
@@ -0,0 +1,47 @@
+import re
+from html import unescape
+
+# Folium declares each map as `var map_<id> = L.map(...)`
+FOLIUM_MAP = re.compile(r'var map_[0-9a-f]+ = L\.map\(')
+ROUTE = {'start': 'A1 block', 'dest': 'Academic block'}
+
+
+def map_src(page):
+    return unescape(re.search(r'data-map-src="([^"]+)"', page).group(1))
+
+
+def test_route_page_streams_shell_then_map(client):
+    response = client.post('/', data=ROUTE)
+    assert response.status_code == 200
+    # Sent as it renders, so without a Content-Length
+    assert 'Content-Length' not in response.headers
+    page = response.get_data(as_text=True)
+    assert 'Via Bridge' in page
+    # The shell carries no map of its own, only where to fetch it
+    assert not FOLIUM_MAP.search(page)
+
+    fragment = client.get(map_src(page))
+    assert fragment.status_code == 200
+    assert FOLIUM_MAP.search(fragment.get_data(as_text=True))
+    assert client.get(map_src(page), headers={'If-None-Match': fragment.headers['ETag']}).status_code == 304
+
+
+def test_landing_shell_fetches_empty_map(client):
+    assert map_src(client.get('/').get_data(as_text=True)) == '/map'
+    assert client.get('/map').status_code == 200
+
+
+def test_route_map_errors(client):
+    assert client.get('/map/route', query_string={'start': 'A1 block'}).status_code == 400
+    assert client.get('/map/route', query_string={'start': 'A1 block', 'dest': 'Library'}).status_code == 404
+    page = client.post('/', data={'start': 'A1 block', 'dest': 'Library'}).get_data(as_text=True)
+    assert map_src(page) == '/map'
+
+
+def test_inline_pages_without_streaming(app, client):
+    app.config['STREAM_PAGE_SHELL'] = False
+    response = client.post('/', data=ROUTE)
+    assert 'Content-Length' in response.headers
+    page = response.get_data(as_text=True)
+    assert 'data-map-src' not in page
+    assert FOLIUM_MAP.search(page)
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+from app.geometry import BASE_DIR, GeometryStore
+from app.tiles import TileSet, tile_at
+
+CAMPUS = (75.9012, 41.4292)
+
+
+def campus_tile(z):
+    return (z,) + tile_at(*CAMPUS, z)
+
+
+def test_campus_tile(app, client):
+    z, x, y = campus_tile(17)
+    response = client.get(f'/tiles/{z}/{x}/{y}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/geo+json'
+    layers = {feature['properties']['layer'] for feature in response.json['features']}
+    assert layers == {'buildings', 'walkways'}
+    # Cut once into the disk cache
+    tiles = app.extensions['campus'].tiles
+    assert os.path.exists(os.path.join(app.config['TILE_CACHE_DIR'], tiles.version, str(z), str(x), f'{y}.json'))
+
+    revalidated = client.get(f'/tiles/{z}/{x}/{y}', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_tiles_off_the_campus_are_404_and_not_cached(app, client):
+    z, x, y = campus_tile(17)
+    client.get(f'/tiles/{z}/{x}/{y}')
+    tiles = app.extensions['campus'].tiles
+    cached = len(tiles.memory)
+    for path in (f'/tiles/{z}/{x + 50}/{y}', f'/tiles/{z + 5}/{x}/{y}', f'/tiles/10/{x >> 7}/{y >> 7}'):
+        assert client.get(path).status_code == 404
+    assert len(tiles.memory) == cached
+
+
+def test_reload_publishes_a_new_index_whole(tmp_path):
+    for directory in ('Buildings', 'Paths'):
+        shutil.copytree(os.path.join(BASE_DIR, directory), tmp_path / directory)
+    store = GeometryStore(str(tmp_path), refresh_interval=0)
+    tiles = TileSet(store, str(tmp_path / 'tiles'))
+    z, x, y = campus_tile(17)
+    before = tiles._ensure_index()
+    names = [feature['id'] for feature in before.buildings]
+    assert 'Bridge' in names
+
+    os.remove(tmp_path / 'Buildings' / 'Bridge.geojson')
+    store.refresh()
+    after = tiles._ensure_index()
+    # A tile cut from the old index during the reload still sees all of it
+    assert [feature['id'] for feature in before.buildings] == names
+    assert after is not before and after.version != before.version
+    assert 'Bridge' not in [feature['id'] for feature in after.buildings]
+    features = json.loads(tiles.get(z, x, y).html)['features']
+    assert 'Bridge' not in [feature['properties']['name'] for feature in features]
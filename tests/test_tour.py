@@ -0,0 +1,77 @@
+import itertools
+import numpy as np
+import pytest
+from app.tour import EXACT_STOPS_LIMIT, held_karp, solve_tour, tour_cost, two_opt
+
+
+def random_distances(n, seed):
+    points = np.random.default_rng(seed).uniform(0, 100, (n, 2))
+    return np.hypot(*(points[:, None] - points[None, :]).transpose(2, 0, 1))
+
+
+def brute_force(distances, end=None, round_trip=False):
+    n = len(distances)
+    middle = [i for i in range(1, n) if i != end]
+    orders = ([0] + list(p) + ([end] if end is not None else []) for p in itertools.permutations(middle))
+    return min(tour_cost(distances, order, round_trip) for order in orders)
+
+
+@pytest.mark.parametrize('n', [3, 4, 5, 6, 7])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_held_karp_is_optimal(n, seed):
+    distances = random_distances(n, seed)
+    order = held_karp(distances)
+    assert sorted(order) == list(range(n)) and order[0] == 0
+    assert tour_cost(distances, order) == pytest.approx(brute_force(distances))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_held_karp_fixed_end_and_round_trip(seed):
+    distances = random_distances(6, seed)
+    order = held_karp(distances, end=5)
+    assert order[-1] == 5
+    assert tour_cost(distances, order) == pytest.approx(brute_force(distances, end=5))
+    order = held_karp(distances, round_trip=True)
+    assert tour_cost(distances, order, True) == pytest.approx(brute_force(distances, round_trip=True))
+
+
+def test_two_opt_never_worsens_and_keeps_ends():
+    distances = random_distances(12, 3)
+    start = list(range(12))
+    order = two_opt(distances, start, fixed_end=True)
+    assert order[0] == 0 and order[-1] == 11 and sorted(order) == start
+    assert tour_cost(distances, order) <= tour_cost(distances, start)
+
+
+def test_solve_tour_caps_exact_solver():
+    distances = random_distances(EXACT_STOPS_LIMIT + 1, 4)
+    order, solver = solve_tour(distances, exact_max=100)
+    assert solver == 'heuristic'
+    assert sorted(order) == list(range(len(distances)))
+    assert solve_tour(random_distances(6, 4), exact_max=100)[1] == 'exact'
+
+
+STOPS = ['A1 block', 'B2 block', 'A2 block', 'Academic block']
+
+
+def test_tour_endpoint(client):
+    tour = client.get('/api/tour', query_string={'stops': STOPS})
+    assert tour.status_code == 200
+    assert tour.json['stops'][0] == STOPS[0] and sorted(tour.json['stops']) == sorted(STOPS)
+    assert len(tour.json['legs']) == len(STOPS) - 1
+    given = client.get('/api/tour', query_string={'stops': STOPS, 'optimize': '0'}).json
+    assert given['stops'] == STOPS
+    assert tour.json['distance'] <= given['distance']
+    round_trip = client.get('/api/tour', query_string={'stops': STOPS, 'round_trip': '1'}).json
+    assert len(round_trip['legs']) == len(STOPS)
+    assert round_trip['distance'] >= tour.json['distance']
+
+    revalidated = client.get('/api/tour', query_string={'stops': STOPS}, headers={'If-None-Match': tour.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_tour_endpoint_errors(app, client):
+    assert client.get('/api/tour', query_string={'stops': ['A1 block', 'Library']}).status_code == 404
+    assert client.get('/api/tour', query_string={'stops': STOPS, 'encoding': 'wkt'}).status_code == 400
+    app.config['TOUR_MAX_STOPS'] = 3
+    assert client.get('/api/tour', query_string={'stops': STOPS}).status_code == 400